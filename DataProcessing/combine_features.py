@@ -1,6 +1,7 @@
 # Imports
-from collections import defaultdict
+import numpy as np
 import pandas as pd
+import shapely
 
 
 class CombineData:
@@ -9,6 +10,9 @@ class CombineData:
         place types and updating the data accordingly.
         :param data (pandas.DataFrame): The main DataFrame containing the data to be combined and updated.
         :param df (pandas.DataFrame): A DataFrame containing information about place types and their coordinates.
+        :param area_weighted (bool): If True, the place types of areas, i.e., the landuse and nature types in
+        coverage_places, get the fraction of each cell covered by their polygons instead of the number of polygons
+        touching the cell.
 
         Methods:
             map_coordinates(): Maps coordinates to specific place types in the main DataFrame and updates the data
@@ -16,65 +20,113 @@ class CombineData:
             __setitem__(key, value): Set an item in the data DataFrame using bracket notation.
             __getitem__(key): Get an item from the data DataFrame using bracket notation.
         """
-    def __init__(self, data: pd.DataFrame, df: pd.DataFrame):
+    # The place types of the landuse and nature areas
+    coverage_places = ['residential', 'commercial', 'industrial', 'construction', 'depot', 'water', 'wood']
+
+    def __init__(self, data: pd.DataFrame, df: pd.DataFrame, area_weighted: bool = False):
         """
         Initialize the CombineData object with data to be combined and a DataFrame containing place type information.
         :param data (pandas.DataFrame): The main DataFrame containing the data to be combined and updated.
         :param df (pandas.DataFrame): A DataFrame containing information about place types and their coordinates.
+        :param area_weighted (bool): Whether the area place types get float coverage layers, see the class.
         """
         print("Combine Data class has been loaded.")
-        self.data, self.df = data, df
+        self.data, self.df, self.area_weighted = data, df, area_weighted
         self.map_coordinates()
 
     def map_coordinates(self):
         """
         Maps coordinates to specific place types in the main DataFrame and updates the data accordingly.
+        All places are joined with the grid cells at once through a spatial index of the cells: a Point is mapped to the
+        cells it lies within, any other geometry to the cells it intersects. The matches are then counted per place
+        type and cell, for water and wood only the presence of a place is marked by 1. With area_weighted, the area
+        place types get the covered fraction of each cell instead, see cell_coverage().
         :return pandas.DataFrame: The main DataFrame with updated data.
         """
-        # Create a dictionary of types of places with the corresponding coordinates of the places
-        dic = defaultdict(list)
-        for _, row in self.df.iterrows():
-            key = row['place']
-            if key in dic.keys():
-                dic[key].append(row['geometry'])
-            else:
-                dic[key] = [row['geometry']]
+        geometries = np.asarray(self.df['geometry'].values, dtype=object)
+        # The place types in the order of their first appearance, with the code of the place type of each place
+        codes, keys = pd.factorize(self.df['place'])
+        tree = shapely.STRtree(np.asarray(self.data['geometry'].values, dtype=object))
+        is_point = shapely.get_type_id(geometries) == 0
+        point_places, point_cells = self.query_cells(tree, geometries, is_point, 'within')
+        other_places, other_cells = self.query_cells(tree, geometries, ~is_point, 'intersects')
+        matches = pd.DataFrame({'place': codes[np.concatenate([point_places, other_places])],
+                                'cell': np.concatenate([point_cells, other_cells])})
+        counts = matches.groupby(['place', 'cell']).size()
 
-        # Iterate through all place types and corresponding coordinates to find the correct grid
-        for key in dic:
-            self.data[key] = 0
+        # Iterate through all place types and write the counts of the cells
+        for code, key in enumerate(keys):
+            if self.area_weighted and key in self.coverage_places:
+                self.data[key] = self.cell_coverage(tree, geometries[(codes == code) & ~is_point])
+                continue
+            column = np.zeros(len(self.data), dtype=np.int64)
+            if code in counts.index.get_level_values('place'):
+                place_counts = counts.loc[code]
+                column[place_counts.index.values] = place_counts.values
             if key in ['water', 'wood']:
-                for coord in dic[key]:
-                    if coord.geom_type == 'Point':
-                        self.data.loc[coord.within(self.data["geometry"]), key] = 1
-                        continue
-                    elif coord.geom_type == 'Polygon':
-                        try:
-                            self.data.loc[coord.intersects(self.data["geometry"]), key] = 1
-                        except ValueError:
-                            print('Polygon does not work')
-                    else:
-                        try:
-                            self.data.loc[coord.intersects(self.data["geometry"]), key] = 1
-                        except ValueError:
-                            print('Multipolygon does not work')
-            else:
-                for coord in dic[key]:
-                    if coord.geom_type == 'Point':
-                        self.data.loc[coord.within(self.data["geometry"]), key] += 1
-                        continue
-                    elif coord.geom_type == 'Polygon':
-                        try:
-                            self.data.loc[coord.intersects(self.data["geometry"]), key] += 1
-                        except ValueError:
-                            print('Polygon does not work')
-                    else:
-                        try:
-                            self.data.loc[coord.intersects(self.data["geometry"]), key] += 1
-                        except ValueError:
-                            print('Multipolygon does not work')
+                column = np.minimum(column, 1)
+            self.data[key] = column
         return self.data
 
+    def cell_coverage(self, tree, geometries):
+        """
+        Computes the fraction of each cell covered by the given polygons. The candidate pairs of polygons and cells are
+        found with the spatial index of the cells. Cells lying completely inside of a polygon are covered fully, only
+        the other pairs are clipped, all at once. Lines do not cover any area. The clipped pieces of overlapping
+        polygons are united per cell, so the area they share is only counted once.
+        :param tree (shapely.STRtree): The spatial index of the cell polygons.
+        :param geometries (numpy.ndarray): The polygons of one place type.
+        :return numpy.ndarray: The covered fraction of each cell, in the order of the main DataFrame.
+        """
+        cells = np.asarray(self.data['geometry'].values, dtype=object)
+        coverage = np.zeros(len(cells))
+        geometries = geometries[shapely.area(geometries) > 0]
+        # Invalid polygons, e.g. with self-intersections, cannot be clipped
+        geometries = np.where(shapely.is_valid(geometries), geometries, shapely.make_valid(geometries))
+        places, positions = self.query_cells(tree, geometries, np.ones(len(geometries), dtype=bool), 'intersects')
+        shapely.prepare(geometries)
+        inside = shapely.contains_properly(geometries[places], cells[positions])
+        coverage[positions[inside]] = 1.0
+        # Clip the pairs of the cells that are not covered fully, sorted by their cell
+        partial = np.flatnonzero(coverage[positions] < 1.0)
+        partial = partial[np.argsort(positions[partial], kind='stable')]
+        clipped = shapely.intersection(geometries[places[partial]], cells[positions[partial]])
+        clipped_cells, starts, counts = np.unique(positions[partial], return_index=True, return_counts=True)
+        areas = shapely.area(clipped[starts])
+        # Only the cells with several pieces have to be united
+        for i in np.flatnonzero(counts > 1):
+            areas[i] = shapely.area(shapely.union_all(clipped[starts[i]:starts[i] + counts[i]]))
+        coverage[clipped_cells] = areas / shapely.area(cells[clipped_cells])
+        return np.minimum(coverage, 1.0)
+
+    @staticmethod
+    def query_cells(tree, geometries, mask, predicate):
+        """
+        Finds the cells of the places selected by the mask with the spatial index of the cells.
+        :param tree (shapely.STRtree): The spatial index of the cell polygons.
+        :param geometries (numpy.ndarray): The geometries of all places.
+        :param mask (numpy.ndarray): The places to be queried.
+        :param predicate (str): The predicate of a place and a cell, i.e., 'within' or 'intersects'.
+        :return tuple: An array with the index of the place and an array with the position of the cell of each match.
+        """
+        indices = np.flatnonzero(mask)
+        try:
+            places, cells = tree.query(geometries[indices], predicate=predicate)
+            return indices[places], cells
+        except (ValueError, shapely.errors.GEOSException):
+            # Query the places one by one to skip only the geometries that do not work
+            places, cells = [], []
+            for index in indices:
+                try:
+                    place_cells = tree.query(geometries[index], predicate=predicate)
+                except (ValueError, shapely.errors.GEOSException):
+                    print(geometries[index].geom_type + ' does not work')
+                    continue
+                places.append(np.full(len(place_cells), index))
+                cells.append(place_cells)
+            return (np.concatenate(places) if places else np.zeros(0, dtype=np.int64),
+                    np.concatenate(cells) if cells else np.zeros(0, dtype=np.int64))
+
     def __setitem__(self, key, value):
         """
         Set an item in the data DataFrame using bracket notation.
@@ -2,12 +2,12 @@
 This class creates the overall dataframe structure with cell polygons
 """
 import numpy as np
-import osmnx as ox
 import geopandas as gpd
 import folium
 import os
 import webbrowser
 from shapely.geometry import Polygon
+from graph_store import default_store
 
 
 class Dataframe:
@@ -29,7 +29,7 @@ class Dataframe:
         # take the extreme coordinates of the city and obtain the box coordinates. The box forms the extreme
         # coordinates of the whole grid
         self.max_lat, self.min_lat, self.max_lon, self.min_lon = tuple(
-            ox.geocode_to_gdf(self.city)[["bbox_north", "bbox_south", "bbox_east", "bbox_west"]].iloc[0])
+            default_store().boundary(self.city)[["bbox_north", "bbox_south", "bbox_east", "bbox_west"]].iloc[0])
         box_lat = np.linspace(self.min_lat, self.max_lat, self.cells_lat + 1)
         box_lon = np.linspace(self.max_lon, self.min_lon, self.cells_lon + 1)
         # create the single grid cells as polygons
@@ -1,9 +1,13 @@
 """
 This class takes a dataframe and updates or creates the population attribute
 """
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import geopandas as gpd
-import osmnx as ox
+import requests
+from graph_store import default_store
 
 
 class PopulationDataframe:
@@ -12,11 +16,20 @@ class PopulationDataframe:
     :param data: The dataframe to be updated with the traffic attribute. If a traffic attribute is not yet persistent
     in the dataframe, it will be created
     :param data_population: A pandas dataframe with population data
+    :param num_threads: The number of concurrent Nominatim lookups of the districts that are not yet cached
     """
-    def __init__(self, data: gpd.GeoDataFrame, data_population: pd.DataFrame):
+    # Oberer Schlossgarten and Hauptbahnhof are exceptions because they need to take the second polygon that is
+    # available over the OSM API
+    second_result_districts = (" Oberer Schlossgarten Mitte Stuttgart", " Hauptbahnhof Mitte Stuttgart")
+    # The minimum time in seconds between two Nominatim requests, as required by its usage policy, and the number of
+    # attempts of a district before the data generation fails
+    min_interval, max_attempts = 1.0, 4
+
+    def __init__(self, data: gpd.GeoDataFrame, data_population: pd.DataFrame, num_threads: int = 4):
         print("Population Dataframe class has been loaded.")
         # Initialize all elements and call functions one after the other
-        self.data, self.data_population = data, data_population
+        self.data, self.data_population, self.num_threads = data, data_population, num_threads
+        self.request_lock, self.next_request = threading.Lock(), 0.0
         self.data_calc()
         self.data_population_calc()
         self.districts_population()
@@ -69,45 +82,65 @@ class PopulationDataframe:
     def districts_population(self):
         # This function creates a new population geopandas dataframe with the population data and the OSM polygon for
         # each district
-        # Initialize the dictionary that will become the dataframe and take the districts from the population dataframe
-        d = {"district": [], "geometry": []}
+        # Take the districts from the population dataframe and the OSM polygon of each district
         districts = self.data_population["District"].tolist()
-        # For each district, take the OSM polygon
-        for district in range(len(districts)):
-            # Oberer Schlossgarten and Hauptbahnhof are exceptions because they need to take the second polygon that is
-            # available over the OSM API
-            if (districts[district] == " Oberer Schlossgarten Mitte Stuttgart") or \
-                    (districts[district] == " Hauptbahnhof Mitte Stuttgart"):
-                try:
-                    gdf_district = ox.geocoder.geocode_to_gdf(districts[district], which_result=2)
-                # It can be from time to time that KeyErrors or ValueErrors arise. We found that it is not predictable
-                # which error occurs when and found generally no pattern in the error messages. This just confuses.
-                # If such an error occurs, the district is overleaped. That also means that the population density for
-                # this district will be set to zero
-                except (ValueError, KeyError):
-                    continue
-            else:
-                try:
-                    gdf_district = ox.geocoder.geocode_to_gdf(districts[district])
-                except (ValueError, KeyError):
-                    continue
-            d["district"].append(districts[district])
-            d["geometry"].append(gdf_district["geometry"][0])
+        geometries = self.geocode_districts(districts)
         # Create a new geopandas dataframe with population data and district polygons
-        df = pd.DataFrame(d)
-        geometry = gpd.GeoSeries.from_wkt(df["geometry"].apply(lambda x: x.wkt), crs="EPSG:3857")
-        self.population_gpd = gpd.GeoDataFrame(df, geometry=geometry, crs="EPSG:3857")
-        self.population_gpd["population"] = self.data_population["Population"].tolist()
+        self.population_gpd = gpd.GeoDataFrame({"district": districts}, geometry=gpd.GeoSeries(geometries),
+                                               crs="EPSG:3857")
         # Compute the population density: Take the area of the OSM polygon of the district and normalize it up to the
         # population density per square kilometer. 110602*73493 are the distance in meters for one degree of latitude
         # and longitude, respectively. Normalization by dividing by 1000 is done because a cell is 100x100 meters large
         # and not a square kilometer
-        self.population_gpd["population"] = self.population_gpd.apply(
-            lambda row: row["population"]/(row["geometry"].area*110602/1000*73493/1000), axis=1).round()
+        population = self.data_population["Population"].to_numpy(dtype=float)
+        self.population_gpd["population"] = \
+            (population / (self.population_gpd["geometry"].area.to_numpy() * 110602 / 1000 * 73493 / 1000)).round()
         # Set the geometry attribute for the join and return the population geopandas dataframe
         self.population_gpd.set_geometry("geometry")
         return self.population_gpd
 
+    def geocode_districts(self, districts: list):
+        """
+        This function takes the districts and returns their OSM polygons. The polygons are cached on disk by the graph
+        store, the districts that are not yet cached are geocoded concurrently at no more than one request per
+        min_interval seconds
+        :param districts: The list of the district names
+        :return: The list of the polygon of each district
+        """
+        store = default_store()
+        which_results = [2 if district in self.second_result_districts else None for district in districts]
+        misses = sorted({(district, which_result) for district, which_result in zip(districts, which_results)
+                         if not store.is_cached(store.boundary_path(district, which_result))})
+        if misses:
+            print("Geocoding " + str(len(misses)) + " districts that are not cached yet.")
+            with ThreadPoolExecutor(max(1, min(self.num_threads, len(misses)))) as executor:
+                failed = [miss for miss, success in zip(misses, executor.map(self.geocode_district, misses))
+                          if not success]
+            if failed:
+                raise RuntimeError("The districts " + ", ".join(district.strip() for district, _ in failed) +
+                                   " could not be geocoded after " + str(self.max_attempts) + " attempts.")
+        return [store.boundary(district, which_result)["geometry"].iloc[0]
+                for district, which_result in zip(districts, which_results)]
+
+    def geocode_district(self, miss: tuple):
+        # This function geocodes a district into the cache of the graph store and returns whether it succeeded. It can
+        # be from time to time that KeyErrors, ValueErrors or connection errors arise without a predictable pattern, so
+        # the request is repeated with an increasing pause
+        district, which_result = miss
+        for attempt in range(self.max_attempts):
+            with self.request_lock:
+                pause = self.next_request - time.monotonic()
+                self.next_request = time.monotonic() + max(pause, 0.0) + self.min_interval
+            time.sleep(max(pause, 0.0))
+            try:
+                default_store().boundary(district, which_result)
+                return True
+            except (ValueError, KeyError, requests.exceptions.RequestException) as error:
+                print("Geocoding " + district.strip() + " failed (" + repr(error) + "), attempt " + str(attempt + 1) +
+                      " of " + str(self.max_attempts) + ".")
+                time.sleep(self.min_interval * 2 ** attempt)
+        return False
+
     def join_population(self):
         # This function joins the dataframe with the population dataframe
         # Join the population dataframe to the dataframe based on whether the centroid of the cell polygon lies within
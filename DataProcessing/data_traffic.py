@@ -3,12 +3,34 @@ This function takes a dataframe and updates or creates a traffic attribute
 """
 import geopandas as gpd
 import matplotlib.pyplot as plt
-import osmnx as ox
-import networkx as nx
+import numpy as np
+import pandas as pd
 import random
 import os
+import multiprocessing
 import webbrowser
-from shapely.geometry import Point
+from concurrent.futures import ProcessPoolExecutor
+import shapely
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from graph_store import default_store
+
+# The network of the routes of a worker process, as returned by prepare_network(). With the fork start method the
+# workers share the network of the parent process, otherwise it is sent to every worker once
+_route_network = None
+
+
+def _init_route_worker(network):
+    global _route_network
+    _route_network = network
+
+
+def _route_chunk(pairs):
+    return TrafficDataframe.route_coordinates(_route_network, pairs)
+
+
+def _betweenness_chunk(task):
+    return TrafficDataframe.accumulate_loads(_route_network, *task)
 
 
 class TrafficDataframe:
@@ -19,11 +41,25 @@ class TrafficDataframe:
     :param city: The city of interest. This is important because traffic data will be created synthetically via
     route simulations in the city.
     :param k_drive, k_bike, k_walk: The number of routes to be simulated with driving, going by bike and walking
+    :param num_processes: The number of processes computing the routes, by default the number of cpus
+    :param model: The traffic model. "routes" simulates k explicit random routes per network type, "betweenness"
+    computes the expected traffic of k routes with population weighted starts from sampled edge betweenness
+    :param num_sources: The number of sampled start nodes per network type of the betweenness model, by default 100
+    :param network_types: The network types whose traffic is created, e.g. ("walk",) to create the walk traffic only
     """
-    def __init__(self, data: gpd.GeoDataFrame, city: str, k_drive: int, k_bike: int, k_walk: int):
+    def __init__(self, data: gpd.GeoDataFrame, city: str, k_drive: int, k_bike: int, k_walk: int,
+                 num_processes: int = None, model: str = "routes", num_sources: int = None,
+                 network_types: tuple = ("drive", "bike", "walk")):
         print("Traffic Dataframe class has been loaded.")
         # Initialize all elements and call functions one after the other
         self.data, self.city, self.k_drive, self.k_bike, self.k_walk = data, city, k_drive, k_bike, k_walk
+        self.num_processes = num_processes or os.cpu_count()
+        if model not in ("routes", "betweenness"):
+            raise ValueError("Unknown traffic model " + str(model) + ", use 'routes' or 'betweenness'.")
+        self.model, self.num_sources = model, num_sources or 100
+        self.network_types = network_types
+        # The weight of each Point of the node coordinates, None if each Point counts once
+        self.node_weights_drive = self.node_weights_bike = self.node_weights_walk = None
         self.node_coordinates_drive, self.node_coordinates_bike, self.node_coordinates_walk = self.route_instances()
         # The method route_instances() uses the function create_routes(). The method merge_data() is executed in the
         # main file to return the dataframe directly in the main file and not a TrafficDataframe object in order to
@@ -38,69 +74,340 @@ class TrafficDataframe:
         simulated route. Additionally, the Point of each node in each of the three networks is added for Laplacian
         smoothing
         """
-        # Create a graph of the desired network type and randomly pick k start and end nodes in this graph
-        graph = ox.graph_from_place(self.city, network_type=network_type)
+        # Load the graph of the desired network type from the graph store and simulate the routes in this graph
+        graph = default_store().get(self.city, network_type)
+        return self.simulate_routes(graph, k, self.num_processes)
+
+    def create_betweenness(self, network_type: str, k: int):
+        """
+        This function takes a network type and an integer and computes the expected traffic of as much routes
+        throughout the network with the betweenness model
+        :param network_type: The network type, i.e., "drive", "bike" or "walk"
+        :param k: The number of routes the traffic corresponds to
+        :return: A list with the shapely.geometry Point of each node and each edge geometry coordinate of the network
+        and an array with the expected number of routes passing each Point. Each node additionally counts once for
+        Laplacian smoothing, as in create_routes()
+        """
+        graph = default_store().get(self.city, network_type)
+        node_coordinates = np.array([(data["x"], data["y"]) for node, data in graph.nodes(data=True)], dtype=float)
+        # The population of a cell is split evenly between the nodes in the cell
+        node_weights = None
+        positions = self.cell_positions(self.data, node_coordinates.reshape(-1, 2))
+        if "population" in self.data.columns and positions is not None:
+            population = np.append(self.data["population"].fillna(0).values.astype(float), 0.0)
+            nodes_per_cell = np.bincount(positions[positions >= 0], minlength=len(self.data))
+            node_weights = population[positions] / np.maximum(np.append(nodes_per_cell, 1)[positions], 1)
+        return self.betweenness_traffic(graph, k, self.num_sources, node_weights, self.num_processes)
+
+    @staticmethod
+    def betweenness_traffic(graph, k: float, num_sources: int, node_weights: np.ndarray = None,
+                            num_processes: int = 1):
+        """
+        This function estimates the expected number of routes over each edge and node for k routes between a start node
+        drawn by the node weights and a uniformly drawn end node, as in create_routes(). Instead of simulating single
+        routes, the shortest path trees of num_sources sampled start nodes are accumulated Brandes-style: the load of
+        an edge is the share of end nodes whose shortest path from the start node uses it. The cost therefore grows
+        with the number of sampled start nodes instead of the number of node pairs. The start nodes are split into
+        chunks which are computed by a pool of processes
+        :param graph: The networkx graph of the network, as returned by osmnx
+        :param k: The number of routes the traffic corresponds to
+        :param num_sources: The number of sampled start nodes
+        :param node_weights: The weight of each node as start node, e.g. its population, uniform by default
+        :param num_processes: The number of processes computing the loads
+        :return: A list of shapely.geometry Points and an array with their expected traffic, as in create_betweenness()
+        """
+        network = TrafficDataframe.prepare_network(graph)
+        node_ids, node_coordinates, matrix, edge_geometries = network
+        if node_weights is None or not np.any(node_weights > 0):
+            node_weights = np.ones(len(node_ids))
+        sources = np.array(random.choices(range(len(node_ids)), weights=node_weights, k=num_sources), dtype=np.int64)
+        # Each sampled start node stands for k / num_sources routes, each end node for a share of 1 / number of nodes
+        weight = k / (num_sources * len(node_ids))
+        if num_processes > 1 and num_sources > 1:
+            bounds = np.linspace(0, num_sources, min(num_sources, num_processes * 4) + 1).astype(int)
+            tasks = [(sources[start:end], weight) for start, end in zip(bounds[:-1], bounds[1:])]
+            if "fork" in multiprocessing.get_all_start_methods():
+                _init_route_worker(network)
+                executor = ProcessPoolExecutor(num_processes, mp_context=multiprocessing.get_context("fork"))
+            else:
+                executor = ProcessPoolExecutor(num_processes, initializer=_init_route_worker, initargs=(network,))
+            with executor:
+                results = list(executor.map(_betweenness_chunk, tasks))
+        else:
+            results = [TrafficDataframe.accumulate_loads(network, sources, weight)]
+        edge_loads = sum(result[0] for result in results)
+        node_loads = sum(result[1] for result in results)
+        # Rasterize the loads: each coordinate of an edge geometry carries the load of the edge, each node carries its
+        # load and counts once for Laplacian smoothing
+        rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+        coordinates, weights = [], []
+        for edge, (row, col) in enumerate(zip(rows, matrix.indices)):
+            if edge_loads[edge] > 0 and (row, col) in edge_geometries:
+                coordinates.append(edge_geometries[(row, col)])
+                weights.append(np.full(len(edge_geometries[(row, col)]), edge_loads[edge]))
+        coordinates = np.concatenate(coordinates + [node_coordinates])
+        weights = np.concatenate(weights + [node_loads + 1])
+        return shapely.points(coordinates).tolist(), weights
+
+    @staticmethod
+    def accumulate_loads(network, sources: np.ndarray, weight: float, batch_size: int = 16):
+        """
+        This function accumulates the loads of the shortest path trees of the start nodes. In each tree, the load of a
+        node is the weight of all end nodes in its subtree, which is summed up from the deepest nodes to the root. The
+        load of an edge is the load of the node it leads to
+        :param network: The network as returned by prepare_network()
+        :param sources: The positions of the start nodes
+        :param weight: The weight of each pair of start and end node
+        :param batch_size: The number of start nodes searched at once
+        :return: An array with the load of each edge, in the order of the sparse matrix, and an array with the load
+        of each node
+        """
+        node_ids, node_coordinates, matrix, edge_geometries = network
+        num_nodes = matrix.shape[0]
+        rows = np.repeat(np.arange(num_nodes), np.diff(matrix.indptr)).astype(np.int64)
+        edge_keys = rows * num_nodes + matrix.indices
+        edge_order = np.argsort(edge_keys, kind="stable")
+        edge_loads = np.zeros(matrix.nnz)
+        node_loads = np.zeros(num_nodes)
+        for batch_start in range(0, len(sources), batch_size):
+            batch = sources[batch_start:batch_start + batch_size]
+            predecessors = dijkstra(matrix, indices=np.unique(batch), return_predecessors=True)[1]
+            for source, parents in zip(np.unique(batch), predecessors):
+                # A start node sampled several times counts several times
+                count = np.count_nonzero(batch == source)
+                reached = (parents >= 0) | (np.arange(num_nodes) == source)
+                parents = np.where(parents >= 0, parents, np.arange(num_nodes)).astype(np.int64)
+                depth = self_depth = (parents != np.arange(num_nodes)).astype(np.int64)
+                # The depth of each node in the tree by pointer jumping
+                ancestors = parents.copy()
+                while np.any(ancestors[ancestors] != ancestors):
+                    depth = depth + depth[ancestors]
+                    ancestors = ancestors[ancestors]
+                loads = np.where(reached, weight * count, 0.0)
+                order = np.argsort(-depth, kind="stable")
+                level_bounds = np.flatnonzero(np.diff(depth[order])) + 1
+                for level in np.split(order, level_bounds):
+                    if depth[level[0]] == 0:
+                        break
+                    np.add.at(loads, parents[level], loads[level])
+                node_loads += loads
+                children = np.flatnonzero(self_depth & reached)
+                edges = edge_order[np.searchsorted(edge_keys[edge_order], parents[children] * num_nodes + children)]
+                edge_loads[edges] += loads[children]
+        return edge_loads, node_loads
+
+    @staticmethod
+    def simulate_routes(graph, k: int, num_processes: int = 1):
+        """
+        This function randomly picks k start and end nodes in the graph and simulates the shortest routes between them.
+        The routes are split into chunks which are computed by a pool of processes
+        :param graph: The networkx graph of the network, as returned by osmnx
+        :param k: The number of routes to be simulated
+        :param num_processes: The number of processes computing the routes
+        :return: The list of shapely.geometry Points as described in create_routes()
+        """
         start_nodes = random.choices(list(graph.nodes()), k=k)
         end_nodes = random.choices(list(graph.nodes()), k=k)
-        # Nodes is a list of lists of which each list corresponds to one route by the shortest path
-        # One route consists of a list of nodes that are passed by the route
+        network = TrafficDataframe.prepare_network(graph)
+        node_ids, node_coordinates = network[0], network[1]
+        pairs = np.stack([node_ids.get_indexer(start_nodes), node_ids.get_indexer(end_nodes)], axis=1).reshape(-1, 2)
+        if num_processes > 1 and k > 1:
+            # Several chunks per process balance the different lengths of the routes, consecutive chunks keep the
+            # order of the routes
+            bounds = np.linspace(0, k, min(k, num_processes * 4) + 1).astype(int)
+            chunks = [pairs[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+            if "fork" in multiprocessing.get_all_start_methods():
+                _init_route_worker(network)
+                executor = ProcessPoolExecutor(num_processes, mp_context=multiprocessing.get_context("fork"))
+            else:
+                executor = ProcessPoolExecutor(num_processes, initializer=_init_route_worker, initargs=(network,))
+            with executor:
+                results = list(executor.map(_route_chunk, chunks))
+        else:
+            results = [TrafficDataframe.route_coordinates(network, pairs)]
+        # Generally, for each node in the graph, the coordinate gets written to the final coordinates. Afterwards, the
+        # coordinate of each node on each route gets written to the final coordinates
+        route_nodes = np.concatenate([result[1] for result in results])
+        coordinates = np.concatenate([result[0] for result in results] +
+                                     [node_coordinates, node_coordinates[route_nodes]])
+        return shapely.points(coordinates).tolist()
+
+    @staticmethod
+    def prepare_network(graph):
+        """
+        This function converts the graph into arrays for the route simulation. Of parallel edges only the shortest one
+        is kept, as osmnx does for the edges of a route
+        :param graph: The networkx graph of the network
+        :return: A tuple of the pandas Index of the node ids, an array with the coordinates of the nodes, a sparse
+        matrix with the lengths of the edges between the positions of the nodes and a dictionary of the edges between
+        positions of nodes to the coordinates of their geometry. Edges without a geometry attribute are not in the
+        dictionary
+        """
+        node_ids = pd.Index(list(graph.nodes()))
+        node_coordinates = np.array([(data["x"], data["y"]) for node, data in graph.nodes(data=True)],
+                                    dtype=float).reshape(-1, 2)
+        shortest_edges = {}
+        for u, v, data in graph.edges(data=True):
+            if u != v and ((u, v) not in shortest_edges or data["length"] < shortest_edges[(u, v)]["length"]):
+                shortest_edges[(u, v)] = data
+        rows = node_ids.get_indexer([u for u, v in shortest_edges])
+        cols = node_ids.get_indexer([v for u, v in shortest_edges])
+        # Edges of length 0 would not be stored in the sparse matrix, so they get a negligible length instead
+        lengths = np.maximum([data["length"] for data in shortest_edges.values()], 1e-9)
+        matrix = csr_matrix((lengths, (rows, cols)), shape=(len(node_ids), len(node_ids)))
+        edge_geometries = {(row, col): np.asarray(data["geometry"].coords, dtype=float)[:, :2]
+                           for row, col, data in zip(rows, cols, shortest_edges.values()) if "geometry" in data}
+        return node_ids, node_coordinates, matrix, edge_geometries
+
+    @staticmethod
+    def route_coordinates(network, pairs: np.ndarray, batch_size: int = 16):
+        """
+        This function computes the shortest route for each pair of start and end node. The routes of up to batch_size
+        start nodes are computed at once by a single-source shortest path search
+        :param network: The network as returned by prepare_network()
+        :param pairs: An array with the positions of a start and an end node in each row
+        :param batch_size: The number of start nodes searched at once
+        :return: An array with the coordinates of the geometries of all edges on the routes and an array with the
+        positions of all nodes on the routes
+        """
+        node_ids, node_coordinates, matrix, edge_geometries = network
+        sources = np.unique(pairs[:, 0])
+        routes = [None] * len(pairs)
+        for batch_start in range(0, len(sources), batch_size):
+            batch = sources[batch_start:batch_start + batch_size]
+            predecessors = dijkstra(matrix, indices=batch, return_predecessors=True)[1]
+            for row, source in enumerate(batch):
+                for i in np.flatnonzero(pairs[:, 0] == source):
+                    route = [pairs[i, 1]]
+                    while route[-1] != source and route[-1] >= 0:
+                        route.append(predecessors[row, route[-1]])
+                    # A negative predecessor means that there is no path, which can happen if a route goes through
+                    # one-way streets or other weird things happen. These routes are just overleaped
+                    if route[-1] == source:
+                        routes[i] = route[::-1]
+        edge_coordinates = []
         nodes = []
-        for i in range(k):
-            try:
-                nodes.append(nx.shortest_path(graph, start_nodes[i], end_nodes[i], weight="length"))
-            # NetworkXNoPath can happen if a route goes through one-way streets or other weird things happen
-            # This error is experienced to happen in less than 1 percent of the routes to be simulated. These routes
-            # which we tried to simulated are then just overleaped
-            except nx.NetworkXNoPath:
+        for route in routes:
+            if route is None:
                 continue
-        # Node coordinates is a list with the coordinates of all edges on each route. This initializes the final list
-        # which is returned in the end
-        node_coordinates = []
-        # Take each single route
-        for route in nodes:
-            # Iterate over the number of edges on this route
-            for i in range(len(ox.utils_graph.get_route_edge_attributes(graph, route))):
-                # Take each edge on the route and the coords of its geometry attribute and write is shapely.geometry
-                # Point to the list
-                try:
-                    for element in ox.utils_graph.get_route_edge_attributes(graph, route)[i]["geometry"].coords:
-                        node_coordinates.append(Point(element))
-                # For some reasons, not each edge on the route has got a geometry attribute, so these edges are just
-                # overleaped
-                except KeyError:
-                    continue
-        # Nodes disentangles the list of lists structure
-        nodes = [node for route in nodes for node in route]
-        # Generally, for each node in the graph, the coordinate gets written to the final coordinates
-        for node, data in graph.nodes(data=True):
-            node_coordinates.append(Point((data["x"], data["y"])))
-        # For each node on each route, the coordinate gets written to the final coordinates
-        for element in nodes:
-            node_coordinates.append([Point((data["x"], data["y"])) for node, data in graph.nodes(data=True)
-                                     if node == element][0])
-        return node_coordinates
+            nodes.extend(route)
+            # Take the coords of the geometry attribute of each edge on the route. For some reasons, not each edge on
+            # the route has got a geometry attribute, so these edges are just overleaped
+            for u, v in zip(route[:-1], route[1:]):
+                if (u, v) in edge_geometries:
+                    edge_coordinates.append(edge_geometries[(u, v)])
+        edge_coordinates = np.concatenate(edge_coordinates) if edge_coordinates else np.zeros((0, 2))
+        return edge_coordinates, np.array(nodes, dtype=np.int64)
 
     def route_instances(self):
         # Finally create the routes. Apply the k_drive, k_bike, k_walk parameters to the create_routes() function
-        # and return the node coordinates as a tuple
-        self.node_coordinates_drive = self.create_routes(network_type="drive", k=self.k_drive)
-        self.node_coordinates_bike = self.create_routes(network_type="bike", k=self.k_bike)
-        self.node_coordinates_walk = self.create_routes(network_type="walk", k=self.k_walk)
+        # and return the node coordinates as a tuple. The betweenness model additionally keeps the weights of the
+        # node coordinates. The network types that are not created have no node coordinates
+        instances = {}
+        for network_type, k in (("drive", self.k_drive), ("bike", self.k_bike), ("walk", self.k_walk)):
+            if network_type not in self.network_types:
+                instances[network_type] = ([], np.zeros(0))
+            elif self.model == "betweenness":
+                instances[network_type] = self.create_betweenness(network_type, k)
+            else:
+                instances[network_type] = (self.create_routes(network_type=network_type, k=k), None)
+        self.node_coordinates_drive, self.node_weights_drive = instances["drive"]
+        self.node_coordinates_bike, self.node_weights_bike = instances["bike"]
+        self.node_coordinates_walk, self.node_weights_walk = instances["walk"]
         return self.node_coordinates_drive, self.node_coordinates_bike, self.node_coordinates_walk
 
     def merge_data(self):
         # Initialize and increment traffic attribute. If there is already a traffic attribute in the dataframe, it will
         # be set back to 0. For each single Point in the node_coordinates list, the cell in which to Point lies gets
         # incremented by one. The dataframe then is returned back
-        self.data["traffic"] = 0
-        for element in self.node_coordinates_drive:
-            self.data.loc[element.within(self.data["geometry"]), "traffic"] += 1
-        for element in self.node_coordinates_bike:
-            self.data.loc[element.within(self.data["geometry"]), "traffic"] += 1
-        for element in self.node_coordinates_walk:
-            self.data.loc[element.within(self.data["geometry"]), "traffic"] += 1
+        node_coordinates = self.node_coordinates_drive + self.node_coordinates_bike + self.node_coordinates_walk
+        node_weights = None
+        if self.model == "betweenness":
+            node_weights = np.concatenate([self.node_weights_drive, self.node_weights_bike, self.node_weights_walk])
+        self.data["traffic"] = self.count_points(self.data, node_coordinates, node_weights)
         return self.data
 
+    @staticmethod
+    def grid_lookup(data: gpd.GeoDataFrame):
+        """
+        This function recovers the regular lat/lon box of the grid cells as created by Dataframe.initialize() from the
+        bounds of the cell polygons
+        :param data: The dataframe with the cell polygons
+        :return: The sorted latitude edges, the sorted longitude edges and an array with the row of the dataframe for
+        each latitude and longitude interval. None if the cells do not form a regular box of rectangles
+        """
+        bounds = data.geometry.bounds
+        lat_edges = np.unique(np.concatenate([bounds["miny"].values, bounds["maxy"].values]))
+        lon_edges = np.unique(np.concatenate([bounds["minx"].values, bounds["maxx"].values]))
+        if (len(lat_edges) - 1) * (len(lon_edges) - 1) != len(data):
+            return None
+        rows = np.searchsorted(lat_edges, bounds["miny"].values)
+        cols = np.searchsorted(lon_edges, bounds["minx"].values)
+        # Each cell has to span exactly one interval in both directions and has to fill its bounding box
+        if (rows + 1 >= len(lat_edges)).any() or (cols + 1 >= len(lon_edges)).any():
+            return None
+        if (lat_edges[rows + 1] != bounds["maxy"].values).any() or (lon_edges[cols + 1] != bounds["maxx"].values).any():
+            return None
+        if not np.allclose(data.geometry.area.values,
+                           (bounds["maxx"] - bounds["minx"]).values * (bounds["maxy"] - bounds["miny"]).values):
+            return None
+        lookup = np.full((len(lat_edges) - 1, len(lon_edges) - 1), -1, dtype=np.int64)
+        lookup[rows, cols] = np.arange(len(data))
+        if (lookup < 0).any():
+            return None
+        return lat_edges, lon_edges, lookup
+
+    @staticmethod
+    def bin_coordinates(values: np.ndarray, edges: np.ndarray):
+        """
+        This function computes the interval of each value between the sorted edges. As for Point.within(), a value has
+        to lie strictly inside an interval, values on an edge or outside of the edges get the interval -1
+        """
+        index = np.searchsorted(edges, values, side="right") - 1
+        inside = (index >= 0) & (index < len(edges) - 1)
+        inside[inside] &= values[inside] > edges[index[inside]]
+        return np.where(inside, index, -1)
+
+    @staticmethod
+    def cell_positions(data: gpd.GeoDataFrame, coordinates: np.ndarray):
+        """
+        This function computes the row of the dataframe of the cell in which each coordinate lies with arithmetic on the
+        regular lat/lon box of the grid
+        :param data: The dataframe with the cell polygons
+        :param coordinates: An array with the longitude and latitude of each coordinate
+        :return: An array with the row of the cell of each coordinate, -1 for coordinates which are not within a cell.
+        None if the cells do not form a regular box
+        """
+        grid = TrafficDataframe.grid_lookup(data)
+        if grid is None:
+            return None
+        lat_edges, lon_edges, lookup = grid
+        rows = TrafficDataframe.bin_coordinates(coordinates[:, 1], lat_edges)
+        cols = TrafficDataframe.bin_coordinates(coordinates[:, 0], lon_edges)
+        return np.where((rows >= 0) & (cols >= 0), lookup[rows, cols], -1)
+
+    @staticmethod
+    def count_points(data: gpd.GeoDataFrame, points: list, weights: np.ndarray = None):
+        """
+        This function counts the shapely.geometry Points in each grid cell. The cell of a Point is computed with
+        arithmetic on the regular lat/lon box of the grid and all Points are counted in one vectorized histogram. If
+        the cells do not form a regular box, each Point is tested against all cell polygons instead
+        :param data: The dataframe with the cell polygons
+        :param points: A list of shapely.geometry Points
+        :param weights: The weight of each Point, by default each Point counts once
+        :return: An array with the number or the summed weight of the Points within each cell, in the order of the
+        dataframe
+        """
+        positions = TrafficDataframe.cell_positions(data, shapely.get_coordinates(points))
+        if positions is None:
+            counts = np.zeros(len(data), dtype=np.int64 if weights is None else float)
+            for i, element in enumerate(points):
+                counts += element.within(data["geometry"]).values * (1 if weights is None else weights[i])
+            return counts
+        inside = positions >= 0
+        return np.bincount(positions[inside], weights=None if weights is None else weights[inside],
+                           minlength=len(data))
+
     def plot_traffic_heatmap(self, data: gpd.GeoDataFrame, cells_lat: int, cells_lon: int):
         """
         This function plots a heatmap of the traffic attribute. The heatmap in the end traces the main traffic roads
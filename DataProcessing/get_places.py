@@ -1,18 +1,42 @@
 # Imports
+import hashlib
+import json
+import os
+import numpy as np
 import pandas as pd
+import geopandas as gpd
 import osmnx as ox
+from graph_store import default_store
 
 
 class OSMPlaces:
     """
     This class provides functionality to retrieve and process various types of places from the OpenStreetMap API
     using the OSMnx library and generate a DataFrame containing relevant information about these places.
+    The places of all categories are retrieved with a single tag query and cached as a GeoParquet file next to the
+    graphs of the graph store, keyed by the city and the tags, so that repeated runs load them from disk.
     :param city (str): The name of the city for which OSM places will be retrieved.
 
     Methods:
         get_osm_places(): Retrieves various types of OSM places, processes the data, and returns a DataFrame
                          containing information about the selected places.
     """
+    # The tags of the place categories: amenities, landuse, public transport, barriers, buildings and nature. A place
+    # with the tags of several categories takes the value of the last of them
+    categories = {
+        'amenity': ['post_office', 'parcel_locker', 'post_depot', 'college', 'university', 'kindergarten', 'school',
+                    'library', 'nursing_home', 'hospital', 'pharmacy', 'charging_station', 'parking', 'bus_station',
+                    'atm', 'bank', 'arts_center', 'cinema', 'theatre'],
+        'landuse': ['depot', 'residential', 'commercial', 'industrial', 'construction'],
+        'public_transport': ['station'],
+        'barrier': ['cycle_barrier'],
+        'building': ['house', 'apartments', 'commercial', 'industrial', 'office', 'retail', 'supermarket', 'civic',
+                     'public', 'religious', 'sports_hall', 'stadium', 'parking'],
+        'natural': ['water', 'wood']}
+    # The columns that are not taken for the places of a category
+    missing_columns = {'barrier': ['name', 'address', 'postcode'], 'natural': ['address', 'postcode']}
+    # The version of the cached places, increase it when the processing of the places changes
+    version = 1
 
     def __init__(self, city: str):
         """
@@ -23,74 +47,61 @@ class OSMPlaces:
         # Initialize all elements
         self.city = city
 
+    def cache_path(self):
+        # The GeoParquet file of the places of the city, with a hash of the tags in its name
+        key = json.dumps({'tags': self.categories, 'version': self.version}, sort_keys=True)
+        return default_store().path(self.city, 'places_' + hashlib.sha1(key.encode('utf-8')).hexdigest()[:8],
+                                    '.parquet')
+
     def get_osm_places(self):
         """
         Retrieves various types of OSM places, processes the data, and returns a DataFrame containing information
-        about the selected places.
-        All the code blocks in the function follow the same structure: First, tags are defined for the places that
-        shall be retrieved from the OSM API as a dictionary. Second, the API request is made. Third, some manipulations
-        of column merging and selection are made.
+        about the selected places. The places are loaded from the cache if they have been retrieved before.
         :return: pandas.DataFrame: A DataFrame containing information about selected OSM places, including columns for
         place type, geometry, name, address, and postcode.
         """
-        # First: Amenities
-        tags = {'amenity': ['post_office', 'parcel_locker', 'post_depot', 'college', 'university', 'kindergarten',
-                            'school', 'library', 'nursing_home', 'hospital', 'pharmacy', 'charging_station', 'parking',
-                            'bus_station', 'atm', 'bank', 'arts_center', 'cinema', 'theatre']}
-        amenities = ox.geometries_from_place(self.city, tags=tags)
-        amenities['address'] = amenities['addr:street'] + ' ' + amenities['addr:housenumber']
-        amenities = amenities[['amenity', 'geometry', 'name', 'address', 'addr:postcode']]
-
-        # Second: Landuse
-        tags = {'landuse': ['depot', 'residential', 'commercial', 'industrial', 'construction', 'depot']}
-        landuse = ox.geometries_from_place(self.city, tags=tags)
-        landuse['address'] = landuse['addr:street'] + ' ' + landuse['addr:housenumber']
-        landuse = landuse[['landuse', 'geometry', 'name', 'address', 'addr:postcode']]
-
-        # Third: Public Transport
-        tags = {'public_transport': 'station'}
-        public_transport = ox.geometries_from_place(self.city, tags=tags)
-        public_transport['address'] = public_transport['addr:street'] + ' ' + public_transport['addr:housenumber']
-        public_transport = public_transport[['public_transport', 'geometry', 'name', 'address', 'addr:postcode']]
+        store, path = default_store(), self.cache_path()
+        if os.path.exists(path):
+            return gpd.read_parquet(path)
+        places = ox.geometries_from_place(store.check_online(self.city, path), tags=self.categories)
+        return self.save_places(self.resolve_places(places))
 
-        # Fourth: Barriers
-        tags = {'barrier': 'cycle_barrier'}
-        barrier = ox.geometries_from_place(self.city, tags=tags)
-        barrier = barrier[['barrier', 'geometry']]
-
-        # Fifth: Buildings
-        tags = {'building': ['house', 'apartments', 'commercial', 'industrial', 'office', 'retail', 'supermarket',
-                             'civic', 'public', 'religious', 'sports_hall', 'stadium', 'parking']}
-        buildings = ox.geometries_from_place(self.city, tags=tags)
-        buildings['address'] = buildings['addr:street'] + ' ' + buildings['addr:housenumber']
-        buildings = buildings[['building', 'geometry', 'name', 'address', 'addr:postcode']]
-
-        # Sixth: Nature
-        tags = {'natural': ['water', 'wood']}
-        nature = ox.geometries_from_place(self.city, tags=tags)
-        nature = nature[['natural', 'geometry', 'name']]
+    def save_places(self, df: gpd.GeoDataFrame):
+        """
+        Writes the places of the city to the cache, e.g. the places read from a local extract.
+        :param df (geopandas.GeoDataFrame): The places as returned by resolve_places().
+        :return: geopandas.GeoDataFrame: The places.
+        """
+        path = self.cache_path()
+        # Write to a temporary file first, so a concurrent reader never sees a partially written file
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        df.to_parquet(path + '.' + str(os.getpid()) + '.tmp')
+        os.replace(path + '.' + str(os.getpid()) + '.tmp', path)
+        return df
 
-        # Concatenate the sixth obtained dataframes together and some manipulations
-        places = pd.concat([amenities, landuse, public_transport, barrier, buildings, nature], axis=0,
-                           ignore_index=True)
-        places = places.drop_duplicates()
-        places = places.rename(columns={"addr:postcode": "postcode"})
-        places['place'] = places['amenity']
-        places['place'] = places['place'].fillna(places['landuse'])
-        places['place'] = places['place'].fillna(places['public_transport'])
-        places['place'] = places['place'].fillna(places['barrier'])
-        places['place'] = places['place'].fillna(places['building'])
-        places['place'] = places['place'].fillna(places['natural'])
-        # print('Number of places extracted: ', len(places))
+    @classmethod
+    def resolve_places(cls, places: gpd.GeoDataFrame):
+        """
+        Takes the places of the tag query and resolves the place type, name, address and postcode of each place.
+        The place type of a place is the value of its last category, as if the categories were queried one after the
+        other and the duplicates of the earlier categories were dropped. The places are ordered by their category.
+        :param places (geopandas.GeoDataFrame): The places as returned by osmnx.geometries_from_place.
+        :return: pandas.DataFrame: The places with the columns place, geometry, name, address and postcode.
+        """
+        def column(name):
+            return places[name] if name in places else pd.Series(np.nan, index=places.index, dtype=object)
 
-        # Create the finale dataframe with places and drop the not needed categories
-        tags = ['post_office', 'parcel_locker', 'post_depot', 'college', 'university', 'kindergarten',
-                'school', 'library', 'nursing_home', 'hospital', 'pharmacy', 'charging_station', 'parking',
-                'bus_station', 'atm', 'bank', 'arts_center', 'cinema', 'theatre', 'depot', 'residential',
-                'commercial', 'industrial', 'construction', 'depot', 'station', 'cycle_barrier', 'house', 'apartments',
-                'commercial', 'industrial', 'office', 'retail', 'supermarket',
-                'civic', 'public', 'religious', 'sports_hall', 'stadium', 'parking', 'water', 'wood']
-        df = places[places['place'].isin(tags)].copy()
-        df = df[['place', 'geometry', 'name', 'address', 'postcode']]
-        df = df.drop_duplicates(subset=['geometry', 'name'], keep='last')
-        return df
+        place = pd.Series(np.nan, index=places.index, dtype=object)
+        category = np.full(len(places), -1)
+        for code, (key, values) in enumerate(cls.categories.items()):
+            matches = column(key).isin(values).to_numpy()
+            place[matches] = column(key)[matches]
+            category[matches] = code
+        df = gpd.GeoDataFrame({'place': place, 'geometry': places.geometry, 'name': column('name'),
+                               'address': column('addr:street') + ' ' + column('addr:housenumber'),
+                               'postcode': column('addr:postcode')}, geometry='geometry', crs=places.crs)
+        for key, missing in cls.missing_columns.items():
+            df.loc[category == list(cls.categories).index(key), missing] = np.nan
+        order = np.argsort(category, kind='stable')
+        df = df.iloc[order[category[order] >= 0]].reset_index(drop=True)
+        return df.drop_duplicates(subset=['geometry', 'name'], keep='last')
@@ -0,0 +1,225 @@
+"""
+This class stores the OSM network graphs of all subsystems on disk, so that every network is downloaded only once
+"""
+import hashlib
+import os
+import pickle
+import re
+
+import networkx as nx
+import numpy as np
+import osmnx as ox
+from osmnx import _overpass
+from scipy.spatial import cKDTree
+
+# The OSM way tags the network filters of osmnx depend on, in addition to the default useful tags of osmnx
+FILTER_TAGS = ["motor_vehicle", "motorcar", "bicycle", "foot"]
+
+# The store shared by all callers of default_store(), it keeps the loaded graphs in memory
+_default_store = None
+
+
+def default_store():
+    """
+    This function returns the graph store shared by all subsystems. The cache directory is taken from the environment
+    variable GREENPICKUP_GRAPH_CACHE, the store works offline if GREENPICKUP_OFFLINE is set to 1
+    :return: The shared GraphStore
+    """
+    global _default_store
+    if _default_store is None:
+        _default_store = GraphStore(os.environ.get("GREENPICKUP_GRAPH_CACHE"),
+                                    os.environ.get("GREENPICKUP_OFFLINE", "0") == "1")
+    return _default_store
+
+
+class GraphStore:
+    """
+    This class provides the network graphs of a place, keyed by (place, network_type, simplify, version). The graphs are
+    persisted as pickle files, which load in seconds instead of the minutes of a download or a graphml file. Only the
+    "all" network of a place is downloaded, the "drive", "bike" and "walk" networks are derived from it with the same
+    Overpass filters osmnx uses for their download, made bidirectional for "walk", reduced to their largest component
+    and simplified. As the "all" network is truncated to the place before the views are simplified, the edges at the
+    border of a place can differ slightly from a direct download
+    :param cache_dir: The directory of the graph files, by default the directory graphCache next to DataProcessing
+    :param offline: If True, a graph or boundary that would have to be downloaded raises a FileNotFoundError instead.
+    The views of a cached "all" network are still derived offline
+    """
+    # The version of the stored graphs, increase it when the derivation of the graphs changes
+    version = 1
+
+    def __init__(self, cache_dir: str = None, offline: bool = False):
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "graphCache")
+        self.cache_dir, self.offline = os.path.abspath(cache_dir), offline
+        # The graphs and boundaries loaded by this store, keyed by their file, and the nearest node trees of the graphs
+        self.loaded, self.trees = {}, {}
+
+    def path(self, place: str, name: str, extension: str = ".pickle"):
+        # The file of a place and a name, e.g. "bike_simplified". A hash of the place keeps similar names apart
+        slug = re.sub(r"[^a-z0-9]+", "_", place.lower()).strip("_")
+        digest = hashlib.sha1(place.encode("utf-8")).hexdigest()[:8]
+        return os.path.join(self.cache_dir, slug + "_" + digest + "_" + name + "_v" + str(self.version) + extension)
+
+    def load(self, path: str):
+        with open(path, "rb") as file:
+            return pickle.load(file)
+
+    def save(self, path: str, value):
+        # Write to a temporary file first, so a concurrent reader never sees a partially written file
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temporary_path = path + "." + str(os.getpid()) + ".tmp"
+        with open(temporary_path, "wb") as file:
+            pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, path)
+
+    def put(self, path: str, value):
+        # Persists a value that has been created outside of the store, e.g. from a local extract
+        self.save(path, value)
+        self.loaded[path] = value
+
+    def forget(self, place: str):
+        # Removes the derived networks of a place from memory and disk, they are derived again on their next use
+        for network_type in ("all", "drive", "bike", "walk"):
+            for name in (network_type, network_type + "_simplified"):
+                path = self.path(place, name)
+                if name != "all" and self.is_cached(path):
+                    self.loaded.pop(path, None)
+                    if os.path.exists(path):
+                        os.remove(path)
+
+    def cached(self, path: str, create):
+        """
+        This function returns a value from memory or from disk, or creates and persists it
+        :param path: The file of the value
+        :param create: A function without arguments which creates the value
+        :return: The value
+        """
+        if path in self.loaded:
+            return self.loaded[path]
+        if os.path.exists(path):
+            value = self.load(path)
+        else:
+            value = create()
+            self.save(path, value)
+        self.loaded[path] = value
+        return value
+
+    def is_cached(self, path: str):
+        return path in self.loaded or os.path.exists(path)
+
+    def boundary_path(self, place: str, which_result: int = None):
+        return self.path(place, "boundary" if which_result is None else "boundary_" + str(which_result))
+
+    def boundary(self, place: str, which_result: int = None):
+        """
+        This function returns the geocoded boundary of a place, as returned by osmnx.geocode_to_gdf
+        :param place: The place, e.g. "Stuttgart, Germany"
+        :param which_result: The result of the Nominatim query to take, by default the first polygon
+        :return: A GeoDataFrame with the boundary polygon and the bounding box of the place
+        """
+        path = self.boundary_path(place, which_result)
+        return self.cached(path, lambda: ox.geocode_to_gdf(self.check_online(place, path), which_result=which_result))
+
+    def get(self, place: str, network_type: str = "all", simplify: bool = True):
+        """
+        This function returns the network graph of a place, e.g. to replace osmnx.graph_from_place
+        :param place: The place, e.g. "Stuttgart, Germany"
+        :param network_type: The network type, i.e., "all", "drive", "bike" or "walk"
+        :param simplify: Whether the graph topology is simplified, as in osmnx
+        :return: The networkx MultiDiGraph of the network
+        """
+        if network_type not in ("all", "drive", "bike", "walk"):
+            raise ValueError("Unknown network type " + str(network_type) + ", use 'all', 'drive', 'bike' or 'walk'.")
+        name = network_type + ("_simplified" if simplify else "")
+        if network_type == "all" and not simplify:
+            path = self.path(place, name)
+            return self.cached(path, lambda: self.download(self.check_online(place, path)))
+        return self.cached(self.path(place, name),
+                           lambda: self.derive(self.get(place, "all", simplify=False), network_type, simplify))
+
+    def check_online(self, place: str, path: str):
+        # Returns the place if the store may download it
+        if self.offline:
+            raise FileNotFoundError("The graph store is offline and " + path + " is not cached.")
+        return place
+
+    def download(self, place: str):
+        # Download the unsimplified "all" network with the tags that the filters of the other networks depend on
+        polygon = self.boundary(place)["geometry"].iloc[0]
+        useful_tags_way = ox.settings.useful_tags_way
+        ox.settings.useful_tags_way = list(dict.fromkeys(useful_tags_way + FILTER_TAGS))
+        try:
+            print("Downloading the network of " + place + ".")
+            return ox.graph_from_polygon(polygon, network_type="all", simplify=False, retain_all=True)
+        finally:
+            ox.settings.useful_tags_way = useful_tags_way
+
+    @staticmethod
+    def edge_filter(network_type: str):
+        """
+        This function parses the Overpass filter osmnx downloads a network type with
+        :param network_type: The network type, i.e., "all", "drive", "bike" or "walk"
+        :return: A function that takes the attributes of an unsimplified edge and returns whether it is in the network
+        """
+        clauses = [(key, operator, re.compile(pattern or "")) for key, operator, pattern in
+                   re.findall(r'\["([^"]+)"(?:(!?~)"([^"]*)")?\]', _overpass._get_osm_filter(network_type))]
+
+        def keep(data: dict):
+            for key, operator, pattern in clauses:
+                value = data.get(key)
+                if operator == "!~":
+                    if value is not None and pattern.search(str(value)):
+                        return False
+                elif value is None or (operator == "~" and not pattern.search(str(value))):
+                    return False
+            return True
+        return keep
+
+    @staticmethod
+    def derive(graph: nx.MultiDiGraph, network_type: str, simplify: bool = True):
+        """
+        This function derives a network from the unsimplified "all" network
+        :param graph: The unsimplified "all" network, as returned by download()
+        :param network_type: The network type, i.e., "all", "drive", "bike" or "walk"
+        :param simplify: Whether the graph topology is simplified
+        :return: The networkx MultiDiGraph of the network
+        """
+        keep = GraphStore.edge_filter(network_type)
+        view = nx.MultiDiGraph(**graph.graph)
+        view.add_edges_from((u, v, key, data) for u, v, key, data in graph.edges(keys=True, data=True) if keep(data))
+        view.add_nodes_from((node, graph.nodes[node]) for node in list(view.nodes))
+        if network_type in ox.settings.bidirectional_network_types:
+            # One-way streets can be used in both directions, as in osmnx
+            for u, v, key, data in list(view.edges(keys=True, data=True)):
+                if data.get("oneway"):
+                    view.add_edge(v, u, **dict(data, reversed=not data.get("reversed", False)))
+            nx.set_edge_attributes(view, False, "oneway")
+        view = ox.utils_graph.get_largest_component(view)
+        if simplify:
+            view = ox.simplify_graph(view)
+        nx.set_node_attributes(view, ox.stats.count_streets_per_node(view), name="street_count")
+        return view
+
+    def nearest_nodes(self, graph: nx.MultiDiGraph, coordinates):
+        """
+        This function returns the nearest node of each coordinate, measured by the chord on the unit sphere, which
+        orders the nodes like the great-circle distance. The tree of a graph is built once and kept by the store
+        :param graph: A graph with the x (lon) and y (lat) node attributes, e.g. as returned by get()
+        :param coordinates: A list of (lat, lon) coordinate tuples
+        :return: A list with the node of each coordinate
+        """
+        if id(graph) not in self.trees:
+            nodes = np.array(list(graph.nodes))
+            points = np.array([(data["y"], data["x"]) for _, data in graph.nodes(data=True)], dtype=float)
+            # Keep the graph referenced, so its id cannot be reused by another graph
+            self.trees[id(graph)] = (graph, nodes, cKDTree(self.unit_vectors(points)))
+        _, nodes, tree = self.trees[id(graph)]
+        _, positions = tree.query(self.unit_vectors(np.asarray(coordinates, dtype=float).reshape(-1, 2)))
+        return [node.item() for node in nodes[positions]]
+
+    @staticmethod
+    def unit_vectors(points: np.ndarray):
+        # The points of (lat, lon) coordinates on the unit sphere
+        latitudes, longitudes = np.radians(points[:, 0]), np.radians(points[:, 1])
+        return np.column_stack((np.cos(latitudes) * np.cos(longitudes), np.cos(latitudes) * np.sin(longitudes),
+                                np.sin(latitudes)))
@@ -5,7 +5,10 @@ from get_places import OSMPlaces
 # from get_map import MapPlaces
 from combine_features import CombineData
 from data_traffic import TrafficDataframe
-import osmnx as ox
+from graph_store import default_store
+from osm_extract import OSMExtract
+from stage_cache import StageCache
+import os
 import pandas as pd
 
 
@@ -20,14 +23,24 @@ class Main:
     Methods:
         run(): Executes the entire data processing and feature combination workflow.
     """
-    def __init__(self, k_drive=5, k_bike=5, k_walk=5):
+    def __init__(self, k_drive=5, k_bike=5, k_walk=5, traffic_model="routes", num_sources=None,
+                 area_weighted=False, osm_extract=None, stage_cache=True):
         """
         Initialize the Main object and set parameters for data processing and feature combination.
+        The traffic model is either "routes", the explicit simulation of k random routes, or "betweenness", the
+        expected traffic of k routes estimated from num_sources sampled start nodes, see TrafficDataframe.
+        With area_weighted the landuse and nature places are the covered share of every cell, see CombineData.
+        With osm_extract, the path of a local .osm.pbf extract, the boundary, the networks and the places are read from
+        the extract instead of the online APIs, see OSMExtract.
+        With stage_cache the results of the stages are cached by a hash of their inputs, so a run only computes the
+        stages whose inputs changed, see StageCache.
         """
         # self.city = input("Please enter the city of interest: ")
         self.city = 'Stuttgart, Germany'
+        if osm_extract:
+            OSMExtract(osm_extract).ingest(self.city)
         # Get the centroid of the city and return it as [lat, lon] coordinate
-        self.coord = ox.geocode_to_gdf(self.city).to_crs(epsg=3857).centroid.to_crs(epsg=4326).iloc[0]
+        self.coord = default_store().boundary(self.city).to_crs(epsg=3857).centroid.to_crs(epsg=4326).iloc[0]
         self.coord = [self.coord.y, self.coord.x]
         # self.cells_lat = int(input("Please enter the number of latitude grid cells: "))
         # self.cells_lon = int(input("Please enter the number of longitude grid cells: "))
@@ -37,20 +50,28 @@ class Main:
         self.k_drive = k_drive
         self.k_bike = k_bike
         self.k_walk = k_walk
+        self.traffic_model, self.num_sources = traffic_model, num_sources
+        self.area_weighted = area_weighted
+        self.stage_cache = StageCache(os.path.join(default_store().cache_dir, "stages"), stage_cache)
         # self.k_drive, self.k_bike, self.k_walk = 5, 5, 5
 
     def run(self, target_csv='data_rl.csv'):
         """
         Executes the entire data processing and feature combination workflow, including data initialization,
         population data integration, traffic data simulation, OSM places extraction, combining places with data,
-        and exporting the final dataset.
+        and exporting the final dataset. The stages whose inputs did not change since a former run are loaded from the
+        stage cache.
         """
+        store, stages = default_store(), self.stage_cache
 
         """
         1. Dataframe initialization
         """
+        # The grid depends on the bounding box of the city, which changes with the boundary, e.g. from an extract
+        bbox = store.boundary(self.city)[["bbox_north", "bbox_south", "bbox_east", "bbox_west"]].iloc[0].tolist()
         data_init = Dataframe(self.city, self.cells_lat, self.cells_lon)
-        data = data_init.initialize()
+        data, grid_key = stages.run("grid", {"city": self.city, "cells_lat": self.cells_lat,
+                                             "cells_lon": self.cells_lon, "bbox": bbox}, data_init.initialize)
         # print(data.head())
         # OPTIONAL: Display the grid and save the data as a .csv file
         # data_init.display_folium_map(data)
@@ -59,19 +80,21 @@ class Main:
         """
         2. Population Data
         """
-        import os
-
         # Get the current directory of this script
         current_dir = os.path.dirname(os.path.realpath(__file__))
 
         # Construct the path to the CSV file relative to this script's location
         csv_path = os.path.join(current_dir, "census_data_Stuttgart.XLSX")
 
-        data_population = pd.read_excel(csv_path, sheet_name="Dez", usecols="A:C",
-                                        names=["Borough", "District", "Population"])
-        # print(data_population.head())
-        data_pop = PopulationDataframe(data, data_population)
-        data = data_pop.join_population()
+        def join_population():
+            data_population = pd.read_excel(csv_path, sheet_name="Dez", usecols="A:C",
+                                            names=["Borough", "District", "Population"])
+            # print(data_population.head())
+            return PopulationDataframe(data, data_population).join_population()
+
+        # The districts are geocoded with the graph store, their polygons change with its version
+        data, population_key = stages.run("population", {"grid": grid_key, "census": stages.fingerprint(csv_path),
+                                                         "graph_store": store.version}, join_population)
         # print(data[data['population'] != 0].head())
         # OPTIONAL: Save the data as a .csv file
         # data_pop.save_csv(data, 'data_pop.csv')
@@ -79,8 +102,26 @@ class Main:
         """
         3. Traffic Data
         """
-        data_traffic = TrafficDataframe(data, self.city, self.k_drive, self.k_bike, self.k_walk)
-        data = data_traffic.merge_data()
+        # The traffic of each network type is a stage of its own, so a changed k only simulates its network type. The
+        # networks are derived from the "all" network of the graph store, a changed network changes the traffic
+        network_path = store.path(self.city, "all")
+        if not store.is_cached(network_path):
+            store.get(self.city, "all", simplify=False)
+        network = os.stat(network_path)
+        traffic, traffic_keys = 0, []
+        for network_type, k in (("drive", self.k_drive), ("bike", self.k_bike), ("walk", self.k_walk)):
+            def merge_data(network_type=network_type):
+                data_traffic = TrafficDataframe(data.copy(), self.city, self.k_drive, self.k_bike, self.k_walk,
+                                                model=self.traffic_model, num_sources=self.num_sources,
+                                                network_types=(network_type,))
+                return data_traffic.merge_data()[["traffic"]]
+
+            network_traffic, key = stages.run("traffic_" + network_type,
+                                              {"population": population_key, "k": k, "model": self.traffic_model,
+                                               "num_sources": self.num_sources,
+                                               "network": [network.st_size, network.st_mtime]}, merge_data)
+            traffic, traffic_keys = traffic + network_traffic["traffic"].to_numpy(), traffic_keys + [key]
+        data["traffic"] = traffic
         # print(data[data['traffic'] != 0].head())
         # OPTIONAL: Display a heatmap of the traffic attribute and save the data as a .csv file
         # data_traffic.plot_traffic_heatmap(data, self.cells_lat, self.cells_lon)
@@ -89,20 +130,26 @@ class Main:
         """
         4. OSM Places Extraction
         """
-        # Mine the places from the OpenStreetMap API
+        # Mine the places from the OpenStreetMap API. The places are cached by OSMPlaces, they are only loaded if the
+        # combination has to be computed
         places = OSMPlaces(self.city)
-        df_places = places.get_osm_places()
+        if not os.path.exists(places.cache_path()):
+            places.get_osm_places()
         # OPTIONAL: Explore and Visualise some place types
-        # m = MapPlaces(df_places, self.coord)
+        # m = MapPlaces(places.get_osm_places(), self.coord)
         # m.show_map(filename="routes.html")
         # OPTIONAL: Export the dataset for the Front End
-        # df_places.to_csv('df_frontend.csv', index=False)
+        # places.get_osm_places().to_csv('df_frontend.csv', index=False)
 
         """
         5. Combine the places extraction with the dataframe
         """
-        comb_places = CombineData(data, df_places)
-        data = comb_places.map_coordinates()
+        def map_coordinates():
+            return CombineData(data, places.get_osm_places(), self.area_weighted).map_coordinates()
+
+        data, _ = stages.run("combine", {"traffic": traffic_keys, "population": population_key,
+                                         "places": stages.fingerprint(places.cache_path()),
+                                         "area_weighted": self.area_weighted}, map_coordinates)
         # print(data.head())
 
         """
@@ -110,6 +157,7 @@ class Main:
         """
         # Export the final dataset for the Reinforcement Learning
         data.to_csv("RL/"+target_csv, index=False)
+        print(stages.summary())
         print('Successfully executed.')
         return 'Successfully generated the data set.'
 
@@ -0,0 +1,166 @@
+"""
+This class reads the places, the street network and the city boundary from a local OSM PBF extract
+"""
+import os
+import geopandas as gpd
+import numpy as np
+import osmnx as ox
+import pandas as pd
+import shapely
+from osmnx import graph as ox_graph
+from graph_store import FILTER_TAGS, GraphStore, default_store
+from get_places import OSMPlaces
+
+# The place tags, the street network and the boundaries are the only objects of an extract the ingestion looks at
+FILTER_KEYS = list(OSMPlaces.categories) + ["highway", "boundary"]
+# The tags of a place, besides its category tags
+PLACE_TAGS = ["name", "addr:street", "addr:housenumber", "addr:postcode"]
+
+
+class OSMExtract:
+    """
+    This class is an offline alternative to the Overpass and Nominatim APIs of osmnx. It streams a local .osm.pbf
+    extract, e.g. of a federal state from Geofabrik cut with "osmium extract", once with pyosmium and fills the caches
+    of the graph store with the same data the online APIs provide:
+    - the boundary of the city, the administrative boundary with the name of the city, as Dataframe.initialize() and
+    Main take it from Nominatim,
+    - the unsimplified "all" street network within the boundary, built from the highway ways with the osmnx filter of
+    the "all" network, from which the graph store derives the drive, bike and walk networks,
+    - the places of the OSMPlaces categories that intersect the boundary.
+    The population districts are not taken from the extract, their polygons are geocoded once and then cached, see
+    PopulationDataframe.
+    :param path: The path of the .osm.pbf extract
+    :param admin_level: The admin_level of the city boundary, by default the highest admin_level up to 8 of the
+    boundaries with the name of the city
+    """
+    def __init__(self, path: str, admin_level: str = None):
+        print("OSM Extract class has been loaded.")
+        self.path, self.admin_level = path, admin_level
+
+    def read(self, place: str):
+        """
+        This function streams the extract and builds the boundary, the street network and the places of a place
+        :param place: The place, e.g. "Stuttgart, Germany". The name of the city is the part before the first comma
+        :return: The boundary as a GeoDataFrame like osmnx.geocode_to_gdf, the unsimplified "all" network as a networkx
+        MultiDiGraph and the places as a GeoDataFrame like osmnx.geometries_from_place
+        """
+        import osmium
+
+        name = place.split(",")[0].strip()
+        keep_edge = GraphStore.edge_filter("all")
+        boundaries, nodes, ways, rows, geometries = [], {}, [], [], []
+        factory = osmium.geom.WKBFactory()
+        processor = osmium.FileProcessor(self.path).with_locations().with_areas()
+        for obj in processor.with_filter(osmium.filter.KeyFilter(*FILTER_KEYS)):
+            tags = dict(obj.tags)
+            if obj.is_area():
+                if tags.get("boundary") == "administrative" and tags.get("name") == name:
+                    boundaries.append((tags.get("admin_level", ""), factory.create_multipolygon(obj)))
+                # Closed barriers are taken as lines with their way
+                if self.is_place(tags) and not (obj.from_way() and self.is_barrier(tags)):
+                    rows.append(("way" if obj.from_way() else "relation", obj.orig_id(), tags))
+                    geometries.append(factory.create_multipolygon(obj))
+                continue
+            if obj.is_node() and self.is_place(tags):
+                rows.append(("node", obj.id, tags))
+                geometries.append(factory.create_point(obj))
+            elif obj.is_way():
+                if "highway" in tags and keep_edge(tags):
+                    nodes.update((node.ref, (node.lat, node.lon)) for node in obj.nodes)
+                    ways.append({"type": "way", "id": obj.id, "nodes": [node.ref for node in obj.nodes], "tags": tags})
+                # A closed way is a polygon, which comes as an area, unless it is tagged as no area or a barrier
+                closed = len(obj.nodes) > 3 and obj.nodes[0].ref == obj.nodes[-1].ref
+                if self.is_place(tags) and (not closed or tags.get("area") == "no" or self.is_barrier(tags)):
+                    rows.append(("way", obj.id, tags))
+                    geometries.append(factory.create_linestring(obj))
+
+        boundary = self.boundary(place, boundaries)
+        polygon = boundary["geometry"].iloc[0]
+        elements = [{"type": "node", "id": node, "lat": lat, "lon": lon} for node, (lat, lon) in nodes.items()]
+        return boundary, self.network(elements + ways, polygon), self.places(rows, geometries, polygon)
+
+    @staticmethod
+    def is_place(tags: dict):
+        return any(tags.get(key) in values for key, values in OSMPlaces.categories.items())
+
+    @staticmethod
+    def is_barrier(tags: dict):
+        # Whether the barrier is the only category of the place, osmnx keeps closed barriers as lines
+        return all(key == "barrier" or tags.get(key) not in values for key, values in OSMPlaces.categories.items())
+
+    def boundary(self, place: str, boundaries: list):
+        # The boundary of the city in the format of osmnx.geocode_to_gdf
+        levels = [level for level, _ in boundaries]
+        if self.admin_level is not None:
+            candidates = [geometry for level, geometry in boundaries if level == str(self.admin_level)]
+        else:
+            numeric = [int(level) for level in levels if level.isdigit() and int(level) <= 8]
+            candidates = [geometry for level, geometry in boundaries if numeric and level == str(max(numeric))]
+        if not candidates:
+            raise ValueError("The extract " + self.path + " has no administrative boundary of " + place +
+                             (" at admin_level " + str(self.admin_level) if self.admin_level is not None else "") +
+                             ", found admin_levels: " + (", ".join(levels) or "none") + ".")
+        polygon = shapely.from_wkb(candidates[0])
+        if len(polygon.geoms) == 1:
+            polygon = polygon.geoms[0]
+        west, south, east, north = polygon.bounds
+        return gpd.GeoDataFrame({"bbox_north": [north], "bbox_south": [south], "bbox_east": [east],
+                                 "bbox_west": [west], "display_name": [place]}, geometry=[polygon], crs="EPSG:4326")
+
+    @staticmethod
+    def network(elements: list, polygon):
+        # The "all" network within the boundary, built by osmnx from the ways as if they came from Overpass
+        useful_tags_way = ox.settings.useful_tags_way
+        ox.settings.useful_tags_way = list(dict.fromkeys(useful_tags_way + FILTER_TAGS))
+        try:
+            graph = ox_graph._create_graph([{"elements": elements}], retain_all=True)
+        finally:
+            ox.settings.useful_tags_way = useful_tags_way
+        graph = ox.truncate.truncate_graph_polygon(graph, polygon, retain_all=True)
+        return ox.utils_graph.remove_isolated_nodes(graph)
+
+    @staticmethod
+    def places(rows: list, geometries: list, polygon):
+        # The places that intersect the boundary in the format of osmnx.geometries_from_place
+        index = pd.MultiIndex.from_arrays([[row[0] for row in rows], [row[1] for row in rows]],
+                                          names=["element_type", "osmid"])
+        tags = [{key: value for key, value in row_tags.items() if key in FILTER_KEYS or key in PLACE_TAGS}
+                for _, _, row_tags in rows]
+        geometry = shapely.from_wkb(np.array(geometries, dtype=object))
+        # Areas of a single polygon are Polygons, as in osmnx
+        single = shapely.get_num_geometries(geometry) == 1
+        single &= shapely.get_type_id(geometry) == shapely.GeometryType.MULTIPOLYGON
+        geometry[single] = shapely.get_geometry(geometry[single], 0)
+        places = gpd.GeoDataFrame(pd.DataFrame(tags, index=index), geometry=geometry, crs="EPSG:4326")
+        places = places[places.intersects(polygon)]
+        return places[~places.index.duplicated()]
+
+    def source(self):
+        # The identity of the extract file, a changed file is ingested again
+        stat = os.stat(self.path)
+        return {"path": os.path.abspath(self.path), "size": stat.st_size, "mtime": stat.st_mtime,
+                "admin_level": self.admin_level}
+
+    def ingest(self, place: str, store: GraphStore = None):
+        """
+        This function fills the caches of the graph store for a place from the extract, so the data generation of the
+        place runs without the online APIs. An extract that has already been ingested is not read again
+        :param place: The place, e.g. "Stuttgart, Germany"
+        :param store: The graph store, by default the shared graph store
+        :return: The boundary, the "all" network and the places, or None if the extract has already been ingested
+        """
+        store = store or default_store()
+        marker = store.path(place, "source")
+        if os.path.exists(marker) and store.load(marker) == self.source():
+            print("The extract " + self.path + " has already been ingested for " + place + ".")
+            return None
+        boundary, graph, places = self.read(place)
+        # The networks derived from a former download are replaced by the ones derived from the extract
+        store.forget(place)
+        store.put(store.boundary_path(place), boundary)
+        store.put(store.path(place, "all"), graph)
+        OSMPlaces(place).save_places(OSMPlaces.resolve_places(places))
+        store.save(marker, self.source())
+        print("Ingested " + str(len(graph)) + " network nodes and " + str(len(places)) + " places of " + place +
+              " from " + self.path + ".")
+        return boundary, graph, places
@@ -0,0 +1,86 @@
+"""
+This class caches the results of the stages of the data processing, keyed by a hash of their inputs
+"""
+import hashlib
+import json
+import os
+import time
+import geopandas as gpd
+import pandas as pd
+import pyarrow.parquet as pq
+
+
+class StageCache:
+    """
+    This class runs the stages of the data processing and persists their resulting dataframes as (Geo)Parquet files.
+    Every stage declares its inputs, i.e., its parameters, the fingerprints of the files it reads and the keys of the
+    stages it builds on. The key of a stage is the hash of its inputs, so a stage is only computed again if one of
+    them changed, and every stage that builds on it gets a new key as well
+    :param cache_dir: The directory of the stage files
+    :param enabled: If False, every stage is computed and nothing is persisted
+    """
+    # The version of the stage files, increase it when the computation of a stage changes
+    version = 1
+
+    def __init__(self, cache_dir: str, enabled: bool = True):
+        self.cache_dir, self.enabled = cache_dir, enabled
+        # The name, the key and whether the result was reused for every stage run so far
+        self.log = []
+
+    @staticmethod
+    def fingerprint(path: str):
+        # The identity of an input file by its content
+        digest = hashlib.sha1()
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def key(self, name: str, inputs: dict):
+        """
+        :param name: The name of the stage
+        :param inputs: A json serializable dictionary with the inputs of the stage
+        :return: The hash of the stage, its version and its inputs
+        """
+        description = json.dumps({"stage": name, "version": self.version, "inputs": inputs}, sort_keys=True)
+        return hashlib.sha1(description.encode("utf-8")).hexdigest()
+
+    def run(self, name: str, inputs: dict, compute):
+        """
+        This function returns the result of a stage from the cache or computes and persists it
+        :param name: The name of the stage
+        :param inputs: A json serializable dictionary with the inputs of the stage
+        :param compute: A function without arguments which computes the result of the stage as a (Geo)DataFrame
+        :return: The result of the stage and its key
+        """
+        key = self.key(name, inputs)
+        path = os.path.join(self.cache_dir, name + "_" + key[:16] + ".parquet")
+        start_time = time.perf_counter()
+        if self.enabled and os.path.exists(path):
+            result = gpd.read_parquet(path) if self.is_geo(path) else pd.read_parquet(path)
+            print("Stage " + name + ": reused " + key[:16] + " in " + str(round(time.perf_counter() - start_time, 2)) +
+                  "s")
+            self.log.append((name, key, True))
+            return result, key
+        result = compute()
+        if self.enabled:
+            # Write to a temporary file first, so a concurrent reader never sees a partially written file
+            os.makedirs(self.cache_dir, exist_ok=True)
+            result.to_parquet(path + "." + str(os.getpid()) + ".tmp")
+            os.replace(path + "." + str(os.getpid()) + ".tmp", path)
+        print("Stage " + name + ": computed " + key[:16] + " in " + str(round(time.perf_counter() - start_time, 2)) +
+              "s")
+        self.log.append((name, key, False))
+        return result, key
+
+    @staticmethod
+    def is_geo(path: str):
+        # Whether the Parquet file has the GeoParquet metadata of a GeoDataFrame
+        return b"geo" in (pq.read_schema(path).metadata or {})
+
+    def summary(self):
+        # The stages that were reused and computed, for the log of a run
+        reused = [name for name, _, was_reused in self.log if was_reused]
+        computed = [name for name, _, was_reused in self.log if not was_reused]
+        return "Reused stages: " + (", ".join(reused) or "none") + ". Computed stages: " + \
+            (", ".join(computed) or "none") + "."
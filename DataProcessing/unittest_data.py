@@ -3,13 +3,24 @@ This class contains unit tests for all functions used at any time in the main fi
 """
 
 import unittest
+import random
+import networkx as nx
+import numpy as np
 import pandas as pd
 import geopandas as gpd
+import importlib.util
 import os
-from shapely.geometry import Polygon, Point
+import tempfile
+from shapely.geometry import Polygon, Point, LineString, MultiPolygon
 from data_initialization import Dataframe
 from data_population import PopulationDataframe
 from data_traffic import TrafficDataframe
+from get_places import OSMPlaces
+from osm_extract import OSMExtract
+from combine_features import CombineData
+import graph_store
+from graph_store import GraphStore
+from stage_cache import StageCache
 
 
 class TestDataInitialization(unittest.TestCase):
@@ -76,6 +87,41 @@ class TestPopulationDataframe(unittest.TestCase):
         os.remove(test_filename)  # Clean up the test file
 
 
+class TestDistrictGeocoding(unittest.TestCase):
+    def setUp(self):
+        # Two districts with cached unit square polygons in an offline graph store. Hauptbahnhof takes the second
+        # result of the Nominatim query
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.store = GraphStore(self.cache_dir.name, offline=True)
+        boundaries = [(" Hauptbahnhof Mitte Stuttgart", 2, Polygon([(0, 0), (1, 0), (1, 1), (0, 1)])),
+                      (" Neue Vorstadt Mitte Stuttgart", None, Polygon([(1, 0), (3, 0), (3, 1), (1, 1)]))]
+        for district, which_result, polygon in boundaries:
+            self.store.save(self.store.boundary_path(district, which_result),
+                            gpd.GeoDataFrame(geometry=[polygon], crs="EPSG:4326"))
+        self.default_store, graph_store._default_store = graph_store._default_store, self.store
+        # One cell in each district and one cell outside of Stuttgart
+        self.data = gpd.GeoDataFrame({"cell_id": [0, 1, 2]},
+                                     geometry=[Point(x, 0.5).buffer(0.1, cap_style=3) for x in (0.5, 2.5, 5.5)])
+
+    def tearDown(self):
+        graph_store._default_store = self.default_store
+        self.cache_dir.cleanup()
+
+    def census(self, districts):
+        return pd.DataFrame({"Borough": ["Mitte"] + [None] * (len(districts) - 1), "District": districts,
+                             "Population": [8129.0, 16258.0, 100.0][:len(districts)]})
+
+    def test_districts_population(self):  # Test the cached polygons and the population density of the districts
+        data = PopulationDataframe(self.data, self.census(["101 Hauptbahnhof", "102 Neue Vorstadt"])).join_population()
+        self.assertEqual(list(data["population"]), [1.0, 1.0, 0.0])
+        self.assertEqual(list(data["district"].iloc[:2]), [" Hauptbahnhof Mitte Stuttgart",
+                                                          " Neue Vorstadt Mitte Stuttgart"])
+
+    def test_missing_district(self):  # Test that a district that cannot be geocoded is not dropped silently
+        with self.assertRaises(FileNotFoundError):
+            PopulationDataframe(self.data, self.census(["101 Hauptbahnhof", "102 Neue Vorstadt", "103 Europaviertel"]))
+
+
 class TestTrafficDataframe(unittest.TestCase):
     def setUp(self):
         # Get the actual data for testing
@@ -115,5 +161,361 @@ class TestTrafficDataframe(unittest.TestCase):
         os.remove(test_filename)
 
 
+class TestTrafficBinning(unittest.TestCase):
+    def setUp(self):
+        # A small grid with the same lat/lon box structure as Dataframe.initialize(), without the OSM geocoding
+        self.box_lat = np.linspace(48.69, 48.87, 9)
+        self.box_lon = np.linspace(9.32, 9.04, 11)
+        polygon_list = []
+        for i in range(len(self.box_lat) - 1):
+            for j in range(len(self.box_lon) - 1):
+                polygon_list.append(Polygon([[self.box_lon[j], self.box_lat[i + 1]],
+                                             [self.box_lon[j + 1], self.box_lat[i + 1]],
+                                             [self.box_lon[j + 1], self.box_lat[i]],
+                                             [self.box_lon[j], self.box_lat[i]]]))
+        self.data = gpd.GeoDataFrame({"cell_id": list(range(80)), "geometry": polygon_list})
+
+    def test_count_points(self):  # Test that the binning matches the counts of Point.within()
+        rng = np.random.default_rng(0)
+        points = [Point(x, y) for x, y in zip(rng.uniform(9.0, 9.35, 500), rng.uniform(48.68, 48.88, 500))]
+        # Points on the cell edges and the box corner are not within any cell
+        points += [Point(self.box_lon[3], 48.7), Point(9.1, self.box_lat[5]), Point(self.box_lon[0], self.box_lat[0])]
+        expected = np.zeros(len(self.data), dtype=int)
+        for element in points:
+            expected += element.within(self.data["geometry"]).values
+        self.assertTrue(TrafficDataframe.grid_lookup(self.data) is not None)
+        self.assertTrue((TrafficDataframe.count_points(self.data, points) == expected).all())
+
+    def test_count_points_irregular(self):  # Test the fallback for cells that do not form a regular box
+        data = self.data.drop(index=5)
+        self.assertTrue(TrafficDataframe.grid_lookup(data) is None)
+        points = [data.geometry.iloc[0].centroid, data.geometry.iloc[10].centroid, Point(0, 0)]
+        self.assertEqual(list(np.flatnonzero(TrafficDataframe.count_points(data, points))), [0, 10])
+
+
+class TestRouteSimulation(unittest.TestCase):
+    def setUp(self):
+        # A small directed street grid with random lengths, parallel edges and partly missing geometries
+        rng = np.random.default_rng(0)
+        self.graph = nx.MultiDiGraph()
+        for i in range(100):
+            self.graph.add_node(10 * i + 7, x=9.0 + (i % 10) * 0.001, y=48.7 + (i // 10) * 0.001)
+        for i in range(100):
+            for j in [i + 1] * (i % 10 < 9) + [i + 10] * (i < 90):
+                for u, v in ((10 * i + 7, 10 * j + 7), (10 * j + 7, 10 * i + 7)):
+                    if rng.random() < 0.8:
+                        self.graph.add_edge(u, v, length=float(rng.uniform(50, 150)),
+                                            geometry=LineString([(self.graph.nodes[u]["x"], self.graph.nodes[u]["y"]),
+                                                                 (self.graph.nodes[v]["x"], self.graph.nodes[v]["y"])]))
+                    if rng.random() < 0.2:
+                        self.graph.add_edge(u, v, length=float(rng.uniform(40, 160)))
+
+    def expected_points(self, k):
+        # The routes, edges and nodes as simulated with networkx
+        start_nodes = random.choices(list(self.graph.nodes()), k=k)
+        end_nodes = random.choices(list(self.graph.nodes()), k=k)
+        coordinates, route_nodes = [], []
+        for start_node, end_node in zip(start_nodes, end_nodes):
+            try:
+                route = nx.shortest_path(self.graph, start_node, end_node, weight="length")
+            except nx.NetworkXNoPath:
+                continue
+            route_nodes.extend(route)
+            for u, v in zip(route[:-1], route[1:]):
+                edge = min(self.graph.get_edge_data(u, v).values(), key=lambda x: x["length"])
+                coordinates.extend(edge["geometry"].coords if "geometry" in edge else [])
+        coordinates.extend((data["x"], data["y"]) for node, data in self.graph.nodes(data=True))
+        coordinates.extend((self.graph.nodes[node]["x"], self.graph.nodes[node]["y"]) for node in route_nodes)
+        return coordinates
+
+    def test_simulate_routes(self):  # Test that the routes match the shortest paths of networkx
+        random.seed(0)
+        expected = self.expected_points(30)
+        for num_processes in (1, 2):
+            random.seed(0)
+            points = TrafficDataframe.simulate_routes(self.graph, 30, num_processes)
+            self.assertTrue(isinstance(points[0], Point))
+            self.assertEqual([(point.x, point.y) for point in points], expected)
+
+    def test_accumulate_loads(self):  # Test that the betweenness loads equal the loads of all shortest paths
+        network = TrafficDataframe.prepare_network(self.graph)
+        node_ids, matrix = network[0], network[2]
+        sources = np.array([0, 12, 12, 57])
+        edge_loads, node_loads = TrafficDataframe.accumulate_loads(network, sources, 0.5, batch_size=3)
+        expected_edges, expected_nodes = {}, np.zeros(len(node_ids))
+        for source in sources:
+            for target in range(len(node_ids)):
+                try:
+                    route = node_ids.get_indexer(nx.shortest_path(self.graph, node_ids[source], node_ids[target],
+                                                                  weight="length"))
+                except nx.NetworkXNoPath:
+                    continue
+                expected_nodes[route] += 0.5
+                for u, v in zip(route[:-1], route[1:]):
+                    expected_edges[(u, v)] = expected_edges.get((u, v), 0) + 0.5
+        rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+        edges = {(row, col): load for row, col, load in zip(rows, matrix.indices, edge_loads) if load > 0}
+        self.assertTrue(np.allclose(node_loads, expected_nodes))
+        self.assertEqual(set(edges), set(expected_edges))
+        for edge, load in expected_edges.items():
+            self.assertAlmostEqual(edges[edge], load)
+
+    def test_betweenness_traffic(self):  # Test the rasterization of the betweenness loads
+        random.seed(0)
+        points, weights = TrafficDataframe.betweenness_traffic(self.graph, 5, 20, np.arange(100.0), 2)
+        self.assertEqual(len(points), len(weights))
+        self.assertTrue(isinstance(points[0], Point))
+        # Each node counts once for smoothing and the nodes carry the expected route nodes of at most 5 routes
+        node_weights = weights[-100:]
+        self.assertTrue((node_weights >= 1).all())
+        self.assertTrue(100 < node_weights.sum() <= 100 + 5 * 100)
+
+
+class TestOSMPlaces(unittest.TestCase):
+    def setUp(self):
+        # Places as returned by the tag query: a school in a house, a cycle barrier with a name, an amenity that is not
+        # taken and a named house
+        self.places = gpd.GeoDataFrame({"amenity": ["school", "school", None, "bench", None],
+                                        "building": [None, "house", None, None, "house"],
+                                        "barrier": [None, None, "cycle_barrier", None, None],
+                                        "name": ["A", "B", "C", "D", "E"],
+                                        "addr:street": ["Weg", None, "Weg", "Weg", "Gasse"],
+                                        "addr:housenumber": ["1", "2", "3", "4", "5"]},
+                                       geometry=[Point(i, i) for i in range(5)], crs="EPSG:4326")
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.default_store, graph_store._default_store = \
+            graph_store._default_store, GraphStore(self.cache_dir.name, offline=True)
+
+    def tearDown(self):
+        graph_store._default_store = self.default_store
+        self.cache_dir.cleanup()
+
+    def test_resolve_places(self):  # Test that the last category of a place wins and the places keep its order
+        df = OSMPlaces.resolve_places(self.places)
+        self.assertEqual(list(df["place"]), ["school", "cycle_barrier", "house", "house"])
+        self.assertEqual(list(df["name"].fillna("")), ["A", "", "B", "E"])
+        self.assertEqual(list(df["address"].fillna("")), ["Weg 1", "", "", "Gasse 5"])
+
+    def test_cache(self):  # Test that cached places are loaded offline and that missing places are not downloaded
+        places = OSMPlaces("Test")
+        with self.assertRaises(FileNotFoundError):
+            places.get_osm_places()
+        df = OSMPlaces.resolve_places(self.places)
+        df.to_parquet(places.cache_path())
+        cached = places.get_osm_places()
+        self.assertTrue(isinstance(cached, gpd.GeoDataFrame))
+        self.assertEqual(list(cached["place"]), list(df["place"]))
+        self.assertTrue(cached.geometry.geom_equals(df.geometry).all())
+
+
+@unittest.skipUnless(importlib.util.find_spec("osmium"), "The OSM extract requires pyosmium")
+class TestOSMExtract(unittest.TestCase):
+    def setUp(self):
+        import osmium
+        # A city "Test" inside a region of the same name with streets, a school, a house, a cycle barrier and a bank
+        # outside of the city
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.cache_dir.name, "test.osm.pbf")
+        writer = osmium.SimpleWriter(self.path)
+        coordinates = {1: (9.0, 48.0), 2: (9.1, 48.0), 3: (9.1, 48.1), 4: (9.0, 48.1), 5: (8.9, 47.9), 6: (9.3, 47.9),
+                       7: (9.3, 48.3), 8: (8.9, 48.3), 11: (9.02, 48.05), 12: (9.05, 48.05), 13: (9.08, 48.05),
+                       14: (9.2, 48.05), 15: (9.05, 48.08), 16: (9.05, 48.02), 21: (9.03, 48.03), 22: (9.04, 48.03),
+                       23: (9.04, 48.04), 24: (9.03, 48.04)}
+        tags = {12: {"amenity": "school", "name": "Schule"}, 14: {"amenity": "bank"}}
+        for node, location in coordinates.items():
+            writer.add_node(osmium.osm.mutable.Node(id=node, location=location, tags=tags.get(node, {})))
+        ways = {100: ([1, 2, 3, 4, 1], {}), 101: ([5, 6, 7, 8, 5], {}),
+                102: ([11, 12, 13, 14], {"highway": "primary", "name": "Hauptstrasse"}),
+                103: ([15, 12], {"highway": "residential", "oneway": "yes"}), 104: ([12, 16], {"highway": "footway"}),
+                105: ([13, 16], {"highway": "service", "access": "private"}),
+                106: ([21, 22, 23, 24, 21], {"building": "house", "addr:street": "Weg", "addr:housenumber": "1"}),
+                107: ([11, 21], {"barrier": "cycle_barrier"})}
+        for way, (nodes, way_tags) in ways.items():
+            writer.add_way(osmium.osm.mutable.Way(id=way, nodes=nodes, tags=way_tags))
+        for relation, way, admin_level in ((200, 100, "6"), (201, 101, "5")):
+            writer.add_relation(osmium.osm.mutable.Relation(
+                id=relation, members=[("w", way, "outer")],
+                tags={"type": "boundary", "boundary": "administrative", "name": "Test", "admin_level": admin_level}))
+        writer.close()
+        self.default_store, graph_store._default_store = \
+            graph_store._default_store, GraphStore(self.cache_dir.name, offline=True)
+
+    def tearDown(self):
+        graph_store._default_store = self.default_store
+        self.cache_dir.cleanup()
+
+    def test_ingest(self):  # Test that the extract fills the caches of the data generation
+        self.assertIsNotNone(OSMExtract(self.path).ingest("Test, Germany"))
+        # The city boundary is the boundary with the highest admin_level
+        data = Dataframe("Test, Germany", 2, 2).initialize()
+        self.assertEqual(tuple(np.round(data.total_bounds, 6)), (9.0, 48.0, 9.1, 48.1))
+        # The private service road and the street outside of the city are not in the network
+        graph = graph_store.default_store().get("Test, Germany", simplify=False)
+        self.assertEqual(set(graph.nodes), {11, 12, 13, 15, 16})
+        self.assertEqual(set(graph_store.default_store().get("Test, Germany", "drive").edges()),
+                         {(11, 12), (12, 11), (12, 13), (13, 12), (15, 12)})
+        places = OSMPlaces("Test, Germany").get_osm_places()
+        self.assertEqual(list(places["place"]), ["school", "cycle_barrier", "house"])
+        self.assertEqual([geometry.geom_type for geometry in places.geometry], ["Point", "LineString", "Polygon"])
+        self.assertEqual(places["address"].iloc[2], "Weg 1")
+        # An extract that has already been ingested is not read again
+        self.assertIsNone(OSMExtract(self.path).ingest("Test, Germany"))
+
+    def test_missing_boundary(self):  # Test that a city without a boundary in the extract is reported
+        with self.assertRaises(ValueError):
+            OSMExtract(self.path, admin_level=8).read("Test, Germany")
+
+
+class TestStageCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.stages = StageCache(self.cache_dir.name)
+        self.calls = 0
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def compute(self):
+        self.calls += 1
+        return gpd.GeoDataFrame({"traffic": [1, 2]}, geometry=[Point(0, 0), Point(1, 1)], crs="EPSG:4326")
+
+    def test_reuse(self):  # Test that a stage is only computed again if its inputs changed
+        data, key = self.stages.run("grid", {"cells": 2}, self.compute)
+        cached, cached_key = self.stages.run("grid", {"cells": 2}, self.compute)
+        _, changed_key = self.stages.run("grid", {"cells": 3}, self.compute)
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(key, cached_key)
+        self.assertNotEqual(key, changed_key)
+        self.assertTrue(isinstance(cached, gpd.GeoDataFrame))
+        self.assertEqual(cached.crs, data.crs)
+        self.assertTrue(cached.geometry.geom_equals(data.geometry).all())
+        self.assertEqual(self.stages.summary(), "Reused stages: grid. Computed stages: grid, grid.")
+
+    def test_dataframe(self):  # Test that a stage without geometries is loaded as a DataFrame
+        self.stages.run("traffic", {"k": 5}, lambda: pd.DataFrame({"traffic": [1, 2]}))
+        cached, _ = self.stages.run("traffic", {"k": 5}, self.compute)
+        self.assertEqual(self.calls, 0)
+        self.assertFalse(isinstance(cached, gpd.GeoDataFrame))
+        self.assertEqual(list(cached["traffic"]), [1, 2])
+
+
+class TestCombineData(unittest.TestCase):
+    def setUp(self):
+        # A 6x5 grid of unit cells and places of all geometry types, some on the cell edges
+        self.data = gpd.GeoDataFrame({"cell_id": list(range(30)),
+                                      "geometry": [Polygon([(j, i), (j + 1, i), (j + 1, i + 1), (j, i + 1)])
+                                                   for i in range(6) for j in range(5)]})
+        rng = np.random.default_rng(0)
+        places = [("house", Point(x, y)) for x, y in rng.uniform(-0.5, 5.5, (40, 2))]
+        places += [("house", Point(2, 2.5)), ("parking", Point(1.5, 1.5)), ("water", Point(0.5, 0.5)),
+                   ("water", Polygon([(0.2, 0.2), (1.5, 0.2), (1.5, 1.5)])),
+                   ("wood", MultiPolygon([Polygon([(3, 3), (4, 3), (4, 4), (3, 4)]),
+                                          Polygon([(0.1, 4.1), (0.9, 4.1), (0.9, 4.9)])])),
+                   ("residential", Polygon([(0.5, 0.5), (3.5, 0.5), (3.5, 2.5), (0.5, 2.5)])),
+                   ("residential", Polygon([(1, 1), (2, 1), (2, 2), (1, 2)])),
+                   ("cycle_barrier", LineString([(0.5, 5.5), (4.5, 5.5)])), ("parking", Point(10, 10))]
+        self.df = pd.DataFrame({"place": [place for place, _ in places], "geometry": [geom for _, geom in places]})
+
+    def expected_counts(self):
+        # The counts as computed by testing each place against all cells
+        expected = {}
+        for place, geometry in zip(self.df["place"], self.df["geometry"]):
+            column = expected.setdefault(place, np.zeros(30, dtype=int))
+            if geometry.geom_type == "Point":
+                matches = geometry.within(self.data["geometry"]).values
+            else:
+                matches = geometry.intersects(self.data["geometry"]).values
+            if place in ["water", "wood"]:
+                column[matches] = 1
+            else:
+                column += matches
+        return expected
+
+    def test_map_coordinates(self):  # Test that the spatial join matches the counts of within and intersects
+        expected = self.expected_counts()
+        data = CombineData(self.data.copy(), self.df).map_coordinates()
+        self.assertEqual(list(data.columns), ["cell_id", "geometry"] + list(expected))
+        for place, column in expected.items():
+            self.assertEqual(list(data[place]), list(column))
+
+    def test_cell_coverage(self):  # Test the area weighted coverage of the landuse and nature places
+        data = CombineData(self.data.copy(), self.df, area_weighted=True).map_coordinates()
+        residential = np.zeros(30)
+        # The first residential polygon covers 2 full cells, 6 half cells and 4 quarter cells, the second one lies
+        # within the first one
+        residential[[6, 7]] = 1
+        residential[[1, 2, 5, 8, 11, 12]] = 0.5
+        residential[[0, 3, 10, 13]] = 0.25
+        self.assertTrue(np.allclose(data["residential"], residential))
+        # The water triangle and the wood multipolygon are split by area, the water Point does not cover any area
+        self.assertAlmostEqual(data["water"].sum(), 1.3 * 1.3 / 2)
+        self.assertAlmostEqual(data["wood"][18], 1)
+        self.assertAlmostEqual(data["wood"][20], 0.8 * 0.8 / 2)
+        self.assertAlmostEqual(data["wood"].sum(), 1 + 0.8 * 0.8 / 2)
+        # The other place types are still counted
+        self.assertEqual(list(data["house"]), list(self.expected_counts()["house"]))
+
+    def test_cell_coverage_overlap(self):  # Test that the shared area of overlapping polygons is counted once
+        half = Polygon([(0, 0), (0.5, 0), (0.5, 1), (0, 1)])
+        df = pd.DataFrame({"place": ["wood", "wood", "residential", "residential"],
+                           "geometry": [half, half, Polygon([(1, 0), (1.5, 0), (1.5, 1), (1, 1)]),
+                                        Polygon([(1.25, 0), (1.75, 0), (1.75, 1), (1.25, 1)])]})
+        data = CombineData(self.data.copy(), df, area_weighted=True).map_coordinates()
+        self.assertAlmostEqual(data["wood"][0], 0.5)
+        self.assertAlmostEqual(data["residential"][1], 0.75)
+        self.assertAlmostEqual(data["wood"].sum() + data["residential"].sum(), 1.25)
+
+
+class TestGraphStore(unittest.TestCase):
+    def setUp(self):
+        # An unsimplified "all" network: a two-way primary road 0-1-2-3, a footway 3-4-5, a one-way residential road
+        # 2-6, a cycleway 1-7 and a private driveway 6-8
+        self.graph = nx.MultiDiGraph(crs="epsg:4326")
+        for node in range(9):
+            self.graph.add_node(node, x=9.0 + node * 0.001, y=48.7 + (node % 3) * 0.001)
+        ways = [([0, 1, 2, 3], {"highway": "primary", "oneway": False}),
+                ([3, 4, 5], {"highway": "footway", "oneway": False}),
+                ([2, 6], {"highway": "residential", "oneway": True}),
+                ([1, 7], {"highway": "cycleway", "oneway": False, "foot": "no"}),
+                ([6, 8], {"highway": "service", "service": "driveway", "oneway": False})]
+        for osmid, (nodes, tags) in enumerate(ways):
+            for u, v in zip(nodes[:-1], nodes[1:]):
+                self.graph.add_edge(u, v, osmid=osmid, length=100.0, reversed=False, **tags)
+                if not tags["oneway"]:
+                    self.graph.add_edge(v, u, osmid=osmid, length=100.0, reversed=True, **tags)
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.store = GraphStore(self.cache_dir.name, offline=True)
+        self.store.save(self.store.path("Test", "all"), self.graph)
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def test_derive(self):  # Test that the views keep the edges of the osmnx filters of their network type
+        drive = self.store.get("Test", "drive", simplify=False)
+        self.assertEqual(set(drive.edges()), {(0, 1), (1, 0), (1, 2), (2, 1), (2, 3), (3, 2), (2, 6)})
+        bike = self.store.get("Test", "bike", simplify=False)
+        self.assertEqual(set(bike.nodes), {0, 1, 2, 3, 6, 7, 8})
+        # The walk network has no cycleway and no one-way streets
+        walk = self.store.get("Test", "walk", simplify=False)
+        self.assertEqual(set(walk.nodes), {0, 1, 2, 3, 4, 5, 6, 8})
+        self.assertTrue(walk.has_edge(6, 2) and walk[6][2][0]["reversed"])
+        self.assertFalse(any(data["oneway"] for _, _, data in walk.edges(data=True)))
+        # The simplified drive network only keeps the intersection and the dead ends
+        self.assertEqual(set(self.store.get("Test", "drive").nodes), {0, 2, 3, 6})
+
+    def test_cache(self):  # Test that the views are persisted and that a missing graph is not downloaded offline
+        drive = self.store.get("Test", "drive")
+        self.assertIs(self.store.get("Test", "drive"), drive)
+        self.assertTrue(os.path.exists(self.store.path("Test", "drive_simplified")))
+        reloaded = GraphStore(self.cache_dir.name, offline=True).get("Test", "drive")
+        self.assertEqual(set(reloaded.edges(keys=True)), set(drive.edges(keys=True)))
+        with self.assertRaises(FileNotFoundError):
+            self.store.get("Other", "drive")
+
+    def test_nearest_nodes(self):  # Test the nearest node of (lat, lon) coordinates
+        coordinates = [(48.7011, 9.0009), (48.7021, 9.0081), (48.7021, 9.0049)]
+        self.assertEqual(self.store.nearest_nodes(self.graph, coordinates), [1, 8, 5])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,12 +1,10 @@
 # Imports
 from datetime import datetime
 
-import osmnx as ox
-
 from flask import (Blueprint, flash, g, render_template, request)
 from flaskr.auth import login_required
 from flaskr.db import get_db
-from flaskr.get_helper import Functionalities
+from flaskr.get_helper import Functionalities, default_store
 
 bp = Blueprint('deliverer', __name__)
 
@@ -139,16 +137,17 @@ def drivers_routesite():
     flash(flash_message, category="filter")
     flash('route with shortest ' + selected_type, category="filter")
 
-    # Creation of graph for the corresponding city
-    graph = ox.graph_from_place("Stuttgart, Germany", network_type="bike", simplify=True)
+    # Graph of the corresponding city, downloaded once and then loaded from the graph store
+    graph = default_store().get("Stuttgart, Germany", "bike", simplify=True)
 
     # Get the nearest nodes, compute the shortest path based on selected type, calculate length and time
     route_length = route_time = 0
     shortest_paths = []
     for i in range(len(locations)-1):
-        source = Functionalities().get_nearest_node((float(locations[i]['latitude']), float(locations[i]['longitude']))) 
+        source = Functionalities().get_nearest_node((float(locations[i]['latitude']), float(locations[i]['longitude'])),
+                                                    graph)
         target = Functionalities().get_nearest_node((float(locations[i+1]['latitude']),
-                                                     float(locations[i+1]['longitude'])))
+                                                     float(locations[i+1]['longitude'])), graph)
         if selected_type == 'travel_time':
             shortest_path, length, travel_time = \
                 Functionalities().get_shortest_path(graph, source, target, 'travel_time')
@@ -1,4 +1,6 @@
 # Imports
+import os
+import sys
 from datetime import datetime, date, time, timedelta
 from typing import List, Union, Any
 from flask import flash
@@ -7,6 +9,10 @@ import osmnx as ox
 import folium
 import folium.plugins as plugins
 
+# The graph store of the network graphs is shared with the data processing
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, "DataProcessing"))
+from graph_store import default_store
+
 
 class Functionalities:
     """
@@ -50,14 +56,17 @@ class Functionalities:
         return locations, flash_message
 
     @staticmethod
-    def get_nearest_node(coords: tuple):
+    def get_nearest_node(coords: tuple, graph: nx.MultiDiGraph = None):
         """
         This method takes a (lat, lon) coordinate tuple and returns the nearest node in the bike network. 
         It first tries to map it within a distance of 100 meters max., but the exception handles cases where
         this is not possible (might result in not precise visualisation).
         :param coords: A (lat, lon) coordinate tuple
+        :param graph: The graph of the route (optional). If given, its nearest node is returned without any download
         :return: The nearest node of the coordinate in the bike network
         """
+        if graph is not None:
+            return default_store().nearest_nodes(graph, [coords])[0]
         try:
             graph = ox.graph_from_point(coords, dist=100, network_type="bike")
         except (nx.NetworkXPointlessConcept, ValueError):
@@ -0,0 +1,162 @@
+import datetime
+import os
+
+import numpy as np
+import ray
+from ray.rllib.policy.sample_batch import SampleBatch
+
+# own imports
+import Helper
+from Configs.ConfigFactory import ConfigFactory
+from Solvers.HeuristicSolver import HeuristicSolver
+
+
+def augment_data(data, rng, noise=0.25):
+    """
+    Creates a perturbed copy of a dataset by multiplying every feature of every cell with log-normal noise.
+    @param data: The merged data as returned by create_data.
+    @param rng: The numpy random generator.
+    @param noise: The standard deviation of the log-normal noise.
+    @return: The perturbed copy of the data. The cell_id row is left unchanged.
+    """
+    augmented = np.array(data, dtype=float, copy=True)
+    augmented[1:] = augmented[1:] * rng.lognormal(0.0, noise, size=augmented[1:].shape)
+    return augmented
+
+
+def generate_pairs(helper, data, num_pickup=5, num_augmented=16, noise=0.25, seed=0):
+    """
+    Generates (observation, heuristic placement) pairs for the behaviour cloning of the policy network. The training
+    dataset, the test datasets of the helper and perturbed copies of all of them are solved with the HeuristicSolver.
+    @param helper: The helper, its test datasets are used if it has loaded them.
+    @param data: The merged training dataset.
+    @param num_pickup: The number of pick-up stations of the placement.
+    @param num_augmented: The number of perturbed copies of every dataset.
+    @param noise: The standard deviation of the log-normal noise of the perturbed copies.
+    @param seed: The seed of the perturbations.
+    @return: The observations as an array of shape (pairs, cells) and the placements as an array of shape
+    (pairs, num_pickup).
+    """
+    dimensions = helper.find_factors(len(data[0]))
+    solver = HeuristicSolver(dimensions, helper.set_up_column_weights(), helper.set_up_distance_weights())
+    rng = np.random.default_rng(seed)
+
+    # The CompleteEnv starts every episode with an empty state, which is the observation PPO acts on while training
+    observations = [np.zeros(len(data[0]))]
+    actions = [solver.solve(data, num_pickup)]
+    for dataset in [data] + getattr(helper, "trial_datasets", []):
+        for variant in [dataset] + [augment_data(dataset, rng, noise) for _ in range(num_augmented)]:
+            # create_output and run_policy query the policy with the traffic feature of a dataset
+            observations.append(variant[2])
+            actions.append(solver.solve(variant, num_pickup))
+    return np.array(observations, dtype=np.float32), np.array(actions, dtype=np.int64)
+
+
+def clone_policy(policy, observations, actions, epochs=20, batch_size=64, lr=0.001, seed=0):
+    """
+    Trains the policy network of an RLlib policy with supervised learning to maximize the log-likelihood of the given
+    actions. Both the tf2 and the torch framework are supported, with the RLModule of the default configuration of
+    the ConfigFactory as well as with the ModelV2 network if the RLModule api is disabled.
+    @param policy: The RLlib policy, e.g. algorithm.get_policy().
+    @param observations: The observations as an array of shape (pairs, cells).
+    @param actions: The actions as an array of shape (pairs, num_pickup).
+    @param epochs: The number of passes over all pairs.
+    @param batch_size: The number of pairs of a minibatch.
+    @param lr: The learning rate of the Adam optimizer.
+    @param seed: The seed of the minibatch shuffling.
+    @return: The mean negative log-likelihood of every epoch.
+    """
+    rng = np.random.default_rng(seed)
+    losses = []
+
+    def log_likelihood(batch_observations, batch_actions):
+        if policy.config.get("_enable_rl_module_api", False):
+            # The RLModule returns the inputs of its action distribution, which is created from them like in the
+            # loss of the PPO learner
+            module = policy.model
+            logits = module.forward_train({SampleBatch.OBS: batch_observations})[SampleBatch.ACTION_DIST_INPUTS]
+            return module.get_train_action_dist_cls().from_logits(logits).logp(batch_actions)
+        logits, _ = policy.model({"obs": batch_observations})
+        return policy.dist_class(logits, policy.model).logp(batch_actions)
+
+    if policy.framework == "torch":
+        import torch
+        optimizer = torch.optim.Adam(policy.model.parameters(), lr=lr)
+
+        def train_on_batch(batch_observations, batch_actions):
+            loss = -log_likelihood(torch.as_tensor(batch_observations, device=policy.device),
+                                   torch.as_tensor(batch_actions, device=policy.device)).mean()
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            return float(loss.detach().cpu().numpy())
+    else:
+        import tensorflow as tf
+        optimizer = tf.keras.optimizers.Adam(learning_rate=lr)
+
+        def train_on_batch(batch_observations, batch_actions):
+            with tf.GradientTape() as tape:
+                loss = -tf.reduce_mean(log_likelihood(tf.convert_to_tensor(batch_observations),
+                                                      tf.convert_to_tensor(batch_actions)))
+            # The trainable variables are a property of the RLModule and a method of the ModelV2
+            variables = policy.model.trainable_variables
+            variables = variables() if callable(variables) else variables
+            gradients = tape.gradient(loss, variables)
+            # The value branch does not take part in the loss and has no gradients
+            optimizer.apply_gradients([(gradient, variable) for gradient, variable in zip(gradients, variables)
+                                       if gradient is not None])
+            return float(loss.numpy())
+
+    for epoch in range(epochs):
+        order = rng.permutation(len(observations))
+        batch_losses = []
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            batch_losses.append(train_on_batch(observations[batch], actions[batch]))
+        losses.append(float(np.mean(batch_losses)))
+        print("Behaviour cloning epoch " + str(epoch) + ": negative log-likelihood " + str(losses[-1]))
+    return losses
+
+
+def bc_warm_start(rl_env, dataset='dataSets/train_dataset_0.csv', preset=None, num_augmented=16, epochs=20):
+    """
+    Pre-trains the PPO policy network on heuristic placements and exports it as a policy checkpoint. The checkpoint
+    can be handed to MainPPO.main_ppo as warm_start_policy. MainPPO has to use the same preset, so that the framework
+    and the network of the checkpoint match, main_ppo with warm_start takes care of this. A ray instance that is
+    already running, e.g. of a cluster, is used.
+    @param rl_env: The environment class, e.g. CompleteEnv.
+    @param dataset: The relative path of the training dataset.
+    @param preset: The performance preset of the ConfigFactory that is also used by MainPPO, "auto" has to be
+    resolved before.
+    @param num_augmented: The number of perturbed copies of every dataset.
+    @param epochs: The number of behaviour cloning epochs.
+    @return: The path of the exported policy checkpoint.
+    """
+    # Suppress the TensorFlow warning
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+
+    helper = Helper.HelperMethods()
+    data = helper.create_data(dataset, True)
+    observations, actions = generate_pairs(helper, data, num_augmented=num_augmented)
+    print("Generated " + str(len(observations)) + " heuristic placement pairs.")
+
+    if not ray.is_initialized():
+        ray.init()
+    config = ConfigFactory(rl_env, data).get_training_ppo_config(preset=preset)
+    # Only the policy network is trained, so no rollout workers are needed
+    config = config.rollouts(num_rollout_workers=0)
+    algorithm = config.build()
+    try:
+        policy = algorithm.get_policy()
+        clone_policy(policy, observations, actions, epochs=epochs)
+        policy_output_name = "policyStates/" + datetime.datetime.now().strftime("%Y%m%d%H%M%S") + "bc_policy"
+        policy.export_checkpoint(policy_output_name)
+    finally:
+        algorithm.stop()
+    print("The behaviour cloning policy has been exported to: " + policy_output_name)
+    return policy_output_name
+
+
+if __name__ == '__main__':
+    from Envs.CompleteEnv import CompleteEnv
+    bc_warm_start(rl_env=CompleteEnv)
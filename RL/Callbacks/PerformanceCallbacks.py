@@ -0,0 +1,115 @@
+import time
+import numpy as np
+import ray
+from ray.rllib.algorithms.callbacks import DefaultCallbacks
+
+
+class PerformanceCallbacks(DefaultCallbacks):
+    """This class adds throughput instrumentation of the reinforcement learning stack to the result stream of RLlib.
+    After every training iteration the counters and timers of the CompleteEnv instances of all rollout workers are
+    collected and written to the custom_metrics of the result together with the sampler, learner and evaluation times.
+    On a ray cluster the env throughput is additionally aggregated per node.
+    The metrics are therefore also part of the output csv written by HelperMethods.create_output."""
+
+    # Percentiles of the env step latency that are reported per rollout worker
+    step_latency_percentiles = [50, 90, 99]
+
+    def __init__(self, legacy_callbacks_dict=None):
+        super().__init__(legacy_callbacks_dict)
+        self.evaluation_start_time = None
+        self.evaluation_time_s = 0.0
+
+    def on_evaluate_start(self, *, algorithm, **kwargs):
+        self.evaluation_start_time = time.perf_counter()
+
+    def on_evaluate_end(self, *, algorithm, evaluation_metrics, **kwargs):
+        if self.evaluation_start_time is not None:
+            self.evaluation_time_s = time.perf_counter() - self.evaluation_start_time
+            self.evaluation_start_time = None
+
+    def on_train_result(self, *, algorithm, result, **kwargs):
+        """
+        Collects the env statistics of every rollout worker and adds them together with the sampler, learner and
+        evaluation times to the custom_metrics of the result.
+        @param algorithm: The algorithm that has been trained.
+        @param result: The result of the training iteration, which is extended in place.
+        @return: No returns.
+        """
+        worker_stats = algorithm.workers.foreach_worker(
+            lambda worker: (worker.worker_index, ray.util.get_node_ip_address(),
+                            worker.foreach_env(lambda env: env.pop_perf_stats()
+                                               if hasattr(env, "pop_perf_stats") else None)))
+        metrics = {}
+        node_stats = {}
+        for worker_index, node, env_stats in worker_stats:
+            env_stats = [stats for stats in env_stats if stats is not None]
+            metrics.update(self.worker_metrics(worker_index, env_stats))
+            node_stats.setdefault(node, []).append(env_stats)
+        for node, stats in node_stats.items():
+            metrics.update(self.node_metrics(node, stats))
+
+        # Sampler vs learner time of the iteration as measured by the algorithm itself
+        timers = result.get("timers", {})
+        sample_time_ms = timers.get("sample_time_ms", 0.0)
+        learn_time_ms = timers.get("learn_time_ms", 0.0)
+        metrics["sampler_time_ms"] = sample_time_ms
+        metrics["learner_time_ms"] = learn_time_ms
+        if sample_time_ms + learn_time_ms > 0:
+            metrics["sampler_time_share"] = sample_time_ms / (sample_time_ms + learn_time_ms)
+        metrics["evaluation_time_s"] = self.evaluation_time_s
+        self.evaluation_time_s = 0.0
+
+        # Overall sampled env steps per second of wall-clock time of the iteration
+        if result.get("time_this_iter_s"):
+            metrics["env_steps_sampled_per_s"] = \
+                result.get("num_env_steps_sampled_this_iter", 0) / result["time_this_iter_s"]
+
+        result.setdefault("custom_metrics", {}).update(metrics)
+
+    @staticmethod
+    def node_metrics(node, worker_stats):
+        """
+        Aggregates the statistics of all rollout workers of one node.
+        @param node: The ip address of the node.
+        @param worker_stats: A list with the list of sub-environment statistics of every worker on the node. Workers
+        without sub-environments, like the local worker next to remote workers, have an empty list.
+        @return: A dictionary with the metrics of the node, every key is suffixed by the node ip address.
+        """
+        env_stats = [stats for worker in worker_stats for stats in worker]
+        steps = sum(stats["counters"]["steps"] for stats in env_stats)
+        step_s = sum(stats["timers"]["step_s"] for stats in env_stats)
+        suffix = "_node_" + node
+        metrics = {"num_workers" + suffix: len([worker for worker in worker_stats if worker]),
+                   "env_steps" + suffix: steps}
+        if step_s > 0:
+            metrics["env_steps_per_s" + suffix] = steps / step_s
+        return metrics
+
+    def worker_metrics(self, worker_index, env_stats):
+        """
+        Aggregates the statistics of all sub-environments of one rollout worker.
+        @param worker_index: The index of the rollout worker, 0 is the local worker.
+        @param env_stats: The list of statistics returned by CompleteEnv.pop_perf_stats for every sub-environment.
+        @return: A dictionary with the metrics of the worker, every key is suffixed by the worker index.
+        """
+        if not env_stats:
+            return {}
+        steps = sum(stats["counters"]["steps"] for stats in env_stats)
+        step_s = sum(stats["timers"]["step_s"] for stats in env_stats)
+        reward_s = sum(stats["timers"]["reward_s"] for stats in env_stats)
+        reset_s = sum(stats["timers"]["reset_s"] for stats in env_stats)
+        latencies = np.concatenate([stats["step_latencies"] for stats in env_stats])
+
+        suffix = "_worker_" + str(worker_index)
+        metrics = {"env_steps" + suffix: steps,
+                   "env_step_time_s" + suffix: step_s,
+                   "env_reset_time_s" + suffix: reset_s,
+                   "env_reward_time_s" + suffix: reward_s}
+        if step_s > 0:
+            metrics["env_steps_per_s" + suffix] = steps / step_s
+            metrics["env_reward_time_share" + suffix] = reward_s / step_s
+        if len(latencies) > 0:
+            for percentile, value in zip(self.step_latency_percentiles,
+                                         np.percentile(latencies, self.step_latency_percentiles)):
+                metrics["env_step_ms_p" + str(percentile) + suffix] = value * 1000
+        return metrics
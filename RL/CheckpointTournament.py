@@ -0,0 +1,187 @@
+import datetime
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import ray
+from ray.rllib.core.rl_module.rl_module import RLModule
+from ray.rllib.policy.policy import Policy
+from ray.rllib.policy.sample_batch import SampleBatch
+from ray.rllib.utils.checkpoints import get_checkpoint_info
+from ray.rllib.utils.framework import try_import_tf
+
+# own imports
+import Helper
+
+
+def find_checkpoints(checkpoint_dir):
+    """
+    Finds all policy and algorithm checkpoints in a directory, e.g. the policyStates directory or the output
+    directory of trainer.save(). The directory is searched recursively, but not inside found checkpoints.
+    @param checkpoint_dir: The directory that is to be searched.
+    @return: A sorted list with the paths of the checkpoints.
+    """
+    checkpoints = []
+    for root, dirs, _ in os.walk(checkpoint_dir):
+        try:
+            get_checkpoint_info(root)
+        except ValueError:
+            continue
+        checkpoints.append(root)
+        # Do not descend into the policies of an algorithm checkpoint
+        dirs.clear()
+    return sorted(checkpoints)
+
+
+def restore_policy(path_to_checkpoint, policy_id="default_policy"):
+    """
+    Restores a policy from a policy checkpoint or from an algorithm checkpoint.
+    @param path_to_checkpoint: The path of the checkpoint.
+    @param policy_id: The policy that is to be restored from an algorithm checkpoint.
+    @return: The restored policy.
+    """
+    policy = Policy.from_checkpoint(path_to_checkpoint)
+    # Algorithm checkpoints restore a dictionary of all their policies
+    if isinstance(policy, dict):
+        policy = policy[policy_id]
+    return policy
+
+
+def compute_deterministic_actions(policy, observations):
+    """
+    Computes the deterministic actions of a batch of observations, the mode of the action distribution. RLlib 2.6
+    cannot compute them for RLModules with a Tuple action space, so their mode is taken from the logits of the module.
+    @param policy: The RLlib policy, either built as an RLModule or as a ModelV2.
+    @param observations: The observations as an array of shape (batch, observation_size).
+    @return: The actions as an integer array of shape (batch, number of sub-actions).
+    """
+    observations = np.asarray(observations, dtype=np.float32)
+    if not isinstance(policy.model, RLModule):
+        actions = policy.compute_actions(observations, explore=False)[0]
+        # The actions of a Tuple action space are returned as one array per sub-action
+        if isinstance(actions, (tuple, list)):
+            return np.stack(actions, axis=1)
+        return np.asarray(actions)[:, np.newaxis]
+
+    if policy.framework == "torch":
+        import torch
+        with torch.no_grad():
+            batch = {SampleBatch.OBS: torch.from_numpy(observations)}
+            logits = policy.model.forward_inference(batch)[SampleBatch.ACTION_DIST_INPUTS].cpu().numpy()
+    else:
+        _, tf, _ = try_import_tf()
+        batch = {SampleBatch.OBS: tf.convert_to_tensor(observations)}
+        logits = policy.model.forward_inference(batch)[SampleBatch.ACTION_DIST_INPUTS].numpy()
+    spaces = policy.action_space if hasattr(policy.action_space, "spaces") else [policy.action_space]
+    splits = np.cumsum([space.n for space in spaces])[:-1]
+    return np.stack([np.argmax(part, axis=1) for part in np.split(logits, splits, axis=1)], axis=1)
+
+
+@ray.remote(num_cpus=1)
+def evaluate_checkpoint(path_to_checkpoint, trial_observations, trial_rewards, latency_repeats=10):
+    """
+    Restores a checkpoint in a ray worker process and runs its policy deterministically on all test datasets.
+    @param path_to_checkpoint: The path of the checkpoint.
+    @param trial_observations: The observations of the test datasets, the traffic feature as in create_output.
+    @param trial_rewards: The per-cell rewards of the test datasets as returned by HelperMethods.cell_rewards.
+    @param latency_repeats: The number of actions computed to measure the inference latency.
+    @return: A dictionary with the reward statistics and the latencies of the checkpoint.
+    """
+    # RLlib imports tensorflow in graph mode, tf2 policies can only be restored once eager execution is enabled again,
+    # as the rollout workers of RLlib do at their start
+    tf1, _, _ = try_import_tf()
+    if tf1 and not tf1.executing_eagerly():
+        tf1.enable_eager_execution()
+
+    start_time = time.perf_counter()
+    try:
+        policy = restore_policy(path_to_checkpoint)
+    except Exception as e:
+        return {"checkpoint": path_to_checkpoint, "error": repr(e)}
+    restore_time_s = time.perf_counter() - start_time
+
+    actions = compute_deterministic_actions(policy, np.stack(trial_observations))
+    # The reward of the CompleteEnv is the sum of the rewards of the chosen cells
+    rewards = [float(np.sum(cell_rewards[action])) for action, cell_rewards in zip(actions, trial_rewards)]
+
+    latencies = []
+    for _ in range(latency_repeats):
+        start_time = time.perf_counter()
+        compute_deterministic_actions(policy, np.stack(trial_observations[:1]))
+        latencies.append(time.perf_counter() - start_time)
+
+    return {"checkpoint": path_to_checkpoint,
+            "reward_mean": float(np.mean(rewards)),
+            "reward_std": float(np.std(rewards)),
+            "reward_min": float(np.min(rewards)),
+            "reward_max": float(np.max(rewards)),
+            "restore_time_s": restore_time_s,
+            "inference_ms_p50": float(np.percentile(latencies, 50)) * 1000,
+            "inference_ms_p90": float(np.percentile(latencies, 90)) * 1000,
+            **{"reward_dataset_" + str(j): reward for j, reward in enumerate(rewards)}}
+
+
+def rank_checkpoints(checkpoints, trial_observations, trial_rewards):
+    """
+    Evaluates checkpoints in parallel ray worker processes and ranks them by their mean reward.
+    @param checkpoints: The paths of the checkpoints.
+    @param trial_observations: The observations of the test datasets, the traffic feature as in create_output.
+    @param trial_rewards: The per-cell rewards of the test datasets as returned by HelperMethods.cell_rewards.
+    @return: The leaderboard as a pandas dataframe, checkpoints that could not be evaluated are ranked last.
+    """
+    if not ray.is_initialized():
+        ray.init()
+    # The test datasets are put into the object store once and shared by all worker processes
+    observations_ref = ray.put(trial_observations)
+    rewards_ref = ray.put(trial_rewards)
+    results = ray.get([evaluate_checkpoint.remote(checkpoint, observations_ref, rewards_ref)
+                       for checkpoint in checkpoints])
+
+    leaderboard = pd.DataFrame(results)
+    if "error" in leaderboard:
+        for _, failed in leaderboard[leaderboard["error"].notna()].iterrows():
+            print("Could not evaluate " + failed["checkpoint"] + ": " + failed["error"])
+    # Without a single evaluated checkpoint there is nothing to rank
+    if "reward_mean" not in leaderboard:
+        raise RuntimeError("None of the " + str(len(checkpoints)) + " checkpoints could be evaluated, the first "
+                           "error was: " + leaderboard["error"].iloc[0])
+    leaderboard = leaderboard.sort_values("reward_mean", ascending=False, na_position="last").reset_index(drop=True)
+    leaderboard.index.name = "rank"
+    leaderboard.index = leaderboard.index + 1
+    return leaderboard
+
+
+def checkpoint_tournament(checkpoint_dir='policyStates', output_name=None):
+    """
+    Evaluates all checkpoints of a directory in parallel ray worker processes against all test datasets and writes a
+    leaderboard ranked by the mean reward.
+    @param checkpoint_dir: The directory with the checkpoints, e.g. policyStates or the output of trainer.save().
+    @param output_name: The path of the leaderboard csv, by default a dated file in rlOutput.
+    @return: The leaderboard as a pandas dataframe.
+    """
+    # Suppress the TensorFlow warning
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+    os.environ["CUDA_VISIBLE_DEVICES"] = ""
+
+    checkpoints = find_checkpoints(checkpoint_dir)
+    if not checkpoints:
+        raise ValueError("No checkpoints have been found in " + checkpoint_dir + ".")
+    print("Found " + str(len(checkpoints)) + " checkpoints.")
+
+    helper = Helper.HelperMethods()
+    trial_observations = [trial_data[2] for trial_data in helper.trial_datasets]
+    trial_rewards = [helper.cell_rewards(trial_data, helper.dimensions, helper.column_weight, helper.distance_weight)
+                     for trial_data in helper.trial_datasets]
+    leaderboard = rank_checkpoints(checkpoints, trial_observations, trial_rewards)
+
+    if output_name is None:
+        output_name = "rlOutput/" + datetime.datetime.now().strftime("%Y%m%d%H%M%S") + "leaderboard.csv"
+    leaderboard.to_csv(output_name)
+    print(leaderboard[["checkpoint", "reward_mean", "reward_std", "inference_ms_p50"]].head(10).to_string())
+    print("The leaderboard has been written to: " + output_name)
+    return leaderboard
+
+
+if __name__ == '__main__':
+    checkpoint_tournament()
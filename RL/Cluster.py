@@ -0,0 +1,125 @@
+import ray
+from ray.tune.execution.placement_groups import PlacementGroupFactory
+from ray.util.placement_group import placement_group, remove_placement_group
+from ray.util.scheduling_strategies import PlacementGroupSchedulingStrategy
+
+
+class RayCluster:
+    """This class enables the training on a multi-node ray cluster. It connects to an existing ray head, shares the
+    datasets through the ray object store and places the rollout workers spread over the nodes of the cluster while the
+    learner is kept on a chosen node.
+    Every node has to be started with "ray start" from the RL directory of a checkout of this project, because the
+    environment reads the weight files relative to the working directory.
+    The datasets are put into the object store once. A node fetches such an object once and all rollout workers on the
+    node read it from the shared memory of the node, instead of every worker receiving its own serialized copy."""
+
+    # Amount of the node resource requested to pin a bundle to a node, every node offers 1.0 of its own resource
+    node_resource_amount = 0.001
+
+    def __init__(self, address=None, learner_node=None):
+        """
+        @param address: The address of the ray head, e.g. "auto" or "192.168.0.10:6379". None starts a local ray
+        instance as before.
+        @param learner_node: The ip address of the node the learner is to be placed on. None places it on any node.
+        """
+        self.address = address
+        self.learner_node = learner_node
+
+    def connect(self):
+        """
+        Connects to the ray head or starts a local ray instance if no address is given.
+        @return: The cluster itself.
+        """
+        if not ray.is_initialized():
+            ray.init(address=self.address)
+        if self.learner_node is not None and self.learner_node not in [node[0] for node in self.get_nodes()]:
+            raise ValueError("The learner node " + self.learner_node + " is not an alive node of the cluster.")
+        return self
+
+    @staticmethod
+    def share_data(data):
+        """
+        Puts the data into the ray object store, so it is only transferred once per node.
+        @param data: The data that is to be shared, e.g. the dataset of the environment.
+        @return: The object reference of the data, which can be passed in the env_config instead of the data.
+        """
+        return ray.put(data)
+
+    @staticmethod
+    def get_nodes():
+        """
+        Lists the alive nodes of the cluster.
+        @return: A list of (node ip address, number of cpus) tuples.
+        """
+        return [(node["NodeManagerAddress"], node["Resources"].get("CPU", 0)) for node in ray.nodes() if node["Alive"]]
+
+    def get_packed_trial_resources(self, cpus_per_trial=None, num_samples=None):
+        """
+        Calculates the resources of concurrent cpu-only trials, e.g. of population based training, from the cpus of the
+        alive nodes. Every trial consists of one learner and cpus_per_trial - 1 rollout workers with a single cpu and is
+        packed onto one node, so that as many trials as possible run concurrently on every node.
+        @param cpus_per_trial: The number of cpus of every trial. If it is not given it is calculated from the number
+        of samples, or set to 3 if both are not given.
+        @param num_samples: The number of trials. If it is not given, it is the number of trials that fit concurrently
+        onto the nodes.
+        @return: A dictionary with the num_samples, cpus_per_trial, num_workers and num_cpus_per_worker of the trials.
+        """
+        node_cpus = [int(cpus) for _, cpus in self.get_nodes() if cpus >= 1]
+        if not node_cpus:
+            raise ValueError("The cluster does not have any node with cpus.")
+        if cpus_per_trial is None:
+            cpus_per_trial = 3 if num_samples is None else sum(node_cpus) // num_samples
+        # A trial needs at least a learner and one rollout worker and has to fit onto a single node. On nodes with a
+        # single cpu the learner samples on its own
+        cpus_per_trial = max(min(2, max(node_cpus)), min(cpus_per_trial, max(node_cpus)))
+        if num_samples is None:
+            num_samples = max(2, sum(cpus // cpus_per_trial for cpus in node_cpus))
+        return {"num_samples": num_samples, "cpus_per_trial": cpus_per_trial, "num_workers": cpus_per_trial - 1,
+                "num_cpus_per_worker": 1}
+
+    def get_bundles(self, num_workers, cpus_per_worker=1, learner_cpus=1, learner_gpus=0):
+        """
+        Creates the resource bundles of one training run. The first bundle is the learner, which is pinned to the
+        learner node if one has been chosen, the remaining bundles are the rollout workers.
+        @param num_workers: The number of rollout workers.
+        @param cpus_per_worker: The number of cpus of every rollout worker.
+        @param learner_cpus: The number of cpus of the learner.
+        @param learner_gpus: The number of gpus of the learner.
+        @return: The list of resource bundles.
+        """
+        learner_bundle = {"CPU": learner_cpus}
+        if learner_gpus > 0:
+            learner_bundle["GPU"] = learner_gpus
+        if self.learner_node is not None:
+            learner_bundle["node:" + self.learner_node] = self.node_resource_amount
+        return [learner_bundle] + [{"CPU": cpus_per_worker} for _ in range(num_workers)]
+
+    def get_placement_group_factory(self, num_workers, cpus_per_worker=1, learner_cpus=1, learner_gpus=0):
+        """
+        Creates the placement group factory of one tune trial with the rollout workers spread over the nodes.
+        @return: The PlacementGroupFactory which can be passed to tune.with_resources.
+        """
+        return PlacementGroupFactory(self.get_bundles(num_workers, cpus_per_worker, learner_cpus, learner_gpus),
+                                     strategy="SPREAD")
+
+    def run_on_learner(self, func, *args, num_workers=0, cpus_per_worker=1, learner_cpus=1, **kwargs):
+        """
+        Runs a function, e.g. a training loop, on the learner node. All actors created by the function, like the
+        rollout workers of RLlib, are placed into the spread placement group of the run.
+        @param func: The function that is to be run on the learner node.
+        @param num_workers: The number of rollout workers the function creates.
+        @param cpus_per_worker: The number of cpus of every rollout worker.
+        @param learner_cpus: The number of cpus of the learner.
+        @return: The return value of the function.
+        """
+        group = placement_group(self.get_bundles(num_workers, cpus_per_worker, learner_cpus), strategy="SPREAD")
+        ray.get(group.ready())
+        try:
+            remote_func = ray.remote(func).options(
+                num_cpus=learner_cpus,
+                scheduling_strategy=PlacementGroupSchedulingStrategy(placement_group=group,
+                                                                     placement_group_bundle_index=0,
+                                                                     placement_group_capture_child_tasks=True))
+            return ray.get(remote_func.remote(*args, **kwargs))
+        finally:
+            remove_placement_group(group)
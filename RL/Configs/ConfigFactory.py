@@ -1,13 +1,53 @@
 from ray.rllib.algorithms.ppo import PPOConfig
+from Callbacks.PerformanceCallbacks import PerformanceCallbacks
 
 class ConfigFactory():
+    # Named CPU performance presets. An episode of the CompleteEnv consists of a single step, therefore the rollout
+    # fragment length equals the number of episodes a sub-environment samples per fragment. The train batch size is
+    # always a multiple of num_rollout_workers * num_envs_per_worker * rollout_fragment_length. Observations are
+    # compressed when many workers ship their 39k cell observations to the learner.
+    performance_presets = {
+        "laptop": {
+            "framework": "tf2",
+            "num_rollout_workers": 2,
+            "num_envs_per_worker": 5,
+            "rollout_fragment_length": 500,
+            "train_batch_size": 5000,
+            "sgd_minibatch_size": 1024,
+            "compress_observations": False,
+            "num_cpus_per_worker": 1
+        },
+        "16core": {
+            "framework": "torch",
+            "num_rollout_workers": 14,
+            "num_envs_per_worker": 4,
+            "rollout_fragment_length": 100,
+            "train_batch_size": 5600,
+            "sgd_minibatch_size": 1024,
+            "compress_observations": True,
+            "num_cpus_per_worker": 1
+        },
+        "64core": {
+            "framework": "torch",
+            "num_rollout_workers": 60,
+            "num_envs_per_worker": 4,
+            "rollout_fragment_length": 50,
+            "train_batch_size": 12000,
+            "sgd_minibatch_size": 2048,
+            "compress_observations": True,
+            "num_cpus_per_worker": 1
+        }
+    }
+
     def __init__(self, env, data):
         self.env = env
         self.data = data
 
-    def get_standard_ppo_config(self, env_config={}):
+    def get_standard_ppo_config(self, env_config=None):
         config = PPOConfig()
 
+        # Copy the environment configuration so the data of one factory does not leak into the next one
+        env_config = dict(env_config or {})
         # Insert the data into the environment configuration
         if 'data' not in env_config:
             env_config['data'] = self.data
@@ -17,4 +57,63 @@ class ConfigFactory():
         # Using tensorflow 2 as a framework
         config = config.framework(framework="tf2")
 
+        # Report env step latencies, sampler, learner and evaluation times in the result stream
+        config = config.callbacks(PerformanceCallbacks)
+
         return config
+
+    def get_training_ppo_config(self, preset=None, env_config=None):
+        # The standard configuration with the training hyperparameters used by MainPPO and the RLCheckpointLoader
+        config = self.get_standard_ppo_config(env_config)
+
+        config = config.training(
+            gamma=0.95,
+            lr=0.0001,
+            clip_param=0.2,
+            lambda_=0.95,
+            num_sgd_iter=20,
+            sgd_minibatch_size=1024,
+            train_batch_size=5000,
+            vf_clip_param=5
+        )
+
+        # Without a preset the resources of the original training setup are used
+        if preset is None:
+            config = config.resources(
+                num_cpus_per_worker=4
+            )
+        else:
+            config = self.apply_performance_preset(config, preset)
+
+        return config
+
+    @staticmethod
+    def apply_performance_preset(config, preset):
+        # Sets the framework, rollout workers, envs per worker, fragment length, batch sizes and observation
+        # compression of the given named preset
+        if preset not in ConfigFactory.performance_presets:
+            raise ValueError("Unknown performance preset '" + str(preset) + "'. Available presets are: " +
+                             ", ".join(ConfigFactory.performance_presets))
+        settings = ConfigFactory.performance_presets[preset]
+
+        config = config.framework(framework=settings["framework"])
+        config = config.rollouts(
+            num_rollout_workers=settings["num_rollout_workers"],
+            num_envs_per_worker=settings["num_envs_per_worker"],
+            rollout_fragment_length=settings["rollout_fragment_length"],
+            compress_observations=settings["compress_observations"]
+        )
+        config = config.training(
+            train_batch_size=settings["train_batch_size"],
+            sgd_minibatch_size=settings["sgd_minibatch_size"]
+        )
+        config = config.resources(
+            num_cpus_per_worker=settings["num_cpus_per_worker"]
+        )
+        return config
+
+    @staticmethod
+    def get_required_cpus(preset):
+        # Number of CPUs a preset occupies: one per rollout worker plus one for the learner on the driver
+        settings = ConfigFactory.performance_presets[preset]
+        return settings["num_rollout_workers"] * settings["num_cpus_per_worker"] + 1
@@ -0,0 +1,113 @@
+import json
+import os
+import socket
+import time
+
+import ray
+
+from Configs.ConfigFactory import ConfigFactory
+
+
+class PresetTuner:
+    """This class runs short timed PPO trials with every performance preset of the ConfigFactory on the local machine
+    and selects the preset with the highest amount of sampled env steps per second. The selection is stored per host
+    and cpu count in tunedPreset.json so the trials only run once on every new machine."""
+
+    def __init__(self, env, data, trial_time_s=60, tuned_preset_file="tunedPreset.json"):
+        self.env = env
+        self.data = data
+        self.trial_time_s = trial_time_s
+        self.tuned_preset_file = tuned_preset_file
+
+    def get_machine_key(self):
+        """
+        The key under which the tuned preset of this machine is stored.
+        @return: The host name combined with the amount of cpus of the machine.
+        """
+        return socket.gethostname() + "_" + str(os.cpu_count())
+
+    def run_trial(self, preset):
+        """
+        Trains PPO with the given preset for trial_time_s seconds and measures the throughput. The first iteration
+        contains the warm-up of the workers and is therefore not measured, except if it is the only one.
+        @param preset: The name of the performance preset.
+        @return: The sampled env steps per second of the preset.
+        """
+        config = ConfigFactory(self.env, self.data).get_training_ppo_config(preset=preset)
+        algorithm = config.build()
+        try:
+            trial_start = time.perf_counter()
+            result = algorithm.train()
+            measure_start = time.perf_counter()
+            steps_start = result["num_env_steps_sampled"]
+            if measure_start - trial_start >= self.trial_time_s:
+                return steps_start / (measure_start - trial_start)
+            while time.perf_counter() - trial_start < self.trial_time_s:
+                result = algorithm.train()
+            return (result["num_env_steps_sampled"] - steps_start) / (time.perf_counter() - measure_start)
+        finally:
+            algorithm.stop()
+
+    def tune(self, presets=None):
+        """
+        Runs a timed trial for every preset that fits onto the cpus available to ray and stores the best preset.
+        @param presets: The names of the presets to be tried, all presets of the ConfigFactory by default.
+        @return: The name of the preset with the highest throughput and a dictionary with the throughput of every
+        preset that has been tried.
+        """
+        if presets is None:
+            presets = list(ConfigFactory.performance_presets)
+        available_cpus = ray.available_resources().get("CPU", os.cpu_count())
+
+        throughputs = {}
+        for preset in presets:
+            if ConfigFactory.get_required_cpus(preset) > available_cpus:
+                print("Skipping preset " + preset + ", it requires " + str(ConfigFactory.get_required_cpus(preset)) +
+                      " cpus but only " + str(available_cpus) + " are available.")
+                continue
+            throughputs[preset] = self.run_trial(preset)
+            print("Preset " + preset + ": " + str(round(throughputs[preset], 2)) + " sampled env steps per second.")
+
+        if not throughputs:
+            raise ValueError("None of the presets " + str(presets) + " fits onto the available cpus.")
+        best_preset = max(throughputs, key=throughputs.get)
+        self.save_tuned_preset(best_preset, throughputs)
+        return best_preset, throughputs
+
+    def load_tuned_preset(self):
+        """
+        Loads the preset that has been tuned on this machine before.
+        @return: The name of the tuned preset or None if this machine has not been tuned yet.
+        """
+        if not os.path.exists(self.tuned_preset_file):
+            return None
+        with open(self.tuned_preset_file, 'r') as file:
+            tuned_presets = json.load(file)
+        if self.get_machine_key() in tuned_presets:
+            return tuned_presets[self.get_machine_key()]["preset"]
+        return None
+
+    def save_tuned_preset(self, preset, throughputs):
+        """
+        Stores the tuned preset of this machine together with the measured throughputs.
+        @param preset: The name of the selected preset.
+        @param throughputs: The measured sampled env steps per second of all tried presets.
+        @return: No returns.
+        """
+        tuned_presets = {}
+        if os.path.exists(self.tuned_preset_file):
+            with open(self.tuned_preset_file, 'r') as file:
+                tuned_presets = json.load(file)
+        tuned_presets[self.get_machine_key()] = {"preset": preset, "env_steps_per_s": throughputs}
+        with open(self.tuned_preset_file, 'w') as file:
+            json.dump(tuned_presets, file, indent=4)
+
+    def select_preset(self):
+        """
+        Returns the tuned preset of this machine and runs the tuning trials if there is none yet.
+        @return: The name of the selected preset.
+        """
+        preset = self.load_tuned_preset()
+        if preset is None:
+            preset, _ = self.tune()
+        return preset
@@ -0,0 +1,220 @@
+import datetime
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# own imports
+import Helper
+import SolvePlacements
+
+# The rows of population and traffic in the merged data, see HelperMethods.merge_data
+POPULATION_ROW = 1
+TRAFFIC_ROW = 2
+EARTH_RADIUS_M = 6371000
+
+# The simulator of a worker process, set once per worker process
+_worker_simulator = None
+
+
+def _init_worker(simulator):
+    global _worker_simulator
+    _worker_simulator = simulator
+
+
+def _run_days(task):
+    return _worker_simulator.simulate_days(*task)
+
+
+def haversine(latitudes, longitudes, latitude, longitude):
+    """
+    @return: The distances in meters between the given coordinates and a single coordinate.
+    """
+    latitudes, longitudes = np.radians(latitudes), np.radians(longitudes)
+    latitude, longitude = np.radians(latitude), np.radians(longitude)
+    a = np.sin((latitudes - latitude) / 2) ** 2 + \
+        np.cos(latitudes) * np.cos(latitude) * np.sin((longitudes - longitude) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+class DemandSimulator:
+    """This class simulates the parcel recipients of a day and their pick-up at the stations of a placement. The
+    recipients are sampled from the cells in proportion to their population and traffic and walk to the closest station
+    within the maximum walking distance. A station accepts parcels up to its capacity, as the max_weight of the
+    stations of the frontend, recipients of a full station go to the next closest station in reach or are overflow.
+    Recipients are located at the centroid of their cell, so the walking distance is measured between centroids."""
+
+    def __init__(self, data, coordinates, recipients_per_day=20000, capacity=20, max_walk_m=1000,
+                 traffic_share=0.3, num_processes=None):
+        """
+        @param data: The merged data as returned by create_data.
+        @param coordinates: The coordinate of every cell as latitude and longitude, as the coordinate_list of the
+        HelperMethods.
+        @param recipients_per_day: The average number of parcel recipients per day, the number of every day is
+        poisson distributed.
+        @param capacity: The number of parcels a station can hold per day.
+        @param max_walk_m: The maximum distance in meters a recipient walks to a station.
+        @param traffic_share: The share of recipients sampled by traffic instead of population.
+        @param num_processes: The number of processes, by default the number of cpus.
+        """
+        coordinates = np.asarray(coordinates, dtype=float)
+        self.latitudes = coordinates[:, 0]
+        self.longitudes = coordinates[:, 1]
+        self.recipients_per_day = recipients_per_day
+        self.capacity = capacity
+        self.max_walk_m = max_walk_m
+        self.num_processes = num_processes or os.cpu_count()
+
+        demand = np.zeros(len(coordinates))
+        for row, share in ((POPULATION_ROW, 1 - traffic_share), (TRAFFIC_ROW, traffic_share)):
+            layer = np.maximum(np.asarray(data[row], dtype=float), 0.0)
+            if layer.sum() > 0:
+                demand += share * layer / layer.sum()
+        if demand.sum() == 0:
+            raise ValueError("The data does not contain any population or traffic to sample recipients from.")
+        self.demand = demand / demand.sum()
+        self.station_choices = None
+        self.station_distances = None
+
+    def set_placement(self, placement):
+        """
+        Precomputes the stations in reach of every cell that has recipients, sorted by their distance.
+        @param placement: The cells of the pick-up stations.
+        """
+        self.placement = [int(cell) for cell in placement]
+        cells = np.flatnonzero(self.demand)
+        distances = np.stack([haversine(self.latitudes[cells], self.longitudes[cells], self.latitudes[station],
+                                        self.longitudes[station]) for station in self.placement], axis=1)
+        order = np.argsort(distances, axis=1, kind="stable")
+        # The choices of every cell, the closest station first, -1 for stations out of reach
+        sorted_distances = np.take_along_axis(distances, order, axis=1)
+        self.station_choices = np.full((len(self.demand), len(self.placement)), -1, dtype=np.int64)
+        self.station_choices[cells] = np.where(sorted_distances <= self.max_walk_m, order, -1)
+        self.station_distances = np.zeros((len(self.demand), len(self.placement)))
+        self.station_distances[cells] = sorted_distances
+
+    def simulate_day(self, rng):
+        """
+        Simulates the recipients of one day.
+        @param rng: The numpy random generator of the day.
+        @return: A dictionary with the number of recipients, the recipients in reach of a station, the served
+        recipients, the overflow, the total walking distance of the served recipients and the parcels of every station.
+        """
+        counts = rng.multinomial(rng.poisson(self.recipients_per_day), self.demand)
+        # The recipients in the order of their arrival
+        recipients = rng.permutation(np.repeat(np.arange(len(self.demand)), counts))
+        choices = self.station_choices[recipients]
+        reachable = choices[:, 0] >= 0
+
+        served = np.zeros(len(recipients), dtype=bool)
+        walked = 0.0
+        remaining = np.full(len(self.placement), self.capacity)
+        parcels = np.zeros(len(self.placement), dtype=np.int64)
+        for rank in range(len(self.placement)):
+            waiting = ~served & (choices[:, rank] >= 0)
+            for station in range(len(self.placement)):
+                if remaining[station] == 0:
+                    continue
+                candidates = np.flatnonzero(waiting & (choices[:, rank] == station))[:remaining[station]]
+                served[candidates] = True
+                remaining[station] -= len(candidates)
+                parcels[station] += len(candidates)
+                walked += self.station_distances[recipients[candidates], rank].sum()
+        num_served = int(served.sum())
+        return {"recipients": len(recipients), "reachable": int(reachable.sum()), "served": num_served,
+                "overflow": int(reachable.sum()) - num_served, "walked_m": walked, "parcels": parcels}
+
+    def simulate_days(self, seeds):
+        # Simulates one day per seed
+        rows = []
+        for seed in seeds:
+            day = self.simulate_day(np.random.default_rng(seed))
+            rows.append({"recipients": day["recipients"], "reachable": day["reachable"], "served": day["served"],
+                         "overflow": day["overflow"],
+                         "mean_walk_m": day["walked_m"] / day["served"] if day["served"] else np.nan,
+                         "utilisation": day["parcels"].sum() / (self.capacity * len(self.placement))})
+        return rows
+
+    def simulate(self, placement, num_days=1000, seed=0):
+        """
+        Simulates the pick-up at a placement over many random days, the days are split between a process pool.
+        @param placement: The cells of the pick-up stations.
+        @param num_days: The number of simulated days.
+        @param seed: The seed of the first day, the days use consecutive seeds.
+        @return: A dataframe with one row per day with the recipients, the recipients in reach, the served
+        recipients, the overflow, the mean walking distance of the served recipients and the utilisation of the
+        capacity.
+        """
+        self.set_placement(placement)
+        seeds = list(range(seed, seed + num_days))
+        if self.num_processes > 1 and num_days > 1:
+            # Consecutive days per process keep the rows in the order of the days
+            bounds = np.linspace(0, num_days, self.num_processes + 1).astype(int)
+            chunks = [(seeds[start:end],) for start, end in zip(bounds[:-1], bounds[1:])]
+            with ProcessPoolExecutor(self.num_processes, initializer=_init_worker, initargs=(self,)) as executor:
+                rows = [row for chunk in executor.map(_run_days, chunks) for row in chunk]
+        else:
+            rows = self.simulate_days(seeds)
+        return pd.DataFrame(rows)
+
+    @staticmethod
+    def summarize(days):
+        """
+        @param days: The days as returned by simulate.
+        @return: A dictionary with the served share of all recipients, the served share of the recipients in reach,
+        the overflow share of the recipients in reach, the mean walking distance and the mean utilisation, each with
+        the mean over the days.
+        """
+        recipients = days["recipients"].replace(0, np.nan)
+        reachable = days["reachable"].replace(0, np.nan)
+        return {"served_share": (days["served"] / recipients).mean(),
+                "served_share_in_reach": (days["served"] / reachable).mean(),
+                "overflow_share": (days["overflow"] / reachable).mean(),
+                "overflow": days["overflow"].mean(),
+                "mean_walk_m": days["mean_walk_m"].mean(),
+                "utilisation": days["utilisation"].mean()}
+
+
+def simulate_placements(dataset, placements=None, num_pickup=5, num_days=1000, output_name=None, **simulator_args):
+    """
+    Simulates the pick-up at the placements of a dataset and writes a comparison of their operational metrics.
+    @param dataset: The relative path of the dataset.
+    @param placements: A dictionary of names to the cells of a placement, by default the placements of the solvers of
+    SolvePlacements.
+    @param num_pickup: The number of pick-up stations of the solver placements.
+    @param num_days: The number of simulated days.
+    @param output_name: The path of the comparison csv, by default a dated file in rlOutput.
+    @param simulator_args: The further arguments of the DemandSimulator, e.g. capacity or max_walk_m.
+    @return: The comparison as a pandas dataframe.
+    """
+    helper = Helper.HelperMethods(True)
+    data = helper.create_data(dataset, True)
+    if placements is None:
+        column_weight = helper.set_up_column_weights()
+        distance_weight = helper.set_up_distance_weights()
+        dimensions = helper.find_factors(len(data[0]))
+        placements = {solver: SolvePlacements.get_solver(solver, dimensions, column_weight, distance_weight)
+                      .solve(data, num_pickup) for solver in ("heuristic", "greedy")}
+
+    simulator = DemandSimulator(data, helper.coordinate_list, **simulator_args)
+    rows = []
+    for name, placement in placements.items():
+        start_time = time.perf_counter()
+        summary = simulator.summarize(simulator.simulate(placement, num_days))
+        print(name + ": served " + str(round(100 * summary["served_share_in_reach"], 2)) + "% of the recipients in "
+              "reach, mean walk " + str(round(summary["mean_walk_m"], 1)) + "m, simulated " + str(num_days) +
+              " days in " + str(round(time.perf_counter() - start_time, 3)) + "s")
+        rows.append({"placement": name, "stations": " ".join(str(cell) for cell in placement), **summary})
+
+    comparison = pd.DataFrame(rows)
+    if output_name is None:
+        output_name = "rlOutput/" + datetime.datetime.now().strftime("%Y%m%d%H%M%S") + "demand.csv"
+    comparison.to_csv(output_name, index=False)
+    print("The comparison has been written to: " + output_name)
+    return comparison
+
+
+if __name__ == '__main__':
+    simulate_placements("dataSets/test_dataset_0.csv")
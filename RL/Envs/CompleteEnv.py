@@ -1,6 +1,9 @@
 import gymnasium as gym
 import numpy as np
 import random
+import ray
+import time
+from collections import deque
 # import Helper
 try:
     import Helper
@@ -11,16 +14,53 @@ import sys
 import os
 
 helper = Helper.HelperMethods(True)
+# The directory of the RL module, relative dataset paths of an env_config are resolved against it
+RL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The datasets loaded by the environments of this process, keyed by their path
+loaded_datasets = {}
+
+
+def load_env_data(env_config):
+    """
+    Returns the data of an environment configuration. The key data holds the data or, in cluster mode, its reference in
+    the ray object store. The key dataset holds the path of the dataset, which is loaded once per process if there is
+    no data, e.g. in the sweep, or if the reference cannot be resolved anymore. The latter is the case for an algorithm
+    restored from a checkpoint of an earlier ray session, as the owner of the reference is gone.
+    @param env_config: The environment configuration.
+    @return: The data.
+    """
+    data = env_config.get("data")
+    if isinstance(data, ray.ObjectRef):
+        try:
+            return ray.get(data)
+        except ray.exceptions.OwnerDiedError:
+            if "dataset" not in env_config:
+                raise
+            data = None
+    if data is None:
+        file_path = os.path.join(RL_DIR, env_config["dataset"])
+        if file_path not in loaded_datasets:
+            loaded_datasets[file_path] = helper.create_data(file_path, True)
+        data = loaded_datasets[file_path]
+    return data
+
 
 class CompleteEnv(gym.Env):
     # Initializes the environment
     def __init__(self, env_config=None):
-        # Set the data
-        self.data = env_config["data"]
+        # Set the data, in cluster mode the data is shared through the ray object store and only its reference is passed
+        self.data = load_env_data(env_config)
         self.data_length = len(self.data[0])
         #
-        self.distance_weight = self.setupDistanceWeights()
-        self.column_weight = self.setupColumnWeight()
+        # The weight files can be overridden by weight profiles in the env_config, e.g. by the sweep runner
+        if "distance_weight" in env_config:
+            self.distance_weight = env_config["distance_weight"]
+        else:
+            self.distance_weight = self.setupDistanceWeights()
+        if "column_weight" in env_config:
+            self.column_weight = env_config["column_weight"]
+        else:
+            self.column_weight = self.setupColumnWeight()
         #
         self.dimensions = helper.find_factors(self.data_length)
         # Sets the flag indicating if random steps are requested
@@ -43,6 +83,11 @@ class CompleteEnv(gym.Env):
         self.max_steps = 5
         # Starting amount of steps
         self.step_count = 0
+        # Counters and timers of the hot path (step, reset and reward) used for throughput instrumentation
+        self.perf_counters = {"steps": 0, "resets": 0, "reward_calls": 0}
+        self.perf_timers = {"step_s": 0.0, "reset_s": 0.0, "reward_s": 0.0}
+        # Latencies of the most recent steps in seconds, used to compute the step latency percentiles
+        self.step_latencies = deque(maxlen=1000)
 
         action_space = []
         for i in range(self.num_pickup):
@@ -56,6 +101,7 @@ class CompleteEnv(gym.Env):
 
     # Resets the environment to an initial state
     def reset(self, *, seed=None, options=None):
+        start_time = time.perf_counter()
         # Sets the pick-up locations to an empty state
         self.pickup_locations = []
         # Potential states of the reinforcement learning algorihtm
@@ -64,11 +110,14 @@ class CompleteEnv(gym.Env):
         self.done = False
         # Setting the done amount of steps back to 0
         self.step_count = 0
+        self.perf_counters["resets"] += 1
+        self.perf_timers["reset_s"] += time.perf_counter() - start_time
         # Returns the given state with the empty pick-up locations list as actions taken
         return self.state, {"actions_taken": self.pickup_locations}
 
     # Does one step in the algorithm
     def step(self, action):
+        start_time = time.perf_counter()
         # If the requested amount of steps has been done it resets the algorithm
         if self.done:
             return self._reset()
@@ -92,7 +141,12 @@ class CompleteEnv(gym.Env):
         # set done to true if the requested amount of pick-up locations has been reached or if the maximum amount of
         # steps has been reached
         self.done = (len(self.pickup_locations) == self.num_pickup) or (self.step_count == self.max_steps)
-        
+
+        step_time = time.perf_counter() - start_time
+        self.perf_counters["steps"] += 1
+        self.perf_timers["step_s"] += step_time
+        self.step_latencies.append(step_time)
+
         # Return the reached state, reward, boolean value if done, False and the pick-up locations that have been chosen
         # reward,
         return self.state, complete_reward, self.done, False, {"actions_taken": self.pickup_locations}
@@ -100,7 +154,19 @@ class CompleteEnv(gym.Env):
     def get_pickup_locations(self):
         return self.pickup_locations
 
+    # Swaps the data of the environment, e.g. to continue the training of a restored algorithm on a new dataset
+    def set_data(self, data):
+        if isinstance(data, ray.ObjectRef):
+            data = ray.get(data)
+        # The observation and action spaces of the trained policy depend on the number of cells
+        if len(data[0]) != self.data_length:
+            raise ValueError("The new data has " + str(len(data[0])) + " cells, but the environment has been created "
+                             "with " + str(self.data_length) + " cells.")
+        self.data = data
+        self.reset()
+
     def reward(self, action):  # single_pickup_location_action):
+        start_time = time.perf_counter()
         # rw = np.zeros(len(action))
         rw = 0
         # for single_pickup_location in action: #-1 because there is an extra id column in the beginning
@@ -110,17 +176,14 @@ class CompleteEnv(gym.Env):
             rw = rw + self.data[i+1][action] * self.column_weight[i+1]
             for j in range(len(indexes)):
                 rw = rw + self.data[i+1][indexes[j]] * self.distance_weight[i+1] * self.column_weight[i+1]
+        self.perf_counters["reward_calls"] += 1
+        self.perf_timers["reward_s"] += time.perf_counter() - start_time
         return rw
 
     def setupDistanceWeights(self):
         # Initial weight of distances in the reward function
-        file_path = '../distanceWeights.txt'
-
-        # # Get the directory containing your current script:
-        # script_dir = os.path.dirname(os.path.abspath(__file__))
-        #
-        # # Append the relative path to your CSV:
-        # file_path = os.path.join(script_dir, file_path)
+        # The weight files are found independently of the working directory
+        file_path = os.path.join(RL_DIR, 'distanceWeights.txt')
 
         with open(file_path, 'r') as file:
             lines = file.readlines()[1:]
@@ -134,13 +197,8 @@ class CompleteEnv(gym.Env):
 
     def setupColumnWeight(self):
         # Initial weight of features in the reward function
-        file_path = '../featureWeights.txt'
-
-        # # Get the directory containing your current script:
-        # script_dir = os.path.dirname(os.path.abspath(__file__))
-        #
-        # # Append the relative path to your CSV:
-        # file_path = os.path.join(script_dir, file_path)
+        # The weight files are found independently of the working directory
+        file_path = os.path.join(RL_DIR, 'featureWeights.txt')
 
         with open(file_path, 'r') as file:
             lines = file.readlines()[1:]
@@ -154,3 +212,13 @@ class CompleteEnv(gym.Env):
 
     def get_data(self):
         return self.data
+
+    def pop_perf_stats(self):
+        # Returns the counters, timers and step latencies collected since the last call and resets them. Used by the
+        # PerformanceCallbacks to report the env throughput of every rollout worker
+        stats = {"counters": dict(self.perf_counters), "timers": dict(self.perf_timers),
+                 "step_latencies": list(self.step_latencies)}
+        self.perf_counters = dict.fromkeys(self.perf_counters, 0)
+        self.perf_timers = dict.fromkeys(self.perf_timers, 0.0)
+        self.step_latencies.clear()
+        return stats
@@ -2,27 +2,32 @@
 import csv
 import datetime
 import folium
-from IPython.display import IFrame
 import json
 import numpy as np
 import pandas as pd
-from ray.rllib.policy.policy import Policy
 import os
+import time
 
 
 class HelperMethods:
     """This class is used to enable the preprocessing, training and evaluation of the reinforcement learning algorithm.
     For the preprocessing the methods create_coordinate_list, create_data and merge_data are used.
     For the training the methods: find_factors, reward, set_up_distance_weights and set_up_column_weightss are used.
-    For the evaluation the methods: select_indices, create_coordinate_list, action_to_coord, plot_coordinate, 
-    initialize_output, create_output and run_policy is used."""
+    For the evaluation the methods: select_indices, create_coordinate_list, action_to_coord, placement_records,
+    append_placements, initialize_output, create_output and run_policy is used. The placements of all evaluations are
+    written to one placements file per training, which is rendered by placementViewer.html. plot_coordinate saves a
+    single placement as a folium map."""
     episode_reward_mean = []
     i = 0
+    # Columns of the placements file written by create_output
+    placement_fieldnames = ['iteration', 'dataset', 'station', 'cell_id', 'latitude', 'longitude', 'reward']
     current_date_time = datetime.datetime.now()
     formatted_date_time = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
 
     def __init__(self, debug=False):
         self.data = None
+        # Duration of the last create_output call, reported in the custom_metrics of the next result
+        self.create_output_time_s = 0.0
 
         # Get the directory containing your current script:
         # script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -116,6 +121,24 @@ class HelperMethods:
         coordinates = [self.coordinate_list[actions]]
         return coordinates
 
+    @staticmethod
+    def write_frontend_csv(placements, output_name):
+        """
+        Writes placements in the format of the frontend datasets read by the route planning, e.g.
+        RoutePlanning/frontenddatasets20230528.csv. Every row contains the name of a dataset and the coordinates of its
+        pick-up stations.
+        @param placements: A dictionary of dataset names to the lists of coordinates of their pick-up stations.
+        @param output_name: The path of the csv file.
+        @return: No returns.
+        """
+        num_actions = max(len(coordinates) for coordinates in placements.values())
+        with open(output_name, 'w', newline='') as csvfile:
+            csvfile.write(", ".join(["DataSet"] + ["Action_" + str(i + 1) for i in range(num_actions)]) + "\n")
+            writer = csv.writer(csvfile)
+            for dataset, coordinates in placements.items():
+                writer.writerow([dataset] + ["[" + str(round(coordinate[0], 4)) + ", " + str(round(coordinate[1], 4)) +
+                                             "]" for coordinate in coordinates])
+
     def create_data(self, given_file_path, merge_data=True):
         """
         This method is used to read in the dataset into respective features. These features are then combined in a
@@ -194,6 +217,12 @@ class HelperMethods:
             writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
             writer.writeheader()
 
+        # The placements of all evaluations are appended to a single file, which is rendered by placementViewer.html
+        self.placements_name = "rlOutput/" + self.current_date_time.strftime("%Y%m%d%H%M%S") + "placements.csv"
+        with open(self.placements_name, 'w', newline='') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=self.placement_fieldnames)
+            writer.writeheader()
+
     def create_output(self, result, trainer, extended_logs=True):
         """
         This method is used to create custom logs for the evaluation of the PPO algorithm It also saves policies if so
@@ -203,6 +232,11 @@ class HelperMethods:
         @param extended_logs: Saves the current policy and the logs of the model for evaluation.
         @return: No returns
         """
+        start_time = time.perf_counter()
+        # The duration of this call is only known at its end, therefore the duration of the previous call is logged
+        if isinstance(result.get('custom_metrics'), dict):
+            result['custom_metrics']['create_output_time_s'] = self.create_output_time_s
+
         with open(self.output_name, 'w', newline='') as csvfile:
             fieldnames = ['iterations_since_restore', 'num_remote_worker_restarts', 'episode_reward_mean',
                           'num_env_steps_trained_this_iter', 'date', 'timers', 'sampler_results', 'info',
@@ -228,24 +262,26 @@ class HelperMethods:
 
             default_policy = trainer.get_policy(policy_id="default_policy")
             default_policy.export_checkpoint(policy_output_name)
+            # ray is only imported where a policy is restored, so the solvers do not load it
+            from ray.rllib.policy.policy import Policy
             my_restored_policy = Policy.from_checkpoint(policy_output_name)
 
+            iteration = result.get('training_iteration', self.i)
             action = my_restored_policy.compute_single_action(self.data[2])
-            coordinates = self.action_to_coord(action[0][2])
-            self.plot_coordinate(coordinates)
-            results = []
+            placements = self.placement_records(iteration, "train", action[0], self.data)
 
             for j in range(len(self.trial_datasets)):
-                results.append(self.run_policy(self.trial_datasets[j], policy_output_name, j))
                 action = my_restored_policy.compute_single_action(self.trial_datasets[j][2])
-                combined_reward = 0
-                for a in action[0]:
-                    combined_reward = combined_reward + self.reward(a, self.trial_datasets[j], self.dimensions)
+                trial_placements = self.placement_records(iteration, "test_dataset_" + str(j), action[0],
+                                                          self.trial_datasets[j])
+                placements.extend(trial_placements)
+                combined_reward = sum(placement['reward'] for placement in trial_placements)
                 if len(self.test_reward_mean) < len(self.trial_datasets):
                     distance = len(self.trial_datasets) - len(self.test_reward_mean)
                     for i in range(distance):
                         self.test_reward_mean.append([])
                 self.test_reward_mean[j].append(combined_reward)
+            self.append_placements(placements)
             self.episode_reward_mean.append(result['episode_reward_mean'])
             combined_list = self.test_reward_mean.append(self.episode_reward_mean)
 
@@ -253,6 +289,35 @@ class HelperMethods:
                 json.dump(combined_list, file)
             del my_restored_policy
 
+        self.create_output_time_s = time.perf_counter() - start_time
+
+    def placement_records(self, iteration, dataset, action, data):
+        """
+        Creates the records of the placement chosen by a policy for one dataset, one record per pick-up station.
+        @param iteration: The training iteration of the evaluation.
+        @param dataset: The name of the dataset, train or test_dataset_<index>.
+        @param action: The cells chosen by the policy.
+        @param data: The merged data of the dataset.
+        @return: A list of dictionaries with the fields of placement_fieldnames.
+        """
+        records = []
+        for station, cell in enumerate(action):
+            coordinate = self.coordinate_list[cell]
+            records.append({'iteration': iteration, 'dataset': dataset, 'station': station, 'cell_id': int(cell),
+                            'latitude': coordinate[0], 'longitude': coordinate[1],
+                            'reward': self.reward(cell, data, self.dimensions)})
+        return records
+
+    def append_placements(self, placements):
+        """
+        Appends placement records to the placements file of the training run.
+        @param placements: The records as created by placement_records.
+        @return: No returns.
+        """
+        with open(self.placements_name, 'a', newline='') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=self.placement_fieldnames)
+            writer.writerows(placements)
+
     def run_policy(self, path_to_data, path_to_policy, i):
         """
         This method is able to run a saved policy. It also saves a map of the action chosen by the policy.
@@ -262,6 +327,7 @@ class HelperMethods:
         @return: A two-dimensional variable of the path to data and the trail_gps
         """
         trial_data = path_to_data
+        from ray.rllib.policy.policy import Policy
 
         try:
             my_restored_policy = Policy.from_checkpoint(path_to_policy)
@@ -319,6 +385,42 @@ class HelperMethods:
 
         return selected_indices
 
+    @staticmethod
+    def neighbour_sum(values, dimensions):
+        """
+        Vectorized counterpart of select_indices. Sums up the values of all cells around every cell, without the cell
+        itself, in the same neighbourhood as select_indices.
+        @param values: An array with one value per cell.
+        @param dimensions: A point, representing the dimensions of the dataset as returned by find_factors.
+        @return: An array with the sum of the values of the surrounding cells for every cell.
+        """
+        grid = np.asarray(values, dtype=float).reshape(dimensions[0], dimensions[1])
+        padded = np.pad(grid, 1)
+        box_sum = np.zeros_like(grid)
+        for row_shift in range(3):
+            for col_shift in range(3):
+                box_sum += padded[row_shift:row_shift + dimensions[0], col_shift:col_shift + dimensions[1]]
+        return (box_sum - grid).flatten()
+
+    @staticmethod
+    def cell_rewards(data, dimensions, column_weight, distance_weight):
+        """
+        Vectorized reward of the CompleteEnv for all cells at once. The reward of a cell is the weighted sum of its
+        features plus the weighted and distance weighted sum of the features of the surrounding cells. The first row
+        of the data is the cell_id and is not part of the reward.
+        @param data: The merged data as returned by create_data.
+        @param dimensions: A point, representing the dimensions of the dataset as returned by find_factors.
+        @param column_weight: The feature weights as returned by set_up_column_weights.
+        @param distance_weight: The distance weights as returned by set_up_distance_weights.
+        @return: An array with the reward of every cell.
+        """
+        features = np.asarray(data[1:], dtype=float)
+        column_weight = np.asarray(column_weight[1:len(data)], dtype=float)
+        distance_weight = np.asarray(distance_weight[1:len(data)], dtype=float)
+        own_reward = column_weight @ features
+        neighbour_reward = (column_weight * distance_weight) @ features
+        return own_reward + HelperMethods.neighbour_sum(neighbour_reward, dimensions)
+
     @staticmethod
     def create_coordinate_list(filename):
         """
@@ -366,6 +468,23 @@ class HelperMethods:
 
         return featureWeights
 
+    @staticmethod
+    def read_weight_file(file_path):
+        """
+        Reads a weight file in the format of featureWeights.txt and distanceWeights.txt.
+        @param file_path: The path of the weight file.
+        @return: The list of weights and the list of feature names, a note in brackets after a name is removed.
+        """
+        with open(file_path, 'r') as file:
+            lines = file.readlines()[1:]
+        weights = []
+        features = []
+        for line in lines:
+            weight, feature = line.strip().split(', ')
+            weights.append(float(weight))
+            features.append(feature.split('(')[0].strip())
+        return weights, features
+
     @staticmethod
     def set_up_column_weights():
         """
@@ -473,4 +592,3 @@ class HelperMethods:
             output_name = "maps/" + formatted_date_time + "map.html"
 
         m.save(output_name)
-        IFrame(src='Legacy/map.html', width=700, height=600)
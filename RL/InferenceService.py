@@ -0,0 +1,255 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from queue import Empty, Queue
+
+import numpy as np
+
+# own imports
+import Helper
+from NumpyPolicy import NumpyPolicy
+
+
+class MicroBatcher:
+    """This class collects the observations of concurrent requests and computes their actions in a single forward pass.
+    A batch is computed as soon as max_batch_size observations are waiting or the first waiting observation has waited
+    for max_wait_ms."""
+
+    def __init__(self, compute_actions, max_batch_size=32, max_wait_ms=5):
+        """
+        @param compute_actions: The function computing the actions of a batch of observations, e.g.
+        NumpyPolicy.compute_actions.
+        @param max_batch_size: The maximum number of observations of a batch.
+        @param max_wait_ms: The maximum time an observation waits for further observations of its batch.
+        """
+        self.compute_actions = compute_actions
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000
+        self.queue = Queue()
+        self.batch_sizes = []
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, observation):
+        """
+        Adds an observation to the next batch.
+        @param observation: The observation.
+        @return: A future of the action of the observation.
+        """
+        future = Future()
+        self.queue.put((observation, future))
+        return future
+
+    def run(self):
+        while self.running:
+            try:
+                batch = [self.queue.get(timeout=0.1)]
+            except Empty:
+                continue
+            deadline = time.perf_counter() + self.max_wait_s
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except Empty:
+                    break
+            self.batch_sizes.append(len(batch))
+            try:
+                actions = self.compute_actions(np.stack([observation for observation, _ in batch]))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), action in zip(batch, actions):
+                future.set_result(action)
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+
+
+class RLlibBatchPolicy:
+    """Computes the deterministic actions of a batch of observations with a restored RLlib policy, for checkpoints that
+    have not been exported with export_numpy_policy."""
+
+    def __init__(self, path_to_checkpoint):
+        from CheckpointTournament import restore_policy
+        self.policy = restore_policy(path_to_checkpoint)
+        self.observation_shape = tuple(self.policy.observation_space.shape)
+
+    def compute_actions(self, observations):
+        from CheckpointTournament import compute_deterministic_actions
+        return compute_deterministic_actions(self.policy, observations)
+
+
+class InferenceService:
+    """This class serves the placements of one policy to many local clients, e.g. the frontend and the route planning.
+    The policy is loaded once and the observations of concurrent requests are computed in micro-batches. The answers
+    are cached per hash of the observation, so repeated requests for the same dataset are answered from the cache.
+    Datasets are requested by their path, by their id, which is their file name in the dataSets directory without the
+    .csv ending, or directly by their observation, the traffic feature of the merged data."""
+
+    def __init__(self, path_to_policy, dataset_dir='dataSets', max_batch_size=32, max_wait_ms=5, cache_size=1024):
+        """
+        @param path_to_policy: The directory of a NumPy policy artifact or of an RLlib policy or algorithm checkpoint.
+        @param dataset_dir: The directory of the datasets that are requested by their id.
+        @param max_batch_size: The maximum number of requests computed in one forward pass.
+        @param max_wait_ms: The maximum time a request waits for further requests of its batch.
+        @param cache_size: The maximum number of cached placements.
+        """
+        if os.path.isfile(os.path.join(path_to_policy, NumpyPolicy.architecture_file)):
+            policy = NumpyPolicy.from_artifact(path_to_policy)
+            self.observation_shape = (policy.architecture["observation_size"],)
+        else:
+            policy = RLlibBatchPolicy(path_to_policy)
+            self.observation_shape = policy.observation_shape
+        self.batcher = MicroBatcher(policy.compute_actions, max_batch_size, max_wait_ms)
+        self.helper = Helper.HelperMethods(True)
+        self.dataset_dir = dataset_dir
+        self.cache_size = cache_size
+        self.placements = OrderedDict()
+        # The merged data of the requested datasets, keyed by path and modification time
+        self.datasets = {}
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "cache_hits": 0}
+
+    def load_observation(self, dataset=None, dataset_id=None):
+        if dataset is None:
+            dataset = os.path.join(self.dataset_dir, dataset_id + ".csv")
+        key = (dataset, os.path.getmtime(dataset))
+        with self.lock:
+            observation = self.datasets.get(key)
+        if observation is None:
+            observation = np.asarray(self.helper.create_data(dataset, True)[2], dtype=np.float64)
+            with self.lock:
+                self.datasets[key] = observation
+        return observation
+
+    @staticmethod
+    def dataset_hash(observation):
+        return hashlib.sha256(np.ascontiguousarray(observation, dtype=np.float64).tobytes()).hexdigest()
+
+    def placement(self, dataset=None, dataset_id=None, observation=None):
+        """
+        Computes the placement of a dataset, or returns it from the cache.
+        @param dataset: The path of the dataset.
+        @param dataset_id: The id of a dataset of the dataset directory.
+        @param observation: The observation of the dataset, the traffic feature of the merged data.
+        @return: A dictionary with the chosen cells, their coordinates, the dataset hash and whether the placement has
+        been cached.
+        """
+        if observation is None:
+            if dataset is None and dataset_id is None:
+                raise ValueError("A dataset, a dataset_id or an observation has to be given.")
+            observation = self.load_observation(dataset, dataset_id)
+        observation = np.asarray(observation, dtype=np.float64)
+        # The observations of a batch are stacked, an observation of another shape would fail the whole batch
+        if observation.shape != self.observation_shape:
+            raise ValueError("The observation has the shape " + str(observation.shape) + ", but the policy expects "
+                             "the shape " + str(self.observation_shape) + ".")
+        dataset_hash = self.dataset_hash(observation)
+
+        with self.lock:
+            self.stats["requests"] += 1
+            cells = self.placements.get(dataset_hash)
+            if cells is not None:
+                self.stats["cache_hits"] += 1
+                self.placements.move_to_end(dataset_hash)
+        cached = cells is not None
+        if not cached:
+            cells = [int(cell) for cell in self.batcher.submit(observation).result()]
+            with self.lock:
+                self.placements[dataset_hash] = cells
+                if len(self.placements) > self.cache_size:
+                    self.placements.popitem(last=False)
+
+        return {"cells": cells,
+                "coordinates": [list(self.helper.coordinate_list[cell]) for cell in cells],
+                "dataset_hash": dataset_hash,
+                "cached": cached}
+
+    def serve(self, host="127.0.0.1", port=8765):
+        """
+        Serves the placements over http on localhost until it is interrupted. POST /placement accepts a json body with
+        one of the keys dataset, dataset_id or observation, GET /stats returns the number of requests, cache hits and
+        the mean batch size.
+        @param host: The host, only local clients are served by default.
+        @param port: The port, 0 chooses a free port.
+        @return: No returns.
+        """
+        server = self.create_server(host, port)
+        print("The inference service is listening on http://" + host + ":" + str(server.server_address[1]))
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            self.batcher.stop()
+
+    def create_server(self, host="127.0.0.1", port=8765):
+        service = self
+
+        class PlacementHandler(BaseHTTPRequestHandler):
+            def send_json(self, status, body):
+                content = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def do_GET(self):
+                if self.path != "/stats":
+                    self.send_json(404, {"error": "Unknown path " + self.path})
+                    return
+                batch_sizes = service.batcher.batch_sizes
+                self.send_json(200, {**service.stats, "batches": len(batch_sizes),
+                                     "mean_batch_size": float(np.mean(batch_sizes)) if batch_sizes else 0.0})
+
+            def do_POST(self):
+                if self.path != "/placement":
+                    self.send_json(404, {"error": "Unknown path " + self.path})
+                    return
+                try:
+                    request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                    if not isinstance(request, dict):
+                        raise ValueError("The body has to be a json object.")
+                    self.send_json(200, service.placement(request.get("dataset"), request.get("dataset_id"),
+                                                          request.get("observation")))
+                except (ValueError, TypeError, KeyError, OSError) as e:
+                    self.send_json(400, {"error": str(e)})
+
+            def log_message(self, format, *args):
+                # The requests are not logged to keep the latency low
+                pass
+
+        return ThreadingHTTPServer((host, port), PlacementHandler)
+
+
+def request_placement(dataset=None, dataset_id=None, observation=None, url="http://127.0.0.1:8765"):
+    """
+    Requests a placement from a running inference service.
+    @param dataset: The path of the dataset, relative to the working directory of the service.
+    @param dataset_id: The id of a dataset of the dataset directory of the service.
+    @param observation: The observation of the dataset.
+    @param url: The url of the service.
+    @return: The placement as returned by InferenceService.placement.
+    """
+    body = {"dataset": dataset, "dataset_id": dataset_id,
+            "observation": None if observation is None else [float(value) for value in observation]}
+    request = urllib.request.Request(url + "/placement", data=json.dumps(body).encode(),
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+if __name__ == '__main__':
+    InferenceService(input("Please enter the path to the policy.")).serve()
@@ -1,13 +1,29 @@
-import ray
 from ray.rllib.algorithms.ppo import PPO
+from ray.rllib.policy.policy import Policy
+from ray.rllib.policy.sample_batch import DEFAULT_POLICY_ID
 import os
 
 # own imports
 import Helper
+from Cluster import RayCluster
 from Configs.ConfigFactory import ConfigFactory
+from Configs.PresetTuner import PresetTuner
 # from Envs.CompleteEnv import CompleteEnv
 
-def main_ppo(rl_env, dataset='dataSets/train_dataset_0.csv'):
+def main_ppo(rl_env, dataset='dataSets/train_dataset_0.csv', preset=None, address=None, learner_node=None,
+             warm_start_policy=None, warm_start=False):
+    """
+    Trains PPO on the given dataset, locally or on a ray cluster.
+    @param rl_env: The environment class, e.g. CompleteEnv.
+    @param dataset: The relative path of the training dataset.
+    @param preset: The performance preset of the ConfigFactory, "auto" selects the fastest preset on this machine.
+    @param address: The address of the ray head to train on a cluster, None starts a local ray instance.
+    @param learner_node: The ip address of the node the learner is placed on in cluster mode.
+    @param warm_start_policy: The path of a policy checkpoint whose weights the training starts from.
+    @param warm_start: Pre-trains the policy by behaviour cloning with the resolved preset before the training, see
+    BCWarmStart.bc_warm_start.
+    @return: No returns.
+    """
     # Suppress the TensorFlow warning
     os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
     os.environ["CUDA_VISIBLE_DEVICES"] = ""
@@ -17,24 +33,49 @@ def main_ppo(rl_env, dataset='dataSets/train_dataset_0.csv'):
     data_length = len(data[0])
     dimensions = helper.find_factors(data_length)
 
-    ray.init()
-    config = ConfigFactory(rl_env, data).get_standard_ppo_config()
-
-    config = config.training(
-        gamma=0.95,
-        lr=0.0001,
-        clip_param=0.2,
-        lambda_=0.95,
-        num_sgd_iter=20,
-        sgd_minibatch_size=1024,
-        train_batch_size=5000,
-        vf_clip_param=5
-    )
-
-    config = config.resources(
-        num_cpus_per_worker=4
-    )
+    # Without an address a local ray instance is started, otherwise the training runs on the given ray cluster
+    cluster = RayCluster(address, learner_node).connect()
+    # The preset "auto" selects the performance preset with the highest throughput on this machine
+    if preset == "auto":
+        preset = PresetTuner(rl_env, data).select_preset()
+        print("Using the performance preset: " + preset)
+
+    # The behaviour cloning runs on the ray instance of the training and with the same preset, so the framework and
+    # the network of the cloned policy match the ones of the training
+    if warm_start and warm_start_policy is None:
+        from BCWarmStart import bc_warm_start
+        warm_start_policy = bc_warm_start(rl_env, dataset=dataset, preset=preset)
+    # The weights are read on the driver, as the learner in cluster mode may run on a node without the checkpoint.
+    # They are passed to the learner through the object store
+    warm_start_weights = None
+    if warm_start_policy is not None:
+        warm_start_weights = Policy.from_checkpoint(warm_start_policy).get_weights()
+
+    # The path of the dataset is kept in the env_config, so the environments of an algorithm restored from a checkpoint
+    # can load the data when the object store reference of the cluster mode is gone
+    env_config = {"dataset": dataset}
+    if address is None:
+        config = ConfigFactory(rl_env, data).get_training_ppo_config(preset=preset, env_config=env_config)
+        train_ppo(config, helper, data, warm_start_weights)
+    else:
+        # The dataset is shared once per node through the object store and the training loop runs on the learner
+        # node, while the rollout workers are spread over the cluster
+        config = ConfigFactory(rl_env, cluster.share_data(data)).get_training_ppo_config(preset=preset,
+                                                                                         env_config=env_config)
+        cluster.run_on_learner(train_ppo, config, helper, data, warm_start_weights,
+                               num_workers=config.num_rollout_workers, cpus_per_worker=config.num_cpus_per_worker,
+                               learner_cpus=config.num_cpus_for_local_worker)
+
+
+def train_ppo(config, helper, data, warm_start_weights=None):
     trainer = PPO(config=config)
+    # Start from the weights of a pre-trained policy, e.g. the one exported by BCWarmStart.bc_warm_start
+    if warm_start_weights is not None:
+        trainer.get_policy().set_weights(warm_start_weights)
+        # With the learner api the learners update their own copy of the module, which is synced to the workers
+        if config._enable_learner_api:
+            trainer.learner_group.set_weights({DEFAULT_POLICY_ID: warm_start_weights})
+        trainer.workers.sync_weights()
 
     i = 0
     helper.initialize_output(data)
@@ -42,6 +83,7 @@ def main_ppo(rl_env, dataset='dataSets/train_dataset_0.csv'):
     while True:
         result = trainer.train()
         print("Iteration: " + str(i))
+        print("Sampled env steps per second: " + str(result["custom_metrics"].get("env_steps_sampled_per_s")))
         i = i + 1
         if i % 30 == 0:
             helper.create_output(result, trainer)
@@ -55,5 +97,3 @@ def main_ppo(rl_env, dataset='dataSets/train_dataset_0.csv'):
 if __name__ == '__main__':
     from Envs.CompleteEnv import CompleteEnv
     main_ppo(rl_env=CompleteEnv)
-
-    
\ No newline at end of file
@@ -0,0 +1,191 @@
+import json
+import os
+import re
+
+import numpy as np
+
+
+class NumpyPolicy:
+    """This class computes the deterministic actions of a trained PPO policy with NumPy only. It is loaded from an
+    artifact exported by export_numpy_policy, which consists of the weights of the policy network as weights.npz and a
+    description of the network as architecture.json. Neither ray nor TensorFlow or torch are imported, so a placement
+    is computed within milliseconds, e.g. inside the frontend or a CLI call.
+    Only fully connected networks, as built by RLlib for the configurations of the ConfigFactory, are supported. The
+    value branch is not exported as it is not needed to compute actions."""
+
+    weights_file = "weights.npz"
+    architecture_file = "architecture.json"
+
+    activations = {
+        "tanh": np.tanh,
+        "relu": lambda x: np.maximum(x, 0),
+        "elu": lambda x: np.where(x > 0, x, np.expm1(np.minimum(x, 0))),
+        "swish": lambda x: x / (1 + np.exp(-x)),
+        "silu": lambda x: x / (1 + np.exp(-x)),
+        "linear": lambda x: x,
+        None: lambda x: x
+    }
+
+    def __init__(self, kernels, biases, architecture):
+        """
+        @param kernels: The kernels of the dense layers with the shape (inputs, outputs), the last one is the logits
+        layer.
+        @param biases: The biases of the dense layers.
+        @param architecture: The description of the network as written into architecture.json.
+        """
+        for activation in architecture["activations"]:
+            if activation not in self.activations:
+                raise ValueError("The activation " + str(activation) + " is not supported.")
+        self.kernels = kernels
+        self.biases = biases
+        self.architecture = architecture
+        self.layer_activations = [self.activations[activation] for activation in architecture["activations"]]
+        # The logits of the sub-actions of a Tuple action space are concatenated in the output of the network
+        self.splits = np.cumsum(architecture["action_sizes"])[:-1]
+
+    @classmethod
+    def from_artifact(cls, path_to_artifact):
+        """
+        Loads a policy artifact exported by export_numpy_policy.
+        @param path_to_artifact: The directory of the artifact.
+        @return: The NumpyPolicy.
+        """
+        with open(os.path.join(path_to_artifact, cls.architecture_file), "r") as file:
+            architecture = json.load(file)
+        with np.load(os.path.join(path_to_artifact, cls.weights_file)) as weights:
+            kernels = [weights["kernel_" + str(i)] for i in range(architecture["num_layers"])]
+            biases = [weights["bias_" + str(i)] for i in range(architecture["num_layers"])]
+        return cls(kernels, biases, architecture)
+
+    def compute_logits(self, observations):
+        """
+        The forward pass of the policy network.
+        @param observations: The observations as an array of shape (batch, observation_size).
+        @return: The logits as an array of shape (batch, sum of action_sizes).
+        """
+        x = np.asarray(observations, dtype=np.float32)
+        for kernel, bias, activation in zip(self.kernels, self.biases, self.layer_activations):
+            x = activation(x @ kernel + bias)
+        return x
+
+    def compute_actions(self, observations):
+        """
+        Computes the deterministic actions of a batch of observations, the mode of the action distribution.
+        @param observations: The observations as an array of shape (batch, observation_size).
+        @return: The actions as an integer array of shape (batch, number of sub-actions).
+        """
+        logits = self.compute_logits(observations)
+        return np.stack([np.argmax(part, axis=1) for part in np.split(logits, self.splits, axis=1)], axis=1)
+
+    def compute_single_action(self, observation):
+        """
+        Computes the deterministic action of a single observation like Policy.compute_single_action(explore=False).
+        @param observation: The observation, e.g. the traffic feature of a dataset as used by create_output.
+        @return: The chosen cells as a tuple for a Tuple action space, otherwise the chosen cell.
+        """
+        action = self.compute_actions(np.asarray(observation)[np.newaxis])[0]
+        if self.architecture["tuple_action"]:
+            return tuple(int(a) for a in action)
+        return int(action[0])
+
+
+def module_layers(module, framework):
+    """
+    Collects the kernels and biases of the dense layers of a part of an RLModule in the order of the layers.
+    @param module: The part of the RLModule, e.g. its actor encoder or its pi head.
+    @param framework: The framework of the policy.
+    @return: The kernels with the shape (inputs, outputs) and the biases.
+    """
+    if framework == "torch":
+        # torch stores the kernels as (outputs, inputs)
+        parameters = [parameter.detach().cpu().numpy() for parameter in module.parameters()]
+        return [kernel.T for kernel in parameters[0::2]], parameters[1::2]
+    parameters = [variable.numpy() for variable in module.trainable_variables]
+    return parameters[0::2], parameters[1::2]
+
+
+def extract_layers(policy):
+    """
+    Extracts the dense layers of the policy network of a PPO policy, either built as an RLModule or as the fully
+    connected ModelV2 network of RLlib.
+    @param policy: The RLlib policy, e.g. restored with Policy.from_checkpoint.
+    @return: The kernels with the shape (inputs, outputs), the biases and the activations of the layers, the last
+    layer is the logits layer.
+    """
+    model_config = policy.config["model"]
+    activation = model_config.get("fcnet_activation", "tanh")
+
+    if hasattr(policy.model, "pi"):
+        # The encoder of the RLModule applies the activation to all of its layers, followed by the pi head
+        encoder = policy.model.encoder
+        encoder = encoder.encoder if hasattr(encoder, "encoder") else encoder.actor_encoder
+        encoder_kernels, encoder_biases = module_layers(encoder, policy.framework)
+        head_kernels, head_biases = module_layers(policy.model.pi, policy.framework)
+        activations = [activation] * len(encoder_kernels) + \
+                      [model_config.get("post_fcnet_activation", "relu")] * (len(head_kernels) - 1) + ["linear"]
+        return encoder_kernels + head_kernels, encoder_biases + head_biases, activations
+
+    if policy.framework == "torch":
+        state = {name: value.detach().cpu().numpy() for name, value in policy.model.state_dict().items()}
+        hidden = sorted((int(match.group(1)) for match in
+                         (re.fullmatch(r"_hidden_layers\.(\d+)\._model\.0\.weight", name) for name in state) if match))
+        names = ["_hidden_layers." + str(i) + "._model.0" for i in hidden] + ["_logits._model.0"]
+        kernels = [state[name + ".weight"].T for name in names]
+        biases = [state[name + ".bias"] for name in names]
+    else:
+        state = {variable.name.split(":")[0]: variable.numpy() for variable in policy.model.variables()}
+        hidden = sorted((int(match.group(1)) for match in
+                         (re.fullmatch(r"fc_(\d+)/kernel", name) for name in state) if match))
+        names = ["fc_" + str(i) for i in hidden] + ["fc_out"]
+        kernels = [state[name + "/kernel"] for name in names]
+        biases = [state[name + "/bias"] for name in names]
+    return kernels, biases, [activation] * len(hidden) + ["linear"]
+
+
+def export_numpy_policy(path_to_checkpoint, output_name=None):
+    """
+    Exports a policy or algorithm checkpoint as a NumPy policy artifact.
+    @param path_to_checkpoint: The path of the policy or algorithm checkpoint.
+    @param output_name: The directory of the artifact, by default the checkpoint path with the suffix _numpy.
+    @return: The directory of the artifact.
+    """
+    import gymnasium as gym
+    from CheckpointTournament import restore_policy
+
+    policy = restore_policy(path_to_checkpoint)
+    model_config = policy.config["model"]
+    if model_config.get("use_lstm") or model_config.get("use_attention") or model_config.get("custom_model"):
+        raise ValueError("Only the fully connected network can be exported as a NumPy policy.")
+    if policy.config.get("observation_filter", "NoFilter") != "NoFilter":
+        raise ValueError("Observation filters are not supported by the NumPy policy.")
+
+    if isinstance(policy.action_space, gym.spaces.Tuple):
+        action_sizes = [int(space.n) for space in policy.action_space]
+    else:
+        action_sizes = [int(policy.action_space.n)]
+    kernels, biases, activations = extract_layers(policy)
+
+    architecture = {
+        "activations": activations,
+        "num_layers": len(kernels),
+        "layer_sizes": [int(kernel.shape[1]) for kernel in kernels],
+        "observation_size": int(kernels[0].shape[0]),
+        "action_sizes": action_sizes,
+        "tuple_action": isinstance(policy.action_space, gym.spaces.Tuple),
+        "framework": policy.framework
+    }
+
+    if output_name is None:
+        output_name = os.path.normpath(path_to_checkpoint) + "_numpy"
+    os.makedirs(output_name, exist_ok=True)
+    np.savez(os.path.join(output_name, NumpyPolicy.weights_file),
+             **{"kernel_" + str(i): np.asarray(kernel, dtype=np.float32) for i, kernel in enumerate(kernels)},
+             **{"bias_" + str(i): np.asarray(bias, dtype=np.float32) for i, bias in enumerate(biases)})
+    with open(os.path.join(output_name, NumpyPolicy.architecture_file), "w") as file:
+        json.dump(architecture, file, indent=4)
+    print("The NumPy policy has been exported to: " + output_name)
+    return output_name
+
+
+if __name__ == '__main__':
+    export_numpy_policy(input("Please enter the path to the checkpoint of the policy."))
@@ -1,14 +1,60 @@
+import os
 import random
+import tempfile
 
-import ray
 from ray import air, tune
+from ray.rllib.algorithms.ppo import PPO
 from ray.tune.schedulers import PopulationBasedTraining
 
+from Cluster import RayCluster
 from Envs.CompleteEnv import CompleteEnv
 import Helper
 
 
-def perform_pbt(dataset='dataSets/test_dataset_8.csv'):
+# Postprocess the perturbed config to ensure it's still valid
+def explore(config):
+    # ensure we collect enough timesteps to do sgd
+    if config["train_batch_size"] < config["sgd_minibatch_size"] * 2:
+        config["train_batch_size"] = config["sgd_minibatch_size"] * 2
+    # ensure we run at least one sgd iter
+    if config["num_sgd_iter"] < 1:
+        config["num_sgd_iter"] = 1
+    return config
+
+
+def get_fast_local_dir():
+    # Directory on fast local disk for the trial checkpoints used by the exploit steps. /dev/shm is kept in memory
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm/ray_results"
+    return os.path.join(tempfile.gettempdir(), "ray_results")
+
+
+def perform_pbt(dataset='dataSets/test_dataset_8.csv', address=None, learner_node=None, cpu_only=False,
+                cpus_per_trial=None, num_samples=None, perturbation_interval=None, local_dir=None,
+                fast_local_dir=False):
+    """
+    Performs population based training of PPO on the given dataset.
+    In the cpu only mode no gpus are requested. The trials are sized from the cpus of the nodes, packed onto single
+    nodes and perturbed more often. On a cluster they are packed onto its nodes as well, so no learner node can be
+    chosen.
+    @param dataset: The relative path of the dataset that is trained on.
+    @param address: The address of the ray head to run the trials on a cluster, None starts a local ray instance.
+    @param learner_node: The ip address of the node the learners are placed on in cluster mode.
+    @param cpu_only: Enables the cpu only mode.
+    @param cpus_per_trial: The number of cpus of every trial in the cpu only mode, calculated if not given.
+    @param num_samples: The number of trials, 4 by default and calculated from the cpus in the cpu only mode.
+    @param perturbation_interval: The seconds of training between two perturbations, 120 by default and 30 in the cpu
+    only mode.
+    @param local_dir: The directory of the results and checkpoints, ./ray_results2 by default.
+    @param fast_local_dir: Keeps the results and checkpoints on fast local disk, /dev/shm if available, which speeds up
+    the exploit steps. They are lost on a restart of the machine.
+    @return: No returns.
+    """
+    if cpu_only and learner_node is not None:
+        raise ValueError("The cpu only mode packs every trial onto a single node and cannot place the learners on the "
+                         "learner node " + learner_node + ".")
+    if local_dir is not None and fast_local_dir:
+        raise ValueError("Either local_dir or fast_local_dir can be given.")
 
     helper = Helper.HelperMethods()
     # data, distance_weight, column_weight = helper.createData(True)
@@ -16,10 +62,45 @@ def perform_pbt(dataset='dataSets/test_dataset_8.csv'):
     data_length = len(data[0])
     dimensions = helper.find_factors(data_length)
 
+    # Without an address a local ray instance is started, otherwise the trials run on the given ray cluster
+    cluster = RayCluster(address, learner_node).connect()
+
+    # The dataset is shared once per node through the object store, instead of being serialized into every trial.
+    # The path of the dataset is kept as well, so the environments of an algorithm restored from a checkpoint can load
+    # the data when the reference is gone
     env_config = {
-        "data": data
+        "data": cluster.share_data(data),
+        "dataset": dataset
     }
 
+    resources = {
+        "num_workers": 4,
+        "num_cpus_per_worker": 4,
+        "num_cpus": 1,  # number of CPUs to use per trial
+        "num_gpus": 1,  # number of GPUs to use per trial
+    }
+    trainable = "PPO"
+    if cpu_only:
+        trial_resources = cluster.get_packed_trial_resources(cpus_per_trial, num_samples)
+        num_samples = trial_resources["num_samples"]
+        resources = {
+            "num_workers": trial_resources["num_workers"],
+            "num_cpus_per_worker": trial_resources["num_cpus_per_worker"],
+            "num_cpus_for_driver": 1,
+            "num_gpus": 0,
+        }
+        perturbation_interval = perturbation_interval or 30
+        print("Running " + str(num_samples) + " cpu only trials with " + str(trial_resources["cpus_per_trial"]) +
+              " cpus each.")
+    elif address is not None:
+        # The rollout workers of every trial are spread over the nodes while its learner is kept on the learner node
+        trainable = tune.with_resources(PPO, cluster.get_placement_group_factory(
+            num_workers=resources["num_workers"], cpus_per_worker=resources["num_cpus_per_worker"], learner_cpus=1,
+            learner_gpus=1))
+
+    if fast_local_dir:
+        local_dir = get_fast_local_dir()
+
     if True:#__name__ == "__main__":
         print("started pbt")
         # import argparse
@@ -30,16 +111,6 @@ def perform_pbt(dataset='dataSets/test_dataset_8.csv'):
         # )
         # args, _ = parser.parse_known_args()
 
-        # Postprocess the perturbed config to ensure it's still valid
-        def explore(config):
-            # ensure we collect enough timesteps to do sgd
-            if config["train_batch_size"] < config["sgd_minibatch_size"] * 2:
-                config["train_batch_size"] = config["sgd_minibatch_size"] * 2
-            # ensure we run at least one sgd iter
-            if config["num_sgd_iter"] < 1:
-                config["num_sgd_iter"] = 1
-            return config
-
         hyperparam_mutations = {
             "lambda": lambda: random.uniform(0.9, 1.0),
             "clip_param": lambda: random.uniform(0.01, 0.5),
@@ -51,11 +122,11 @@ def perform_pbt(dataset='dataSets/test_dataset_8.csv'):
 
         pbt = PopulationBasedTraining(
             time_attr="time_total_s",
-            perturbation_interval=120,
+            perturbation_interval=perturbation_interval or 120,
             resample_probability=0.25,
             # Specifies the mutations of these hyperparams
             hyperparam_mutations=hyperparam_mutations,
-            # custom_explore_fn=explore,
+            custom_explore_fn=explore,
         )
 
         # Stop when we've either reached 100 training iterations or reward=300
@@ -63,24 +134,21 @@ def perform_pbt(dataset='dataSets/test_dataset_8.csv'):
         stopping_criteria = {"training_iteration": 100, "episode_reward_mean": 200000}
 
         tuner = tune.Tuner(
-            "PPO",
+            trainable,
             # "DQN",
             tune_config=tune.TuneConfig(
                 metric="episode_reward_mean",
                 mode="max",
                 scheduler=pbt,
-                num_samples=4  # 1 if args.smoke_test else 4,
+                num_samples=num_samples or 4  # 1 if args.smoke_test else 4,
             ),
             param_space={
                 "env": CompleteEnv,
                 "env_config": env_config,
                 "kl_coeff": 1.0,
-                "num_workers": 4,
-                "num_cpus_per_worker": 4,
+                **resources,
                 'framework': 'tf2',
                 'log_level': 'INFO',
-                "num_cpus": 1,  # number of CPUs to use per trial
-                "num_gpus": 1,  # number of GPUs to use per trial
                 "model": {"free_log_std": True},
                 # These params are tuned from a fixed starting value.
                 "lambda": 0.95,
@@ -91,7 +159,10 @@ def perform_pbt(dataset='dataSets/test_dataset_8.csv'):
                 "sgd_minibatch_size": tune.choice([128, 512, 2048]),
                 "train_batch_size": tune.choice([10000, 20000, 40000]),
             },
-            run_config=air.RunConfig(stop=stopping_criteria, local_dir="./ray_results2", name="test_experiment1"),
+            run_config=air.RunConfig(stop=stopping_criteria, local_dir=local_dir or "./ray_results2",
+                                     name="test_experiment1",
+                                     # Only the latest checkpoints are needed for the exploit steps
+                                     checkpoint_config=air.CheckpointConfig(num_to_keep=2 if cpu_only else None)),
         )
         results = tuner.fit()
         import pprint
@@ -112,6 +183,7 @@ def perform_pbt(dataset='dataSets/test_dataset_8.csv'):
             "episode_len_mean",
         ]
         pprint.pprint({k: v for k, v in best_result.metrics.items() if k in metrics_to_print})
+        print("\nThe results and checkpoints have been written to: " + results.experiment_path)
 
 
 if __name__ == '__main__':
@@ -1,5 +1,4 @@
 import ray
-from ray.rllib.algorithms.ppo import PPO
 import os
 from ray.rllib.algorithms.algorithm import Algorithm
 from ray.rllib.policy.policy import Policy
@@ -7,56 +6,150 @@ from ray.rllib.policy.policy import Policy
 
 # own imports
 import Helper
-from Configs.ConfigFactory import ConfigFactory
-from Envs.CompleteEnv import CompleteEnv
+
+
+def swap_env_data(algorithm, data):
+    """
+    Swaps the data of all environments of a restored algorithm, so its rollout workers continue on a new dataset
+    without being rebuilt.
+    @param algorithm: The restored algorithm.
+    @param data: The merged data of the new dataset, it has to have the same number of cells as the old one.
+    @return: No returns.
+    """
+    # The data is put into the object store once instead of being sent to every rollout worker
+    data_ref = ray.put(data)
+    algorithm.workers.foreach_worker(lambda worker: worker.foreach_env(lambda env: env.set_data(data_ref)))
+    if algorithm.evaluation_workers is not None:
+        algorithm.evaluation_workers.foreach_worker(
+            lambda worker: worker.foreach_env(lambda env: env.set_data(data_ref)))
+
+
+def reset_optimizers(algorithm, reset_state=True, lr=None):
+    """
+    Resets the optimizers of a restored algorithm and optionally replaces its learning rate schedule by a constant
+    learning rate. Both the learner api, which is the default of PPO, and the policy optimizers are supported.
+    @param algorithm: The restored algorithm.
+    @param reset_state: Resets the moments and step counters of the optimizers.
+    @param lr: The constant learning rate of the fine-tuning, None keeps the learning rate schedule.
+    @return: No returns.
+    """
+    def reset_optimizer(optimizer):
+        if hasattr(optimizer, "state"):
+            # torch creates the moments of Adam again on the next step
+            optimizer.state.clear()
+        else:
+            variables = optimizer.variables() if callable(optimizer.variables) else optimizer.variables
+            for variable in variables:
+                variable.assign(variable * 0)
+
+    def reset_learner(learner):
+        # The learner api has no public way to reset its optimizers, its private attributes of ray 2.6 are used
+        for attribute in ["_named_optimizers", "_optimizer_lr_schedules", "_set_optimizer_lr"]:
+            if not hasattr(learner, attribute):
+                raise RuntimeError("The optimizers of the learner cannot be reset with ray " + ray.__version__ +
+                                   ", as the learner has no attribute " + attribute + ". Disable the learner api or "
+                                   "fine-tune without reset_optimizer and lr.")
+        for optimizer in learner._named_optimizers.values():
+            if reset_state:
+                reset_optimizer(optimizer)
+            if lr is not None:
+                # Without a schedule the learner keeps the constant learning rate
+                learner._optimizer_lr_schedules.pop(optimizer, None)
+                learner._set_optimizer_lr(optimizer, lr)
+
+    if algorithm.config._enable_learner_api:
+        learner_group = algorithm.learner_group
+        if learner_group.is_local:
+            reset_learner(learner_group._learner)
+        else:
+            learner_group._worker_manager.foreach_actor(reset_learner)
+        return
+
+    policy = algorithm.get_policy()
+    optimizers = getattr(policy, "_optimizers", None) or [policy._optimizer]
+    for optimizer in optimizers:
+        if reset_state:
+            reset_optimizer(optimizer)
+        if lr is not None:
+            policy._lr_schedule = None
+            if policy.framework == "torch":
+                policy.cur_lr = lr
+                for param_group in optimizer.param_groups:
+                    param_group["lr"] = lr
+            else:
+                policy.cur_lr.assign(lr)
+
+
+def fine_tune(path_to_checkpoint, data, reset_optimizer=False, lr=None, max_iterations=50, patience=3,
+              min_improvement=0.01):
+    """
+    Restores an algorithm checkpoint and continues its training on a new dataset. The training stops as soon as the
+    mean episode reward has not improved by more than min_improvement for patience iterations, so small day to day
+    changes of the data only cost a few iterations instead of a complete training.
+    @param path_to_checkpoint: The path of the algorithm checkpoint, as created by trainer.save().
+    @param data: The merged data of the new dataset.
+    @param reset_optimizer: Resets the state of the optimizers before the fine-tuning.
+    @param lr: The constant learning rate of the fine-tuning, None keeps the learning rate schedule of the checkpoint.
+    @param max_iterations: The maximum number of training iterations.
+    @param patience: The number of iterations without improvement after which the fine-tuning stops.
+    @param min_improvement: The relative improvement of the mean episode reward that counts as improvement.
+    @return: The path of the checkpoint of the fine-tuned algorithm.
+    """
+    algorithm = Algorithm.from_checkpoint(path_to_checkpoint)
+    swap_env_data(algorithm, data)
+    if reset_optimizer or lr is not None:
+        reset_optimizers(algorithm, reset_state=reset_optimizer, lr=lr)
+
+    best_reward = None
+    iterations_without_improvement = 0
+    for i in range(max_iterations):
+        result = algorithm.train()
+        reward = result["episode_reward_mean"]
+        print("Fine-tuning iteration: " + str(i) + ", mean episode reward: " + str(reward))
+        if best_reward is None or reward > best_reward + abs(best_reward) * min_improvement:
+            best_reward = reward
+            iterations_without_improvement = 0
+        else:
+            iterations_without_improvement += 1
+            if iterations_without_improvement >= patience:
+                print("The mean episode reward has converged after " + str(i + 1) + " iterations.")
+                break
+
+    path_to_checkpoint = algorithm.save()
+    algorithm.stop()
+    print(f"An Algorithm checkpoint has been created inside directory: '{path_to_checkpoint}'.")
+    return path_to_checkpoint
+
 
 def rl_checkpoint_loader(dataset='dataSets/train_dataset_0.csv'):
     # Suppress the TensorFlow warning
     os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
     os.environ["CUDA_VISIBLE_DEVICES"] = ""
 
-    helper = Helper.HelperMethods()
-
-    gamma = 0.95
-    lr = 0.0001
-
     helper = Helper.HelperMethods()
     data = helper.create_data(dataset, True)
     ray.init()
-    config = ConfigFactory(CompleteEnv, data).get_standard_ppo_config()
-
-    config = config.training(
-        gamma=gamma,
-        lr=0.0001,
-        clip_param=0.2,
-        lambda_=0.95,
-        num_sgd_iter=20,
-        sgd_minibatch_size=1024,
-        train_batch_size=5000,
-        vf_clip_param=5
-    )
-
-    config = config.resources(
-        num_cpus_per_worker=4
-    )
-    trainer = PPO(config=config)
 
     #Restoring the algorithm from here.
     while(True):
         path_to_checkpoint = input("Please enter the path to checkpoint of the algorithm.")
-        user_input = input("Please enter 1 to restore a algorithm and continue training or enter 2 to restore a policy and compute a single action.")
-        if(user_input==1):
+        user_input = input("Please enter 1 to restore a algorithm and continue training, enter 2 to restore a policy and compute a single action or enter 3 to fine-tune a algorithm on the dataset.")
+        if(user_input=="1"):
             my_new_ppo = Algorithm.from_checkpoint(path_to_checkpoint)
             my_new_ppo.train()
             #Further actions after training to be entered here...
             break
-        elif(user_input==2):
+        elif(user_input=="2"):
             my_restored_policy = Policy.from_checkpoint(path_to_checkpoint)
             datasetPath = input("Please enter the path to the dataset for that the policy is to be performed.")
-            data = helper.createData(datasetPath)
+            data = helper.create_data(datasetPath)
             action = my_restored_policy.compute_single_action(data[2])
             print(f"Computed action {action} from given dataset.")
             break
+        elif(user_input=="3"):
+            reset_optimizer = input("Please enter y to reset the optimizer before the fine-tuning.") == "y"
+            fine_tune(path_to_checkpoint, data, reset_optimizer=reset_optimizer)
+            break
         else:
             print("The wrong input has been entered, please try again.")
 
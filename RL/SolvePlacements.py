@@ -0,0 +1,99 @@
+import datetime
+import os
+import time
+
+# own imports
+import Helper
+from Solvers.AnnealingSolver import AnnealingSolver
+from Solvers.BranchAndBoundSolver import BranchAndBoundSolver
+from Solvers.HeuristicSolver import HeuristicSolver
+from Solvers.LazyGreedySolver import LazyGreedySolver
+from Solvers.PlacementObjective import PlacementObjective
+
+
+def get_solver(solver, dimensions, column_weight, distance_weight):
+    """
+    Creates a placement solver by its name.
+    @param solver: The name of the solver, greedy, heuristic, exact or anneal.
+    @param dimensions: A point, representing the dimensions of the dataset as returned by find_factors.
+    @param column_weight: The feature weights as returned by set_up_column_weights.
+    @param distance_weight: The distance weights as returned by set_up_distance_weights.
+    @return: The solver.
+    """
+    solvers = {"greedy": LazyGreedySolver, "heuristic": HeuristicSolver, "exact": BranchAndBoundSolver,
+               "anneal": AnnealingSolver}
+    if solver not in solvers:
+        raise ValueError("Unknown solver '" + str(solver) + "'. Available solvers are: " + ", ".join(solvers))
+    return solvers[solver](dimensions, column_weight, distance_weight)
+
+
+def solve_placements(datasets, solver="greedy", num_pickup=5, column_weight=None, weight_file=None,
+                     output_name=None):
+    """
+    Computes the placements of the given datasets without reinforcement learning and writes them in the format of the
+    frontend datasets.
+    @param datasets: The relative paths of the datasets.
+    @param solver: The name of the solver, see get_solver.
+    @param num_pickup: The number of pick-up stations of every placement.
+    @param column_weight: The feature weights, by default the ones of featureWeights.txt.
+    @param weight_file: The path of a weight file in the format of featureWeights.txt, used if no feature weights are
+    given.
+    @param output_name: The path of the frontend csv, by default a dated file in rlOutput.
+    @return: A dictionary of dataset names to a dictionary with the cells, the coordinates, the overlap-aware reward
+    and the reward in the CompleteEnv of their placement.
+    """
+    helper = Helper.HelperMethods(True)
+    if column_weight is None:
+        column_weight = helper.read_weight_file(weight_file)[0] if weight_file else helper.set_up_column_weights()
+    distance_weight = helper.set_up_distance_weights()
+
+    placements = {}
+    for dataset in datasets:
+        data = helper.create_data(dataset, True)
+        start_time = time.perf_counter()
+        dimensions = helper.find_factors(len(data[0]))
+        cells = get_solver(solver, dimensions, column_weight, distance_weight).solve(data, num_pickup)
+        solve_time = time.perf_counter() - start_time
+        objective = PlacementObjective(data, dimensions, column_weight, distance_weight)
+        placements[os.path.basename(dataset)] = {
+            "cells": cells,
+            "coordinates": [coordinate for cell in cells for coordinate in helper.action_to_coord(cell)],
+            "reward": objective.value(cells),
+            "env_reward": objective.env_reward(cells)
+        }
+        print(os.path.basename(dataset) + ": reward " + str(round(objective.value(cells), 2)) + " (env reward " +
+              str(round(objective.env_reward(cells), 2)) + ") in " + str(round(solve_time, 3)) + "s")
+
+    if output_name is None:
+        output_name = "rlOutput/" + datetime.datetime.now().strftime("%Y%m%d%H%M%S") + solver + "placements.csv"
+    helper.write_frontend_csv({dataset: placement["coordinates"] for dataset, placement in placements.items()},
+                              output_name)
+    print("The placements have been written to: " + output_name)
+    return placements
+
+
+def optimality_gap(dataset, placement, column_weight=None, time_limit=None):
+    """
+    Compares a placement, e.g. of a trained policy, with the optimal placement of the exact solver.
+    @param dataset: The relative path of the dataset.
+    @param placement: The cells of the pick-up stations.
+    @param column_weight: The feature weights, by default the ones of featureWeights.txt.
+    @param time_limit: The time limit of the exact solver in seconds, see BranchAndBoundSolver.
+    @return: The gap as returned by BranchAndBoundSolver.optimality_gap.
+    """
+    helper = Helper.HelperMethods(True)
+    if column_weight is None:
+        column_weight = helper.set_up_column_weights()
+    data = helper.create_data(dataset, True)
+    solver = BranchAndBoundSolver(helper.find_factors(len(data[0])), column_weight, helper.set_up_distance_weights(),
+                                  time_limit=time_limit)
+    gap = solver.optimality_gap(data, placement)
+    print(os.path.basename(dataset) + ": reward " + str(round(gap["value"], 2)) + ", optimum " +
+          str(round(gap["optimum"], 2)) + (" (proven)" if gap["optimal"] else ", upper bound " +
+                                           str(round(gap["upper_bound"], 2))) +
+          ", gap " + str(round(100 * gap["relative_gap"], 2)) + "%")
+    return gap
+
+
+if __name__ == '__main__':
+    solve_placements(["dataSets/test_dataset_" + str(i) + ".csv" for i in range(9)])
@@ -0,0 +1,187 @@
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+try:
+    from Solvers.LazyGreedySolver import LazyGreedySolver
+    from Solvers.PlacementObjective import PlacementObjective
+except ImportError:
+    from RL.Solvers.LazyGreedySolver import LazyGreedySolver
+    from RL.Solvers.PlacementObjective import PlacementObjective
+
+# The objective and the settings of the restarts, set once per worker process
+_restart_setup = None
+
+
+def _init_worker(setup):
+    global _restart_setup
+    _restart_setup = setup
+
+
+def _run_restart(restart):
+    return AnnealingSolver.anneal_restart(*_restart_setup, *restart)
+
+
+class AnnealingSolver:
+    """This class computes placements of pick-up stations by simulated annealing on the overlap-aware reward of the
+    PlacementObjective, optionally with a minimum spacing between the stations. A move swaps one station with another
+    cell, either one of the best cells or a cell close to a station. The change of the reward is evaluated incrementally
+    from the loss of the removed and the gain of the added station, so a move does not depend on the size of the grid.
+    Independent restarts run in a process pool and the best placement is returned with its convergence trace."""
+
+    def __init__(self, dimensions, column_weight, distance_weight, num_restarts=8, num_steps=20000,
+                 min_spacing=0, spacing_penalty=None, pool_size=2000, num_processes=None, seed=0):
+        """
+        @param dimensions: A point, representing the dimensions of the dataset as returned by find_factors.
+        @param column_weight: The feature weights as returned by set_up_column_weights.
+        @param distance_weight: The distance weights as returned by set_up_distance_weights.
+        @param num_restarts: The number of independent restarts.
+        @param num_steps: The number of moves of every restart.
+        @param min_spacing: The minimum number of rows or columns between two stations, 0 allows neighbouring stations.
+        @param spacing_penalty: The penalty of every pair of stations closer than the minimum spacing, by default the
+        largest reward of a single cell.
+        @param pool_size: The number of best cells, by their reward as a single station, that a move can jump to.
+        @param num_processes: The number of processes, by default the number of cpus.
+        @param seed: The seed of the first restart, the restarts use consecutive seeds.
+        """
+        self.dimensions = dimensions
+        self.column_weight = column_weight
+        self.distance_weight = distance_weight
+        self.num_restarts = num_restarts
+        self.num_steps = num_steps
+        self.min_spacing = min_spacing
+        self.spacing_penalty = spacing_penalty
+        self.pool_size = pool_size
+        self.num_processes = num_processes or os.cpu_count()
+        self.seed = seed
+
+    @staticmethod
+    def spacing_violations(cell, placement, num_cols, min_spacing):
+        """
+        @return: The number of stations of the placement, other than the cell, that are closer to the cell than the
+        minimum spacing.
+        """
+        row, col = divmod(cell, num_cols)
+        return sum(1 for other in placement if other != cell and
+                   max(abs(row - other // num_cols), abs(col - other % num_cols)) < min_spacing)
+
+    @staticmethod
+    def anneal_restart(objective, pool, num_pickup, num_steps, min_spacing, spacing_penalty, seed,
+                       initial_placement=None):
+        """
+        Runs one restart of the annealing.
+        @param objective: The PlacementObjective of the data.
+        @param pool: The cells that a move can jump to.
+        @param num_pickup: The number of pick-up stations to be placed.
+        @param num_steps: The number of moves.
+        @param min_spacing: The minimum spacing of the stations, see the constructor.
+        @param spacing_penalty: The penalty of every pair of stations closer than the minimum spacing.
+        @param seed: The seed of the random moves.
+        @param initial_placement: The placement to start with, None starts with random cells of the pool.
+        @return: The best placement, its penalized reward and the trace of the best penalized reward as a list of
+        steps and rewards.
+        """
+        rng = np.random.default_rng(seed)
+        num_rows, num_cols = objective.dimensions
+        if initial_placement is None:
+            initial_placement = rng.choice(pool, num_pickup, replace=False)
+        placement = [int(cell) for cell in initial_placement]
+        state = objective.new_state()
+        for cell in placement:
+            objective.add(cell, state)
+
+        def penalized(cells):
+            violations = sum(AnnealingSolver.spacing_violations(cell, cells, num_cols, min_spacing)
+                             for cell in cells) // 2
+            return objective.value(cells) - spacing_penalty * violations
+
+        current = penalized(placement)
+        best, best_placement = current, list(placement)
+        trace = [(0, best)]
+
+        # The start temperature accepts an average worsening move with a probability of one half, it then cools down
+        # geometrically to a thousandth of it
+        samples = [abs(objective.gain(int(cell), state)) for cell in rng.choice(pool, min(len(pool), 100))
+                   if not state[0][cell]]
+        start_temperature = max(np.mean(samples) if samples else 1.0, 1e-9) / math.log(2)
+        cooling = 1e-3 ** (1.0 / max(num_steps, 1))
+        temperature = start_temperature
+
+        for step in range(1, num_steps + 1):
+            index = int(rng.integers(num_pickup))
+            removed = placement[index]
+            if rng.random() < 0.5:
+                added = int(pool[rng.integers(len(pool))])
+            else:
+                # A cell within two rows and columns of the removed station
+                row = min(max(removed // num_cols + int(rng.integers(-2, 3)), 0), num_rows - 1)
+                col = min(max(removed % num_cols + int(rng.integers(-2, 3)), 0), num_cols - 1)
+                added = row * num_cols + col
+            if state[0][added]:
+                temperature *= cooling
+                continue
+
+            others = placement[:index] + placement[index + 1:]
+            delta = -objective.loss(removed, state)
+            objective.remove(removed, state)
+            delta += objective.gain(added, state)
+            if min_spacing > 0:
+                delta -= spacing_penalty * (
+                    AnnealingSolver.spacing_violations(added, others, num_cols, min_spacing) -
+                    AnnealingSolver.spacing_violations(removed, others, num_cols, min_spacing))
+
+            if delta >= 0 or rng.random() < math.exp(delta / temperature):
+                objective.add(added, state)
+                placement[index] = added
+                current += delta
+                if current > best:
+                    best, best_placement = current, list(placement)
+                    trace.append((step, best))
+            else:
+                objective.add(removed, state)
+            temperature *= cooling
+        trace.append((num_steps, best))
+        return best_placement, best, trace
+
+    def anneal(self, data, num_pickup=5):
+        """
+        Runs all restarts of the annealing for the given data. The first restart starts with the greedy placement,
+        the others with random cells.
+        @param data: The merged data as returned by create_data.
+        @param num_pickup: The number of pick-up stations to be placed.
+        @return: A dictionary with the best placement, its penalized reward, its reward without penalty, the
+        convergence trace of the best restart, the penalized reward of every restart and the runtime in seconds.
+        """
+        start_time = time.perf_counter()
+        objective = PlacementObjective(data, self.dimensions, self.column_weight, self.distance_weight)
+        rewards = objective.cell_rewards()
+        pool = np.argsort(-rewards, kind="stable")[:max(self.pool_size, num_pickup)]
+        spacing_penalty = self.spacing_penalty
+        if spacing_penalty is None:
+            spacing_penalty = max(float(np.abs(rewards).max()), 1.0)
+        greedy = LazyGreedySolver(self.dimensions, self.column_weight, self.distance_weight).solve(data, num_pickup)
+        setup = (objective, pool, num_pickup, self.num_steps, self.min_spacing, spacing_penalty)
+
+        restarts = [(self.seed + restart, greedy if restart == 0 else None) for restart in range(self.num_restarts)]
+        if self.num_processes > 1 and self.num_restarts > 1:
+            with ProcessPoolExecutor(min(self.num_processes, self.num_restarts), initializer=_init_worker,
+                                     initargs=(setup,)) as executor:
+                results = list(executor.map(_run_restart, restarts))
+        else:
+            results = [self.anneal_restart(*setup, *restart) for restart in restarts]
+
+        placement, value, trace = max(results, key=lambda result: result[1])
+        return {"placement": placement, "value": value, "reward": objective.value(placement), "trace": trace,
+                "restart_values": [result[1] for result in results], "runtime_s": time.perf_counter() - start_time}
+
+    def solve(self, data, num_pickup=5):
+        """
+        Computes the annealed placement for the given data.
+        @param data: The merged data as returned by create_data.
+        @param num_pickup: The number of pick-up stations to be placed.
+        @return: A list with the cell of every pick-up station.
+        """
+        return self.anneal(data, num_pickup)["placement"]
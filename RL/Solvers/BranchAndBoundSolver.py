@@ -0,0 +1,260 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+
+import numpy as np
+
+try:
+    from Solvers.LazyGreedySolver import LazyGreedySolver
+    from Solvers.PlacementObjective import PlacementObjective
+except ImportError:
+    from RL.Solvers.LazyGreedySolver import LazyGreedySolver
+    from RL.Solvers.PlacementObjective import PlacementObjective
+
+# The best value found by any worker process, shared so that every worker prunes with the best known placement
+_shared_incumbent = None
+
+
+def _init_worker(shared_incumbent):
+    global _shared_incumbent
+    _shared_incumbent = shared_incumbent
+
+
+class BranchAndBoundSolver:
+    """This class computes provably optimal placements of pick-up stations for the overlap-aware reward of the
+    PlacementObjective. Without overlaps between the select_indices neighbourhoods the reward of a placement is the sum
+    of the per-cell rewards, with overlaps a covered cell is only counted once. The search enumerates the placements as
+    sets of candidates sorted by an upper bound of their marginal gain and prunes every branch whose bound cannot beat
+    the best placement found so far:
+    - The bound of a branch is its value plus the largest upper bounds of the remaining candidates, the candidates next
+    to a placed station get a tighter bound, as their surrounding cells are already covered.
+    - Candidates that cannot be part of a placement better than the greedy placement are removed before the search.
+    - The branches of the first station are searched in parallel by a process pool."""
+
+    def __init__(self, dimensions, column_weight, distance_weight, num_processes=None, time_limit=None):
+        """
+        @param dimensions: A point, representing the dimensions of the dataset as returned by find_factors.
+        @param column_weight: The feature weights as returned by set_up_column_weights.
+        @param distance_weight: The distance weights as returned by set_up_distance_weights.
+        @param num_processes: The number of processes of the search, by default the number of cpus.
+        @param time_limit: The time in seconds after which the search stops, the result then is the best placement
+        found with an upper bound instead of a proven optimum. None searches until the optimum is proven.
+        """
+        self.dimensions = dimensions
+        self.column_weight = column_weight
+        self.distance_weight = distance_weight
+        self.num_processes = num_processes or os.cpu_count()
+        self.time_limit = time_limit
+
+    @staticmethod
+    def gain_bounds(objective):
+        """
+        Computes an upper bound of the marginal gain of every cell for any placement it is added to: the cell itself
+        may be covered before, in which case its neighbour layer is no longer counted, and every surrounding cell may
+        be uncovered, in which case its neighbour layer is counted.
+        @param objective: The PlacementObjective of the data.
+        @return: An array with the bound of every cell.
+        """
+        positive_neighbour = np.maximum(objective.neighbour, 0.0)
+        return np.array([objective.own[cell] + max(0.0, -objective.neighbour[cell]) +
+                         positive_neighbour[objective.neighbours[cell]].sum() for cell in range(objective.num_cells)])
+
+    def reduce_candidates(self, bounds, num_pickup, lower_bound):
+        """
+        Removes the cells that cannot be part of a placement better than the lower bound, even if all other stations
+        reach their bounds.
+        @param bounds: The bounds of the cells as returned by gain_bounds.
+        @param num_pickup: The number of pick-up stations.
+        @param lower_bound: The value of a known placement.
+        @return: The remaining cells, sorted by their bound with the best cell first.
+        """
+        order = np.argsort(-bounds, kind="stable")
+        sorted_bounds = bounds[order]
+        best_others = np.full(len(order), sorted_bounds[:num_pickup - 1].sum())
+        # A cell among the best cells is replaced by the next best cell
+        best_others[:num_pickup - 1] += sorted_bounds[num_pickup - 1] - sorted_bounds[:num_pickup - 1]
+        return order[sorted_bounds + best_others > lower_bound]
+
+    def search(self, data, num_pickup=5, initial_placement=None):
+        """
+        Searches the optimal placement for the given data.
+        @param data: The merged data as returned by create_data.
+        @param num_pickup: The number of pick-up stations to be placed.
+        @param initial_placement: A known placement to start the search with, by default the greedy placement.
+        @return: A dictionary with the placement, its value, the upper bound of the optimum, whether the placement is
+        proven to be optimal, the number of candidates after the reduction, the number of searched nodes and the
+        runtime in seconds.
+        """
+        start_time = time.perf_counter()
+        objective = PlacementObjective(data, self.dimensions, self.column_weight, self.distance_weight)
+        num_pickup = min(num_pickup, objective.num_cells)
+        if initial_placement is None:
+            initial_placement = LazyGreedySolver(self.dimensions, self.column_weight,
+                                                 self.distance_weight).solve(data, num_pickup)
+        incumbent = (objective.value(initial_placement), [int(cell) for cell in initial_placement])
+        bounds = self.gain_bounds(objective)
+        candidates = self.reduce_candidates(bounds, num_pickup, incumbent[0])
+        deadline = None if self.time_limit is None else time.time() + self.time_limit
+
+        # Every task searches the placements whose first station is the candidate at the given position
+        search = _CandidateSearch(objective, bounds, candidates, num_pickup, deadline)
+        tasks = [position for position in range(len(candidates) - num_pickup + 1)
+                 if search.static_bound(0.0, position, num_pickup) > incumbent[0]]
+        shared_incumbent = multiprocessing.Value('d', incumbent[0], lock=False)
+        if self.num_processes > 1 and len(tasks) > 1:
+            chunks = [tasks[i::self.num_processes] for i in range(self.num_processes)]
+            with ProcessPoolExecutor(self.num_processes, initializer=_init_worker,
+                                     initargs=(shared_incumbent,)) as executor:
+                results = list(executor.map(search.run, chunks))
+        else:
+            _init_worker(shared_incumbent)
+            results = [search.run(tasks)]
+
+        upper_bound = incumbent[0]
+        nodes = 0
+        for value, placement, unfinished_bound, task_nodes in results:
+            if placement is not None and value > incumbent[0]:
+                incumbent = (value, placement)
+            upper_bound = max(upper_bound, unfinished_bound)
+            nodes += task_nodes
+        upper_bound = max(upper_bound, incumbent[0])
+        return {"placement": incumbent[1], "value": incumbent[0], "upper_bound": upper_bound,
+                "optimal": upper_bound <= incumbent[0], "candidates": len(candidates), "nodes": nodes,
+                "runtime_s": time.perf_counter() - start_time}
+
+    def solve(self, data, num_pickup=5):
+        """
+        Computes the optimal placement for the given data.
+        @param data: The merged data as returned by create_data.
+        @param num_pickup: The number of pick-up stations to be placed.
+        @return: A list with the cell of every pick-up station.
+        """
+        return self.search(data, num_pickup)["placement"]
+
+    def optimality_gap(self, data, placement, result=None):
+        """
+        Compares a placement, e.g. of a trained policy, with the optimum.
+        @param data: The merged data as returned by create_data.
+        @param placement: The cells of the pick-up stations.
+        @param result: The result of search for the same data and number of stations, searched if not given.
+        @return: A dictionary with the value of the placement, the optimum, its upper bound and the gap of the value
+        to the upper bound, absolute and relative to the upper bound.
+        """
+        if result is None:
+            result = self.search(data, len(placement))
+        value = PlacementObjective(data, self.dimensions, self.column_weight, self.distance_weight).value(placement)
+        gap = result["upper_bound"] - value
+        return {"value": value, "optimum": result["value"], "upper_bound": result["upper_bound"],
+                "optimal": result["optimal"], "gap": gap,
+                "relative_gap": gap / abs(result["upper_bound"]) if result["upper_bound"] != 0 else 0.0}
+
+
+class _CandidateSearch:
+    """The depth-first search of the BranchAndBoundSolver over the reduced candidates. It is sent to the worker
+    processes, which search disjoint sets of first stations."""
+
+    def __init__(self, objective, bounds, candidates, num_pickup, deadline):
+        self.objective = objective
+        self.candidates = candidates
+        self.sorted_bounds = bounds[candidates]
+        self.num_pickup = num_pickup
+        self.deadline = deadline
+        self.positive_neighbour = np.maximum(objective.neighbour, 0.0)
+
+    def static_bound(self, value, position, remaining):
+        # The candidates are sorted by their bounds, so the next candidates have the largest bounds
+        return value + self.sorted_bounds[position:position + remaining].sum()
+
+    def state_bound(self, cell, state):
+        """
+        The bound of the marginal gain of a cell for every placement that extends the placement of the state. A cell
+        that is covered stays covered, and a surrounding cell that is covered or a station is not counted again.
+        """
+        is_station, cover_count = state
+        neighbours = self.objective.neighbours[cell]
+        own = self.objective.own[cell]
+        own -= self.objective.neighbour[cell] if cover_count[cell] > 0 else min(0.0, self.objective.neighbour[cell])
+        free = neighbours[(cover_count[neighbours] == 0) & ~is_station[neighbours]]
+        return own + self.positive_neighbour[free].sum()
+
+    def best_bounds(self, position, remaining, state, near):
+        """
+        @return: The sum of the largest bounds of remaining candidates from the given position on, with the tighter
+        bounds of candidates next to a station.
+        """
+        best = []
+        for next_position in range(position, len(self.candidates)):
+            if len(best) == remaining and self.sorted_bounds[next_position] <= best[-1]:
+                break
+            cell = self.candidates[next_position]
+            bound = self.state_bound(cell, state) if near[cell] else self.sorted_bounds[next_position]
+            if len(best) < remaining or bound > best[-1]:
+                best.append(bound)
+                best.sort(reverse=True)
+                del best[remaining:]
+        return sum(best) if len(best) == remaining else -np.inf
+
+    def run(self, tasks):
+        """
+        Searches the placements starting with the candidates at the given positions.
+        @param tasks: The positions of the first stations.
+        @return: The best value and placement better than the shared incumbent, or None, the largest bound of the
+        branches left unsearched due to the time limit and the number of searched nodes.
+        """
+        self.best = (-np.inf, None)
+        self.nodes = 0
+        self.unfinished_bound = -np.inf
+        state = self.objective.new_state()
+        # The number of stations whose neighbourhood overlaps the neighbourhood of every cell
+        near = np.zeros(self.objective.num_cells, dtype=np.int32)
+        for task in tasks:
+            if self.deadline is not None and time.time() > self.deadline:
+                self.unfinished_bound = max(self.unfinished_bound,
+                                            self.static_bound(0.0, task, self.num_pickup))
+                continue
+            self.branch(task, [], 0.0, state, near)
+        return self.best[0], self.best[1], self.unfinished_bound, self.nodes
+
+    def branch(self, position, placement, value, state, near):
+        # Adds the candidate at the position as a station and searches all extensions with later candidates
+        cell = int(self.candidates[position])
+        value += self.objective.gain(cell, state)
+        placement.append(cell)
+        self.nodes += 1
+        remaining = self.num_pickup - len(placement)
+        if remaining == 0:
+            if value > _shared_incumbent.value:
+                _shared_incumbent.value = value
+                self.best = (value, list(placement))
+            placement.pop()
+            return
+
+        self.objective.add(cell, state)
+        window = self.window(cell)
+        near[window] += 1
+        for next_position in range(position + 1, len(self.candidates) - remaining + 1):
+            if self.static_bound(value, next_position, remaining) <= _shared_incumbent.value:
+                break
+            if self.deadline is not None and time.time() > self.deadline:
+                self.unfinished_bound = max(self.unfinished_bound,
+                                            value + self.best_bounds(next_position, remaining, state, near))
+                break
+            next_cell = self.candidates[next_position]
+            bound = self.objective.gain(next_cell, state) if near[next_cell] else self.sorted_bounds[next_position]
+            if remaining > 1:
+                bound += self.best_bounds(next_position + 1, remaining - 1, state, near)
+            if value + bound <= _shared_incumbent.value:
+                continue
+            self.branch(next_position, placement, value, state, near)
+        near[window] -= 1
+        self.objective.remove(cell, state)
+        placement.pop()
+
+    def window(self, cell):
+        # The cells within two rows and columns, their neighbourhoods overlap the neighbourhood of the cell
+        num_rows, num_cols = self.objective.dimensions
+        row, col = divmod(cell, num_cols)
+        rows = np.arange(max(0, row - 2), min(num_rows, row + 3))
+        cols = np.arange(max(0, col - 2), min(num_cols, col + 3))
+        return (rows[:, None] * num_cols + cols[None, :]).ravel()
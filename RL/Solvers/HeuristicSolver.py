@@ -0,0 +1,49 @@
+import numpy as np
+
+try:
+    import Helper
+except ImportError:
+    from RL import Helper
+
+
+class HeuristicSolver:
+    """This class computes a fast heuristic placement of pick-up stations from the vectorized per-cell rewards of the
+    CompleteEnv. The cells are taken in the order of their reward, skipping every cell whose neighbourhood overlaps
+    with the neighbourhood of an already placed station, so that the stations do not share surrounding cells."""
+
+    def __init__(self, dimensions, column_weight, distance_weight):
+        """
+        @param dimensions: A point, representing the dimensions of the dataset as returned by find_factors.
+        @param column_weight: The feature weights as returned by set_up_column_weights.
+        @param distance_weight: The distance weights as returned by set_up_distance_weights.
+        """
+        self.dimensions = dimensions
+        self.column_weight = column_weight
+        self.distance_weight = distance_weight
+
+    def cell_rewards(self, data):
+        """
+        @param data: The merged data as returned by create_data.
+        @return: An array with the reward of every cell.
+        """
+        return Helper.HelperMethods.cell_rewards(data, self.dimensions, self.column_weight, self.distance_weight)
+
+    def solve(self, data, num_pickup=5):
+        """
+        Computes the heuristic placement for the given data.
+        @param data: The merged data as returned by create_data.
+        @param num_pickup: The number of pick-up stations to be placed.
+        @return: A list with the cell of every pick-up station, in the order of their reward.
+        """
+        rewards = self.cell_rewards(data)
+        num_cols = self.dimensions[1]
+        placement = []
+        # Cells sorted by their reward, the best cell first
+        for cell in np.argsort(-rewards, kind="stable"):
+            # Two 3x3 neighbourhoods overlap if the cells are at most two rows and two columns apart
+            if all(abs(cell // num_cols - other // num_cols) > 2 or abs(cell % num_cols - other % num_cols) > 2
+                   for other in placement):
+                placement.append(int(cell))
+                if len(placement) == num_pickup:
+                    break
+        return placement
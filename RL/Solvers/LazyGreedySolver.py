@@ -0,0 +1,60 @@
+import heapq
+
+import numpy as np
+
+try:
+    from Solvers.PlacementObjective import PlacementObjective
+except ImportError:
+    from RL.Solvers.PlacementObjective import PlacementObjective
+
+
+class LazyGreedySolver:
+    """This class computes placements of pick-up stations by greedily adding the station with the highest overlap-aware
+    marginal gain of the PlacementObjective. The gains are kept in a priority queue: adding a station only changes the
+    gains of the cells within two rows and columns of it, so only these gains are recomputed and pushed again, while
+    their outdated entries are skipped once they reach the top of the queue. As every cell keeps an up to date entry,
+    the result equals the plain greedy placement for any weights, also negative ones for which gains can increase, but
+    only a few gains are recomputed per station instead of the gains of all cells."""
+
+    def __init__(self, dimensions, column_weight, distance_weight):
+        """
+        @param dimensions: A point, representing the dimensions of the dataset as returned by find_factors.
+        @param column_weight: The feature weights as returned by set_up_column_weights.
+        @param distance_weight: The distance weights as returned by set_up_distance_weights.
+        """
+        self.dimensions = dimensions
+        self.column_weight = column_weight
+        self.distance_weight = distance_weight
+
+    def solve(self, data, num_pickup=5):
+        """
+        Computes the greedy placement for the given data.
+        @param data: The merged data as returned by create_data.
+        @param num_pickup: The number of pick-up stations to be placed.
+        @return: A list with the cell of every pick-up station, in the order they have been chosen.
+        """
+        objective = PlacementObjective(data, self.dimensions, self.column_weight, self.distance_weight)
+        state = objective.new_state()
+        is_station = state[0]
+        # The version of the gain of every cell, an entry of the queue with an older version is outdated
+        version = np.zeros(objective.num_cells, dtype=np.int64)
+        # Without stations the gain of every cell is its reward as a single station
+        queue = [(-gain, cell, 0) for cell, gain in enumerate(objective.cell_rewards())]
+        heapq.heapify(queue)
+
+        placement = []
+        while len(placement) < num_pickup and queue:
+            _, cell, cell_version = heapq.heappop(queue)
+            if is_station[cell] or cell_version != version[cell]:
+                continue
+            placement.append(int(cell))
+            objective.add(cell, state)
+            # The gain of a cell changes if its neighbourhood overlaps the neighbourhood of the new station
+            changed = np.unique(np.concatenate([objective.neighbours[cell]] +
+                                               [objective.neighbours[neighbour]
+                                                for neighbour in objective.neighbours[cell]]))
+            for changed_cell in changed[~is_station[changed]]:
+                version[changed_cell] += 1
+                heapq.heappush(queue, (-objective.gain(changed_cell, state), int(changed_cell),
+                                       int(version[changed_cell])))
+        return placement
@@ -0,0 +1,117 @@
+import numpy as np
+
+try:
+    import Helper
+except ImportError:
+    from RL import Helper
+
+
+class PlacementObjective:
+    """This class evaluates placements of pick-up stations with an overlap-aware version of the CompleteEnv reward.
+    The reward of the CompleteEnv consists of the weighted features of a station cell (its own layer) and the weighted
+    and distance weighted features of the cells around it in the select_indices neighbourhood (its neighbour layer).
+    Summed up over the stations, a cell that is surrounded by two stations is counted twice. Here every cell is counted
+    once: with its own layer if it is a station, otherwise with its neighbour layer if it is next to a station.
+    For stations without overlapping neighbourhoods both rewards are equal."""
+
+    def __init__(self, data, dimensions, column_weight, distance_weight):
+        """
+        @param data: The merged data as returned by create_data.
+        @param dimensions: A point, representing the dimensions of the dataset as returned by find_factors.
+        @param column_weight: The feature weights as returned by set_up_column_weights.
+        @param distance_weight: The distance weights as returned by set_up_distance_weights.
+        """
+        self.dimensions = dimensions
+        features = np.asarray(data[1:], dtype=float)
+        column_weight = np.asarray(column_weight[1:len(data)], dtype=float)
+        distance_weight = np.asarray(distance_weight[1:len(data)], dtype=float)
+        self.own = column_weight @ features
+        self.neighbour = (column_weight * distance_weight) @ features
+        self.num_cells = len(self.own)
+        self.neighbours = self.neighbour_table(dimensions)
+
+    @staticmethod
+    def neighbour_table(dimensions):
+        """
+        Lists the surrounding cells of every cell in the neighbourhood of select_indices, without the cell itself.
+        @param dimensions: A point, representing the dimensions of the dataset as returned by find_factors.
+        @return: A list with an array of the surrounding cells for every cell.
+        """
+        num_rows, num_cols = dimensions
+        rows, cols = np.divmod(np.arange(num_rows * num_cols), num_cols)
+        offsets = [(row_shift, col_shift) for row_shift in (-1, 0, 1) for col_shift in (-1, 0, 1)
+                   if (row_shift, col_shift) != (0, 0)]
+        columns = []
+        for row_shift, col_shift in offsets:
+            valid = (rows + row_shift >= 0) & (rows + row_shift < num_rows) & (cols + col_shift >= 0) & \
+                    (cols + col_shift < num_cols)
+            columns.append(np.where(valid, (rows + row_shift) * num_cols + cols + col_shift, -1))
+        return [cell_neighbours[cell_neighbours >= 0] for cell_neighbours in np.stack(columns, axis=1)]
+
+    def cell_rewards(self):
+        """
+        @return: The reward of every cell as a single station, equal to HelperMethods.cell_rewards.
+        """
+        return self.own + Helper.HelperMethods.neighbour_sum(self.neighbour, self.dimensions)
+
+    def value(self, placement):
+        """
+        @param placement: The cells of the pick-up stations.
+        @return: The overlap-aware reward of the placement, duplicate stations are counted once.
+        """
+        stations = np.unique(np.asarray(placement, dtype=int))
+        if len(stations) == 0:
+            return 0.0
+        covered = np.setdiff1d(np.concatenate([self.neighbours[cell] for cell in stations]), stations)
+        return float(self.own[stations].sum() + self.neighbour[covered].sum())
+
+    def env_reward(self, placement):
+        """
+        @param placement: The cells of the pick-up stations.
+        @return: The reward of the placement in the CompleteEnv, which counts overlapping neighbourhoods repeatedly.
+        """
+        return float(self.cell_rewards()[np.asarray(placement, dtype=int)].sum())
+
+    def new_state(self):
+        """
+        @return: The state of an empty placement for gain, add and remove, the station mask and the number of
+        stations next to every cell.
+        """
+        return np.zeros(self.num_cells, dtype=bool), np.zeros(self.num_cells, dtype=np.int32)
+
+    def gain(self, cell, state):
+        """
+        The marginal reward of adding a station to a placement.
+        @param cell: The cell of the new station, it must not be a station yet.
+        @param state: The state of the placement, see new_state.
+        @return: The change of the overlap-aware reward.
+        """
+        is_station, cover_count = state
+        neighbours = self.neighbours[cell]
+        # The cell is counted as a station instead of as a neighbour, its neighbours are counted if they are new
+        gain = self.own[cell] - (self.neighbour[cell] if cover_count[cell] > 0 else 0.0)
+        new = neighbours[(cover_count[neighbours] == 0) & ~is_station[neighbours]]
+        return float(gain + self.neighbour[new].sum())
+
+    def loss(self, cell, state):
+        """
+        The marginal reward lost by removing a station from a placement.
+        @param cell: The cell of the station.
+        @param state: The state of the placement, see new_state.
+        @return: The change of the overlap-aware reward caused by the removal, as a positive loss.
+        """
+        is_station, cover_count = state
+        neighbours = self.neighbours[cell]
+        loss = self.own[cell] - (self.neighbour[cell] if cover_count[cell] > 0 else 0.0)
+        lost = neighbours[(cover_count[neighbours] == 1) & ~is_station[neighbours]]
+        return float(loss + self.neighbour[lost].sum())
+
+    def add(self, cell, state):
+        is_station, cover_count = state
+        is_station[cell] = True
+        cover_count[self.neighbours[cell]] += 1
+
+    def remove(self, cell, state):
+        is_station, cover_count = state
+        is_station[cell] = False
+        cover_count[self.neighbours[cell]] -= 1
@@ -0,0 +1,181 @@
+import datetime
+import itertools
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from ray import air, tune
+
+# own imports
+import Helper
+from Cluster import RayCluster
+from Configs.ConfigFactory import ConfigFactory
+from Envs.CompleteEnv import CompleteEnv
+
+
+def load_weight_profile(profile, base_file='featureWeights.txt'):
+    """
+    Creates the feature weights of a weight profile of the sweep grid.
+    @param profile: None for the weights of the base file, the path of a weight file, or a dictionary mapping feature
+    names of the base file to the weights that replace theirs.
+    @param base_file: The weight file the profile is based on.
+    @return: The list of feature weights, or None if the environment is to read its weight file.
+    """
+    if profile is None:
+        return None
+    if isinstance(profile, str):
+        return Helper.HelperMethods.read_weight_file(profile)[0]
+    weights, features = Helper.HelperMethods.read_weight_file(base_file)
+    for feature, weight in profile.items():
+        if feature not in features:
+            raise ValueError("Unknown feature '" + feature + "' in weight profile. Available features are: " +
+                             ", ".join(features))
+        weights[features.index(feature)] = float(weight)
+    return weights
+
+
+def load_grid(grid_file):
+    """
+    Reads the grid of a sweep from a json file, e.g. sweepGrid.json. The file contains the keys
+    datasets: a list of dataset file names in the dataSets directory,
+    weight_profiles: a dictionary of profile names to profiles as accepted by load_weight_profile,
+    hyperparameters: a dictionary of PPO training parameters to lists of values,
+    and optionally iterations, the training iterations of every job, and cpus_per_trial.
+    @param grid_file: The path of the grid file.
+    @return: The grid as a dictionary with all keys set.
+    """
+    with open(grid_file, 'r') as file:
+        grid = json.load(file)
+    if not grid.get("datasets"):
+        raise ValueError("The grid file " + grid_file + " does not contain any datasets.")
+    grid.setdefault("weight_profiles", {"default": None})
+    grid.setdefault("hyperparameters", {})
+    grid.setdefault("iterations", 30)
+    grid.setdefault("cpus_per_trial", None)
+    for parameter, values in grid["hyperparameters"].items():
+        if not isinstance(values, list):
+            grid["hyperparameters"][parameter] = [values]
+    return grid
+
+
+def count_jobs(grid):
+    # Every combination of dataset, weight profile and hyperparameter values is one job
+    return len(list(itertools.product(grid["datasets"], grid["weight_profiles"],
+                                      *grid["hyperparameters"].values())))
+
+
+def get_env_configs(grid):
+    """
+    Creates one environment configuration per combination of dataset and weight profile. The configurations hold the
+    path of the dataset, which every process of the environments loads once, so the checkpoints of the jobs do not
+    depend on the object store of the sweep.
+    @param grid: The grid as returned by load_grid.
+    @return: The list of environment configurations. The key weight_profile labels the jobs and is ignored by the
+    environment.
+    """
+    helper = Helper.HelperMethods(True)
+    # The weights are read here and passed to the environments, which then do not depend on the working directory of
+    # the trials
+    distance_weight = helper.set_up_distance_weights()
+    env_configs = []
+    for dataset, (profile_name, profile) in itertools.product(grid["datasets"], grid["weight_profiles"].items()):
+        column_weight = load_weight_profile(profile)
+        env_configs.append({"dataset": "dataSets/" + dataset, "weight_profile": profile_name,
+                            "column_weight": column_weight or helper.set_up_column_weights(),
+                            "distance_weight": distance_weight})
+    return env_configs
+
+
+class SweepSummary(tune.Callback):
+    """This callback collects one row per job of a sweep with its dataset, weight profile, hyperparameters and
+    results. Unlike the results of the tuner it also knows the configuration of jobs that failed before reporting a
+    result."""
+
+    def __init__(self, hyperparameters):
+        """
+        @param hyperparameters: The names of the hyperparameters of the grid.
+        """
+        self.hyperparameters = hyperparameters
+        self.best_rewards = {}
+        self.rows = []
+
+    def job_row(self, trial):
+        env_config = trial.config["env_config"]
+        return {"dataset": os.path.basename(env_config["dataset"]), "weight_profile": env_config["weight_profile"],
+                **{parameter: trial.config[parameter] for parameter in self.hyperparameters}}
+
+    def on_trial_result(self, iteration, trials, trial, result, **info):
+        reward = result.get("episode_reward_mean")
+        if reward is not None and not np.isnan(reward):
+            self.best_rewards[trial.trial_id] = max(reward, self.best_rewards.get(trial.trial_id, reward))
+
+    def on_trial_complete(self, iteration, trials, trial, **info):
+        self.rows.append({**self.job_row(trial),
+                          "episode_reward_mean": trial.last_result.get("episode_reward_mean"),
+                          "best_episode_reward_mean": self.best_rewards.get(trial.trial_id),
+                          "training_iteration": trial.last_result.get("training_iteration"),
+                          "time_total_s": trial.last_result.get("time_total_s"),
+                          "trial_dir": trial.local_path})
+
+    def on_trial_error(self, iteration, trials, trial, **info):
+        self.rows.append({**self.job_row(trial), "error": trial.error_file or "failed",
+                          "trial_dir": trial.local_path})
+
+
+def run_sweep(grid_file, address=None, local_dir=None, output_name=None):
+    """
+    Runs all jobs of a sweep grid concurrently through ray tune. Every job is a cpu only PPO trial sized by the
+    resource packing of the RayCluster, so that as many jobs as fit run at the same time on the cores of the machine or
+    the cluster. The results of all jobs are collected into one summary table.
+    @param grid_file: The path of the grid file, see load_grid.
+    @param address: The address of the ray head to run the sweep on a cluster, None starts a local ray instance.
+    @param local_dir: The directory of the trial results, ./ray_results_sweep by default.
+    @param output_name: The path of the summary csv, by default a dated file in rlOutput.
+    @return: The summary table as a pandas dataframe.
+    """
+    # Suppress the TensorFlow warning
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+
+    grid = load_grid(grid_file)
+    cluster = RayCluster(address).connect()
+    trial_resources = cluster.get_packed_trial_resources(grid["cpus_per_trial"], count_jobs(grid))
+    print("Running " + str(count_jobs(grid)) + " jobs with " + str(trial_resources["cpus_per_trial"]) +
+          " cpus each.")
+
+    param_space = ConfigFactory(CompleteEnv, None).get_training_ppo_config().to_dict()
+    param_space.update({
+        "env_config": tune.grid_search(get_env_configs(grid)),
+        "num_workers": trial_resources["num_workers"],
+        "num_cpus_per_worker": trial_resources["num_cpus_per_worker"],
+        "num_cpus_for_driver": 1,
+        "num_gpus": 0,
+        **{parameter: tune.grid_search(values) for parameter, values in grid["hyperparameters"].items()}
+    })
+
+    summary_callback = SweepSummary(list(grid["hyperparameters"]))
+    tuner = tune.Tuner(
+        "PPO",
+        tune_config=tune.TuneConfig(metric="episode_reward_mean", mode="max"),
+        param_space=param_space,
+        run_config=air.RunConfig(stop={"training_iteration": grid["iterations"]},
+                                 local_dir=local_dir or "./ray_results_sweep",
+                                 name="sweep_" + datetime.datetime.now().strftime("%Y%m%d%H%M%S"),
+                                 checkpoint_config=air.CheckpointConfig(num_to_keep=1, checkpoint_at_end=True),
+                                 callbacks=[summary_callback]),
+    )
+    tuner.fit()
+
+    summary = pd.DataFrame(summary_callback.rows)
+    if "best_episode_reward_mean" in summary:
+        summary = summary.sort_values("best_episode_reward_mean", ascending=False, na_position="last")
+    if output_name is None:
+        output_name = "rlOutput/" + datetime.datetime.now().strftime("%Y%m%d%H%M%S") + "sweep.csv"
+    summary.to_csv(output_name, index=False)
+    print(summary.to_string(index=False))
+    print("The summary of the sweep has been written to: " + output_name)
+    return summary
+
+
+if __name__ == '__main__':
+    run_sweep('sweepGrid.json')
@@ -0,0 +1,37 @@
+import importlib.util
+import gymnasium as gym
+import numpy as np
+from ray.rllib.policy.sample_batch import SampleBatch
+
+
+has_torch = importlib.util.find_spec("torch") is not None
+# The tf RLModule of this ray version requires torch and tensorflow_probability to be installed
+has_rl_module = has_torch and importlib.util.find_spec("tensorflow_probability") is not None
+
+
+class SmallPlacementEnv(gym.Env):
+    # A small stand-in for the CompleteEnv with the same kind of spaces
+    def __init__(self, env_config=None):
+        self.action_space = gym.spaces.Tuple([gym.spaces.Discrete(20) for _ in range(3)])
+        self.observation_space = gym.spaces.Box(low=0, high=1, shape=(20,), dtype=np.float64)
+
+    def reset(self, *, seed=None, options=None):
+        return np.zeros(20), {}
+
+    def step(self, action):
+        return np.zeros(20), float(sum(action)), True, False, {}
+
+
+def rl_module_actions(policy, observations):
+    # RLlib 2.6 cannot compute deterministic actions of a Tuple action space with an RLModule, the mode is taken from
+    # the logits of the module instead
+    if policy.config["framework"] == "torch":
+        import torch
+        batch = {SampleBatch.OBS: torch.from_numpy(observations.astype(np.float32))}
+        logits = policy.model.forward_inference(batch)[SampleBatch.ACTION_DIST_INPUTS].detach().numpy()
+    else:
+        import tensorflow as tf
+        batch = {SampleBatch.OBS: tf.convert_to_tensor(observations.astype(np.float32))}
+        logits = policy.model.forward_inference(batch)[SampleBatch.ACTION_DIST_INPUTS].numpy()
+    splits = np.cumsum([space.n for space in policy.action_space])[:-1]
+    return np.stack([np.argmax(part, axis=1) for part in np.split(logits, splits, axis=1)], axis=1)
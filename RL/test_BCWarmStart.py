@@ -0,0 +1,57 @@
+import os
+import unittest
+import numpy as np
+import ray
+from BCWarmStart import clone_policy
+from Configs.ConfigFactory import ConfigFactory
+from TestHelper import SmallPlacementEnv, has_rl_module, has_torch, rl_module_actions
+
+
+class TestBCWarmStart(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+        ray.init(num_cpus=1, include_dashboard=False)
+
+    @classmethod
+    def tearDownClass(cls):
+        ray.shutdown()
+
+    def setUp(self):
+        # Every observation is labelled with the same placement, which the cloned policy has to choose
+        self.observations = np.random.default_rng(0).random((32, 20)).astype(np.float32)
+        self.actions = np.tile(np.array([3, 7, 11], dtype=np.int64), (32, 1))
+
+    def assert_clones_placement(self, config):
+        algorithm = config.rollouts(num_rollout_workers=0).build()
+        try:
+            policy = algorithm.get_policy()
+            losses = clone_policy(policy, self.observations, self.actions, epochs=30, batch_size=16, lr=0.01)
+            self.assertLess(losses[-1], losses[0])
+            if hasattr(policy.model, "pi"):
+                action = rl_module_actions(policy, self.observations[:1])[0]
+            else:
+                action = policy.compute_single_action(self.observations[0], explore=False)[0]
+            self.assertEqual(tuple(int(a) for a in action), (3, 7, 11))
+        finally:
+            algorithm.stop()
+
+    def test_clone_model_v2_policy(self):
+        config = ConfigFactory(SmallPlacementEnv, None).get_training_ppo_config()
+        config = config.training(model={"fcnet_hiddens": [16]}, _enable_learner_api=False)
+        self.assert_clones_placement(config.rl_module(_enable_rl_module_api=False))
+
+    @unittest.skipUnless(has_rl_module, "The tf RLModule requires torch and tensorflow_probability")
+    def test_clone_default_config(self):
+        config = ConfigFactory(SmallPlacementEnv, None).get_training_ppo_config()
+        self.assertTrue(config._enable_rl_module_api and config._enable_learner_api)
+        self.assert_clones_placement(config.training(model={"fcnet_hiddens": [16]}))
+
+    @unittest.skipUnless(has_torch, "The torch preset requires torch")
+    def test_clone_torch_preset(self):
+        config = ConfigFactory(SmallPlacementEnv, None).get_training_ppo_config(preset="16core")
+        self.assert_clones_placement(config.training(model={"fcnet_hiddens": [16]}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import json
+import os
+import tempfile
+import unittest
+import numpy as np
+import ray
+from ray.rllib.algorithms.ppo import PPOConfig
+from CheckpointTournament import evaluate_checkpoint, find_checkpoints, rank_checkpoints
+from TestHelper import SmallPlacementEnv, has_rl_module, has_torch, rl_module_actions
+
+
+class TestCheckpointTournament(unittest.TestCase):
+    @staticmethod
+    def write_checkpoint(path, checkpoint_type, state_file):
+        os.makedirs(path)
+        with open(os.path.join(path, "rllib_checkpoint.json"), "w") as f:
+            json.dump({"type": checkpoint_type, "checkpoint_version": "1.1"}, f)
+        open(os.path.join(path, state_file), "wb").close()
+
+    def test_find_checkpoints(self):
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            policy = os.path.join(checkpoint_dir, "20230701bc_policy")
+            algorithm = os.path.join(checkpoint_dir, "PPO", "checkpoint_000030")
+            self.write_checkpoint(policy, "Policy", "policy_state.pkl")
+            self.write_checkpoint(algorithm, "Algorithm", "algorithm_state.pkl")
+            # The policies inside of an algorithm checkpoint are not listed on their own
+            self.write_checkpoint(os.path.join(algorithm, "policies", "default_policy"), "Policy", "policy_state.pkl")
+            os.makedirs(os.path.join(checkpoint_dir, "empty"))
+
+            self.assertEqual(find_checkpoints(checkpoint_dir), [policy, algorithm])
+
+
+class TestEvaluateCheckpoint(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+        ray.init(num_cpus=1, include_dashboard=False)
+        cls.checkpoint_dir = tempfile.TemporaryDirectory()
+        # The ModelV2 stack is used, which does not require torch
+        config = PPOConfig().environment(SmallPlacementEnv).framework("tf2").rollouts(num_rollout_workers=0)
+        config = config.training(model={"fcnet_hiddens": [16]}, _enable_learner_api=False)
+        algorithm = config.rl_module(_enable_rl_module_api=False).build()
+        cls.policy = algorithm.get_policy()
+        cls.policy_path = os.path.join(cls.checkpoint_dir.name, "policy")
+        cls.policy.export_checkpoint(cls.policy_path)
+        algorithm.stop()
+
+        rng = np.random.default_rng(0)
+        cls.trial_observations = list(rng.random((3, 20)))
+        cls.trial_rewards = list(rng.random((3, 20)))
+
+    @classmethod
+    def tearDownClass(cls):
+        ray.shutdown()
+        cls.checkpoint_dir.cleanup()
+
+    def broken_checkpoint(self):
+        path = os.path.join(self.checkpoint_dir.name, "broken")
+        if not os.path.exists(path):
+            TestCheckpointTournament.write_checkpoint(path, "Policy", "policy_state.pkl")
+        return path
+
+    def test_evaluate_checkpoint(self):
+        result = ray.get(evaluate_checkpoint.remote(self.policy_path, self.trial_observations, self.trial_rewards))
+        expected = [float(np.sum(cell_rewards[np.asarray(self.policy.compute_single_action(observation,
+                                                                                            explore=False)[0])]))
+                    for observation, cell_rewards in zip(self.trial_observations, self.trial_rewards)]
+        self.assertAlmostEqual(result["reward_mean"], np.mean(expected), places=5)
+        self.assertEqual([result["reward_dataset_" + str(j)] for j in range(3)], expected)
+        self.assertGreater(result["inference_ms_p90"], 0)
+
+    def test_rank_checkpoints(self):
+        leaderboard = rank_checkpoints([self.broken_checkpoint(), self.policy_path], self.trial_observations,
+                                       self.trial_rewards)
+        self.assertEqual(list(leaderboard["checkpoint"]), [self.policy_path, self.broken_checkpoint()])
+        self.assertEqual(list(leaderboard.index), [1, 2])
+        self.assertTrue(np.isnan(leaderboard.loc[2, "reward_mean"]))
+
+    def assert_ranks_rl_module(self, framework):
+        # The default configuration of PPO builds the policy as an RLModule, as the one of MainPPO
+        config = PPOConfig().environment(SmallPlacementEnv).framework(framework).rollouts(num_rollout_workers=0)
+        algorithm = config.training(model={"fcnet_hiddens": [16]}).build()
+        policy = algorithm.get_policy()
+        path = os.path.join(self.checkpoint_dir.name, framework + "_rl_module")
+        policy.export_checkpoint(path)
+        actions = rl_module_actions(policy, np.stack(self.trial_observations))
+        algorithm.stop()
+
+        leaderboard = rank_checkpoints([path, self.policy_path], self.trial_observations, self.trial_rewards)
+        self.assertNotIn("error", leaderboard)
+        result = leaderboard[leaderboard["checkpoint"] == path].iloc[0]
+        expected = [float(np.sum(cell_rewards[action])) for action, cell_rewards in zip(actions, self.trial_rewards)]
+        self.assertEqual([result["reward_dataset_" + str(j)] for j in range(3)], expected)
+
+    @unittest.skipUnless(has_torch, "The torch RLModule requires torch")
+    def test_rank_torch_rl_module(self):
+        self.assert_ranks_rl_module("torch")
+
+    @unittest.skipUnless(has_rl_module, "The tf RLModule requires torch and tensorflow_probability")
+    def test_rank_tf_rl_module(self):
+        self.assert_ranks_rl_module("tf2")
+
+    def test_rank_failed_checkpoints(self):
+        with self.assertRaisesRegex(RuntimeError, "None of the 1 checkpoints"):
+            rank_checkpoints([self.broken_checkpoint()], self.trial_observations, self.trial_rewards)
+
+
+if __name__ == '__main__':
+    unittest.main()
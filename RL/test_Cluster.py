@@ -0,0 +1,70 @@
+import unittest
+import numpy as np
+import ray
+from ray.cluster_utils import Cluster
+from Cluster import RayCluster
+
+
+def get_node():
+    return ray.util.get_node_ip_address(), ray.get_runtime_context().get_node_id()
+
+
+def get_worker_nodes(num_workers):
+    # Creates actors like RLlib creates its rollout workers and returns the node id of the learner and the node ids the
+    # actors have been placed on
+    node_actor = ray.remote(num_cpus=1)(type("NodeActor", (), {"get_node": lambda self: get_node()[1]}))
+    actors = [node_actor.remote() for _ in range(num_workers)]
+    return get_node()[1], ray.get([actor.get_node.remote() for actor in actors])
+
+
+class TestCluster(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # A local multi-process ray cluster with a head and a second node
+        cls.cluster = Cluster(initialize_head=True, head_node_args={"num_cpus": 2})
+        cls.cluster.add_node(num_cpus=2)
+        cls.cluster.wait_for_nodes()
+        cls.ray_cluster = RayCluster(address=cls.cluster.address).connect()
+
+    @classmethod
+    def tearDownClass(cls):
+        ray.shutdown()
+        cls.cluster.shutdown()
+
+    def test_get_nodes(self):
+        nodes = RayCluster.get_nodes()
+        self.assertEqual(len(nodes), 2)
+        self.assertEqual(sum(node[1] for node in nodes), 4)
+
+    def test_share_data(self):
+        data = np.arange(20.0).reshape(4, 5)
+        data_ref = RayCluster.share_data(data)
+        self.assertIsInstance(data_ref, ray.ObjectRef)
+        np.testing.assert_array_equal(ray.get(data_ref), data)
+
+    def test_learner_bundle(self):
+        cluster = RayCluster(address=self.cluster.address, learner_node="10.0.0.1")
+        bundles = cluster.get_bundles(num_workers=3, cpus_per_worker=1, learner_cpus=1)
+        self.assertEqual(len(bundles), 4)
+        self.assertIn("node:10.0.0.1", bundles[0])
+        self.assertEqual(bundles[1], {"CPU": 1})
+
+    def test_packed_trial_resources(self):
+        # Trials of 3 cpus do not fit onto the nodes with 2 cpus, so they are shrunk to one learner and one worker
+        resources = self.ray_cluster.get_packed_trial_resources()
+        self.assertEqual(resources["cpus_per_trial"], 2)
+        self.assertEqual(resources["num_workers"], 1)
+        self.assertEqual(resources["num_samples"], 2)
+        resources = self.ray_cluster.get_packed_trial_resources(num_samples=8)
+        self.assertEqual(resources["cpus_per_trial"], 2)
+        self.assertEqual(resources["num_samples"], 8)
+
+    def test_run_on_learner_spreads_workers(self):
+        learner_node_id, worker_nodes = self.ray_cluster.run_on_learner(get_worker_nodes, 2, num_workers=2)
+        # With the SPREAD strategy the three bundles are placed on both nodes
+        self.assertEqual(len(worker_nodes), 2)
+        self.assertEqual(len(set(worker_nodes) | {learner_node_id}), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -13,5 +13,24 @@ class TestConfigFactory(unittest.TestCase):
         ppoConfig = self.configFactory.get_standard_ppo_config()
         assert isinstance(ppoConfig, PPOConfig)
 
+    def test_get_training_ppo_config_with_preset(self):
+        ppoConfig = self.configFactory.get_training_ppo_config(preset="16core")
+        preset = ConfigFactory.performance_presets["16core"]
+        self.assertEqual(ppoConfig.framework_str, preset["framework"])
+        self.assertEqual(ppoConfig.num_rollout_workers, preset["num_rollout_workers"])
+        self.assertEqual(ppoConfig.num_envs_per_worker, preset["num_envs_per_worker"])
+        self.assertEqual(ppoConfig.train_batch_size, preset["train_batch_size"])
+        self.assertTrue(ppoConfig.compress_observations)
+
+    def test_presets_fill_train_batch(self):
+        for preset in ConfigFactory.performance_presets.values():
+            samples_per_round = preset["num_rollout_workers"] * preset["num_envs_per_worker"] * \
+                                preset["rollout_fragment_length"]
+            self.assertEqual(preset["train_batch_size"] % samples_per_round, 0)
+
+    def test_unknown_preset(self):
+        with self.assertRaises(ValueError):
+            self.configFactory.get_training_ppo_config(preset="unknown")
+
 if __name__ == '__main__':
     unittest.main()
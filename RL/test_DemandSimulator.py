@@ -0,0 +1,46 @@
+import unittest
+import numpy as np
+from DemandSimulator import DemandSimulator, haversine
+
+
+class TestDemandSimulator(unittest.TestCase):
+    def setUp(self):
+        # A 10x10 grid of cells about 111m apart, with population in the first row and traffic in the last row
+        rows, cols = np.divmod(np.arange(100), 10)
+        self.coordinates = np.stack([48.7 + rows * 0.001, 9.1 + cols * 0.0015], axis=1)
+        self.data = np.zeros((4, 100))
+        self.data[0] = np.arange(100)
+        self.data[1, :10] = 5
+        self.data[2, 90:] = 1
+
+    def test_haversine(self):
+        self.assertAlmostEqual(haversine(np.array([48.7]), np.array([9.1]), 48.701, 9.1)[0], 111.2, delta=0.5)
+
+    def test_capacity(self):
+        simulator = DemandSimulator(self.data, self.coordinates, recipients_per_day=500, capacity=20,
+                                    max_walk_m=300, num_processes=1)
+        days = simulator.simulate([0, 5, 95], num_days=20)
+        self.assertTrue((days["served"] <= 60).all())
+        self.assertTrue((days["served"] + days["overflow"] == days["reachable"]).all())
+        self.assertTrue((days["reachable"] <= days["recipients"]).all())
+        self.assertAlmostEqual(simulator.summarize(days)["utilisation"], 1.0)
+
+    def test_reach(self):
+        simulator = DemandSimulator(self.data, self.coordinates, recipients_per_day=200, capacity=1000,
+                                    max_walk_m=50, traffic_share=0, num_processes=1)
+        # Only the recipients of the station cell are in reach and walk no distance
+        days = simulator.simulate([3], num_days=10)
+        self.assertTrue((days["served"] == days["reachable"]).all())
+        self.assertAlmostEqual(days["served"].sum() / days["recipients"].sum(), 0.1, delta=0.03)
+        self.assertTrue((days["mean_walk_m"] == 0).all())
+        # A station without recipients in reach serves nobody
+        self.assertEqual(simulator.simulate([55], num_days=5)["served"].sum(), 0)
+
+    def test_parallel(self):
+        serial = DemandSimulator(self.data, self.coordinates, recipients_per_day=300, num_processes=1)
+        parallel = DemandSimulator(self.data, self.coordinates, recipients_per_day=300, num_processes=2)
+        self.assertTrue(serial.simulate([1, 94], num_days=8).equals(parallel.simulate([1, 94], num_days=8)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,10 @@
 import copy
+import os
+import tempfile
 import unittest
-from Envs.CompleteEnv import CompleteEnv
+import ray
+import ray.cloudpickle
+from Envs.CompleteEnv import CompleteEnv, load_env_data
 import numpy.testing
 import Helper
 
@@ -35,9 +39,51 @@ class TestEnv(unittest.TestCase):
         self.env.step([0, 1, 2, 3, 4])
         self.assertEqual(self.env.get_pickup_locations(), self.env.pickup_locations)
 
+    def test_pop_perf_stats(self):
+        self.env.reset()
+        self.env.step([0, 1, 2, 3, 4])
+        stats = self.env.pop_perf_stats()
+
+        self.assertEqual(stats["counters"]["steps"], 1)
+        self.assertEqual(stats["counters"]["resets"], 1)
+        self.assertEqual(stats["counters"]["reward_calls"], 5)
+        self.assertEqual(len(stats["step_latencies"]), 1)
+        self.assertGreaterEqual(stats["timers"]["step_s"], stats["timers"]["reward_s"])
+        # The statistics are reset after they have been popped
+        self.assertEqual(self.env.pop_perf_stats()["counters"]["steps"], 0)
+
     def test_reward(self):
         # TODO
         pass
 
+class TestLoadEnvData(unittest.TestCase):
+    def setUp(self):
+        # A small dataset with the first cells of a test dataset
+        with open('dataSets/test_dataset_0.csv', 'r') as file:
+            lines = file.readlines()[:13]
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dataset = os.path.join(self.tmp_dir.name, 'small_dataset.csv')
+        with open(self.dataset, 'w') as file:
+            file.writelines(lines)
+        self.data = Helper.HelperMethods(True).create_data(self.dataset, True)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_dataset_path(self):
+        numpy.testing.assert_array_equal(load_env_data({"dataset": self.dataset}), self.data)
+
+    def test_reference_of_earlier_session(self):
+        # The env_config of a checkpoint written in cluster mode holds a reference of an earlier ray session
+        ray.init(num_cpus=1, include_dashboard=False)
+        env_config = ray.cloudpickle.dumps({"data": ray.put(self.data[:, :2]), "dataset": self.dataset})
+        ray.shutdown()
+        ray.init(num_cpus=1, include_dashboard=False)
+        try:
+            numpy.testing.assert_array_equal(load_env_data(ray.cloudpickle.loads(env_config)), self.data)
+        finally:
+            ray.shutdown()
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
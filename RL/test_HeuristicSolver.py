@@ -0,0 +1,44 @@
+import unittest
+import numpy as np
+import Helper
+from Solvers.HeuristicSolver import HeuristicSolver
+
+
+class TestHeuristicSolver(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.dimensions = (12, 10)
+        # Synthetic merged data with a cell_id row and three features
+        self.data = np.vstack([np.arange(120), rng.random((3, 120))])
+        self.column_weight = [0, 1, 10, -5]
+        self.distance_weight = [0, 0.1, 0.5, 0.2]
+        self.solver = HeuristicSolver(self.dimensions, self.column_weight, self.distance_weight)
+
+    def loop_reward(self, action):
+        # The reward of a single cell as computed by CompleteEnv.reward
+        rw = 0
+        for i in range(len(self.data) - 1):
+            indexes = Helper.HelperMethods.select_indices(action, self.dimensions[0], self.dimensions[1])
+            indexes.remove(action)
+            rw = rw + self.data[i + 1][action] * self.column_weight[i + 1]
+            for j in range(len(indexes)):
+                rw = rw + self.data[i + 1][indexes[j]] * self.distance_weight[i + 1] * self.column_weight[i + 1]
+        return rw
+
+    def test_cell_rewards(self):
+        rewards = self.solver.cell_rewards(self.data)
+        expected = [self.loop_reward(cell) for cell in range(120)]
+        np.testing.assert_allclose(rewards, expected)
+
+    def test_solve(self):
+        placement = self.solver.solve(self.data, 4)
+        self.assertEqual(len(placement), 4)
+        self.assertEqual(placement[0], int(np.argmax(self.solver.cell_rewards(self.data))))
+        # The neighbourhoods of the stations do not overlap
+        for i, cell in enumerate(placement):
+            for other in placement[i + 1:]:
+                self.assertTrue(abs(cell // 10 - other // 10) > 2 or abs(cell % 10 - other % 10) > 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
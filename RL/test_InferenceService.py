@@ -0,0 +1,127 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import ray
+from ray.rllib.algorithms.ppo import PPOConfig
+from NumpyPolicy import NumpyPolicy
+from InferenceService import InferenceService, MicroBatcher, request_placement
+from TestHelper import SmallPlacementEnv, has_torch, rl_module_actions
+
+
+class TestInferenceService(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        # A small random NumPy policy with two sub-actions over 30 cells
+        architecture = {"activations": ["tanh", "linear"], "num_layers": 2, "layer_sizes": [8, 60],
+                        "observation_size": 30, "action_sizes": [30, 30], "tuple_action": True, "framework": "tf2"}
+        np.savez(os.path.join(self.tmp_dir.name, NumpyPolicy.weights_file), kernel_0=rng.normal(size=(30, 8)),
+                 bias_0=np.zeros(8), kernel_1=rng.normal(size=(8, 60)), bias_1=np.zeros(60))
+        with open(os.path.join(self.tmp_dir.name, NumpyPolicy.architecture_file), "w") as file:
+            json.dump(architecture, file)
+        self.policy = NumpyPolicy.from_artifact(self.tmp_dir.name)
+        self.observations = rng.random((6, 30))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_micro_batcher(self):
+        batcher = MicroBatcher(self.policy.compute_actions, max_batch_size=6, max_wait_ms=200)
+        futures = [batcher.submit(observation) for observation in self.observations]
+        actions = [future.result(timeout=5) for future in futures]
+        batcher.stop()
+        np.testing.assert_array_equal(actions, self.policy.compute_actions(self.observations))
+        self.assertEqual(batcher.batch_sizes, [6])
+
+    def test_service(self):
+        service = InferenceService(self.tmp_dir.name, max_wait_ms=20)
+        server = service.create_server(port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = "http://127.0.0.1:" + str(server.server_address[1])
+        try:
+            with ThreadPoolExecutor(6) as executor:
+                placements = list(executor.map(lambda observation: request_placement(observation=observation, url=url),
+                                               self.observations))
+            cached = request_placement(observation=self.observations[0], url=url)
+        finally:
+            server.shutdown()
+            server.server_close()
+            service.batcher.stop()
+        self.assertEqual([placement["cells"] for placement in placements],
+                         self.policy.compute_actions(self.observations).tolist())
+        self.assertFalse(placements[0]["cached"])
+        self.assertTrue(cached["cached"])
+        self.assertEqual(cached["cells"], placements[0]["cells"])
+        self.assertEqual(service.stats, {"requests": 7, "cache_hits": 1})
+
+    def test_invalid_requests(self):
+        service = InferenceService(self.tmp_dir.name, max_wait_ms=200)
+        server = service.create_server(port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = "http://127.0.0.1:" + str(server.server_address[1])
+
+        def post(body):
+            request = urllib.request.Request(url + "/placement", data=json.dumps(body).encode())
+            try:
+                with urllib.request.urlopen(request, timeout=5) as response:
+                    return response.status
+            except urllib.error.HTTPError as e:
+                return e.code
+
+        try:
+            # An observation of the wrong length does not fail the requests batched with it
+            with ThreadPoolExecutor(3) as executor:
+                wrong = executor.submit(request_placement, observation=self.observations[0][:10], url=url)
+                placements = list(executor.map(lambda observation: request_placement(observation=observation, url=url),
+                                               self.observations[:2]))
+                with self.assertRaises(urllib.error.HTTPError) as context:
+                    wrong.result()
+            self.assertEqual(context.exception.code, 400)
+            self.assertEqual([placement["cells"] for placement in placements],
+                             self.policy.compute_actions(self.observations[:2]).tolist())
+            # Bodies that are not a json object or have a wrong type are rejected
+            self.assertEqual([post([1, 2]), post(3), post({"observation": {"a": 1}}), post({"dataset_id": 5})],
+                             [400, 400, 400, 400])
+        finally:
+            server.shutdown()
+            server.server_close()
+            service.batcher.stop()
+
+
+class TestRLlibCheckpointService(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+        ray.init(num_cpus=1, include_dashboard=False)
+
+    @classmethod
+    def tearDownClass(cls):
+        ray.shutdown()
+
+    @unittest.skipUnless(has_torch, "The torch RLModule requires torch")
+    def test_rl_module_checkpoint(self):
+        # The default configuration of PPO builds the policy as an RLModule, as the one of MainPPO
+        config = PPOConfig().environment(SmallPlacementEnv).framework("torch").rollouts(num_rollout_workers=0)
+        algorithm = config.training(model={"fcnet_hiddens": [16]}).build()
+        policy = algorithm.get_policy()
+        observations = np.random.default_rng(0).random((4, 20))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            policy.export_checkpoint(os.path.join(tmp_dir, "policy"))
+            service = InferenceService(os.path.join(tmp_dir, "policy"), max_wait_ms=50)
+        try:
+            futures = [service.batcher.submit(observation) for observation in observations]
+            actions = [future.result(timeout=5) for future in futures]
+        finally:
+            service.batcher.stop()
+            algorithm.stop()
+        np.testing.assert_array_equal(actions, rl_module_actions(policy, observations))
+
+
+if __name__ == '__main__':
+    unittest.main()
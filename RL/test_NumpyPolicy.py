@@ -0,0 +1,59 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import ray
+from ray.rllib.algorithms.ppo import PPOConfig
+from NumpyPolicy import NumpyPolicy, export_numpy_policy
+from TestHelper import SmallPlacementEnv, has_rl_module, has_torch, rl_module_actions
+
+
+class TestNumpyPolicy(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+        ray.init(num_cpus=1, include_dashboard=False)
+
+    @classmethod
+    def tearDownClass(cls):
+        ray.shutdown()
+
+    def assert_actions_match(self, config):
+        algorithm = config.rollouts(num_rollout_workers=0).build()
+        try:
+            policy = algorithm.get_policy()
+            observations = np.random.default_rng(0).random((10, 20))
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                policy.export_checkpoint(os.path.join(tmp_dir, "policy"))
+                numpy_policy = NumpyPolicy.from_artifact(export_numpy_policy(os.path.join(tmp_dir, "policy")))
+            if hasattr(policy.model, "pi"):
+                expected_actions = rl_module_actions(policy, observations)
+            else:
+                expected_actions = [policy.compute_single_action(observation, explore=False)[0]
+                                    for observation in observations]
+            for observation, expected in zip(observations, expected_actions):
+                self.assertEqual(numpy_policy.compute_single_action(observation), tuple(int(a) for a in expected))
+            self.assertEqual(numpy_policy.compute_actions(observations).shape, (10, 3))
+        finally:
+            algorithm.stop()
+
+    def test_actions_match_policy(self):
+        config = PPOConfig().environment(SmallPlacementEnv).framework("tf2")
+        # The ModelV2 stack is used, which does not require torch
+        config = config.training(model={"fcnet_hiddens": [16, 8]}, _enable_learner_api=False)
+        self.assert_actions_match(config.rl_module(_enable_rl_module_api=False))
+
+    @unittest.skipUnless(has_rl_module, "The tf RLModule requires torch and tensorflow_probability")
+    def test_actions_match_rl_module(self):
+        # The default configuration builds the policy network as an RLModule with an encoder and a pi head
+        config = PPOConfig().environment(SmallPlacementEnv).framework("tf2")
+        self.assertTrue(config._enable_rl_module_api)
+        self.assert_actions_match(config.training(model={"fcnet_hiddens": [16, 8]}))
+
+    @unittest.skipUnless(has_torch, "The torch RLModule requires torch")
+    def test_actions_match_torch_rl_module(self):
+        config = PPOConfig().environment(SmallPlacementEnv).framework("torch")
+        self.assert_actions_match(config.training(model={"fcnet_hiddens": [16, 8]}))
+
+if __name__ == '__main__':
+    unittest.main()
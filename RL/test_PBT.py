@@ -0,0 +1,15 @@
+import unittest
+from PBT import perform_pbt
+
+
+class TestPBT(unittest.TestCase):
+    def test_invalid_arguments(self):
+        # The arguments are checked before the dataset is loaded or ray is started
+        with self.assertRaisesRegex(ValueError, "learner node"):
+            perform_pbt(address="auto", learner_node="192.168.0.10", cpu_only=True)
+        with self.assertRaisesRegex(ValueError, "fast_local_dir"):
+            perform_pbt(local_dir="results", fast_local_dir=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import itertools
+import subprocess
+import sys
+import unittest
+import numpy as np
+from Solvers.AnnealingSolver import AnnealingSolver
+from Solvers.BranchAndBoundSolver import BranchAndBoundSolver
+from Solvers.LazyGreedySolver import LazyGreedySolver
+from Solvers.PlacementObjective import PlacementObjective
+
+
+class TestPlacementSolvers(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self.dimensions = (9, 8)
+        # Synthetic merged data with a cell_id row and three features
+        self.data = np.vstack([np.arange(72), rng.random((3, 72))])
+        self.column_weight = [0, 1, 10, -5]
+        self.distance_weight = [0, 0.1, 0.5, 0.2]
+        self.objective = PlacementObjective(self.data, self.dimensions, self.column_weight, self.distance_weight)
+
+    def plain_greedy(self, num_pickup):
+        placement = []
+        for _ in range(num_pickup):
+            gains = [self.objective.value(placement + [cell]) if cell not in placement else -np.inf
+                     for cell in range(72)]
+            placement.append(int(np.argmax(gains)))
+        return placement
+
+    def test_single_station(self):
+        # Without overlaps the objective equals the reward of the CompleteEnv
+        np.testing.assert_allclose([self.objective.value([cell]) for cell in range(72)],
+                                   self.objective.cell_rewards())
+        self.assertAlmostEqual(self.objective.value([0, 40]), self.objective.env_reward([0, 40]))
+
+    def test_gain_and_loss(self):
+        state = self.objective.new_state()
+        placement = []
+        for cell in [10, 11, 27, 19, 71]:
+            self.assertAlmostEqual(self.objective.gain(cell, state),
+                                   self.objective.value(placement + [cell]) - self.objective.value(placement))
+            self.objective.add(cell, state)
+            placement.append(cell)
+        for cell in [11, 71]:
+            placement.remove(cell)
+            self.assertAlmostEqual(self.objective.loss(cell, state),
+                                   self.objective.value(placement + [cell]) - self.objective.value(placement))
+            self.objective.remove(cell, state)
+
+    def test_lazy_greedy(self):
+        placement = LazyGreedySolver(self.dimensions, self.column_weight, self.distance_weight).solve(self.data, 6)
+        self.assertEqual(placement, self.plain_greedy(6))
+
+    def test_lazy_greedy_random_weights(self):
+        # With negative weights the gain of a cell can increase when a station is added next to it
+        rng = np.random.default_rng(0)
+        for seed in range(50):
+            self.data = np.vstack([np.arange(72), rng.random((3, 72))])
+            self.column_weight = [0] + list(rng.normal(0, 5, 3))
+            self.distance_weight = [0] + list(rng.normal(0, 1, 3))
+            self.objective = PlacementObjective(self.data, self.dimensions, self.column_weight, self.distance_weight)
+            placement = LazyGreedySolver(self.dimensions, self.column_weight, self.distance_weight).solve(self.data, 6)
+            self.assertEqual(placement, self.plain_greedy(6), "seed " + str(seed))
+
+    def test_branch_and_bound(self):
+        optimum = max(self.objective.value(placement) for placement in itertools.combinations(range(72), 3))
+        for num_processes in (1, 2):
+            solver = BranchAndBoundSolver(self.dimensions, self.column_weight, self.distance_weight, num_processes)
+            result = solver.search(self.data, 3)
+            self.assertTrue(result["optimal"])
+            self.assertAlmostEqual(result["value"], optimum)
+            self.assertAlmostEqual(self.objective.value(result["placement"]), optimum)
+        gap = solver.optimality_gap(self.data, [0, 1, 2], result)
+        self.assertAlmostEqual(gap["gap"], optimum - self.objective.value([0, 1, 2]))
+
+    def test_branch_and_bound_time_limit(self):
+        # Without time to search the greedy placement is returned with an upper bound of the optimum
+        result = BranchAndBoundSolver(self.dimensions, self.column_weight, self.distance_weight, 1,
+                                      time_limit=0).search(self.data, 3)
+        self.assertEqual(result["placement"], self.plain_greedy(3))
+        self.assertGreaterEqual(result["upper_bound"], result["value"])
+
+    def test_annealing(self):
+        results = [AnnealingSolver(self.dimensions, self.column_weight, self.distance_weight, num_restarts=3,
+                                   num_steps=3000, num_processes=num_processes).anneal(self.data, 3)
+                   for num_processes in (1, 2)]
+        self.assertEqual(results[0]["placement"], results[1]["placement"])
+        result = results[0]
+        # The incrementally tracked reward equals the reward of the placement
+        self.assertAlmostEqual(result["value"], self.objective.value(result["placement"]))
+        self.assertGreaterEqual(result["value"], self.objective.value(self.plain_greedy(3)) - 1e-9)
+        self.assertEqual(len(result["restart_values"]), 3)
+        trace_values = [value for step, value in result["trace"]]
+        self.assertEqual(trace_values, sorted(trace_values))
+
+    def test_annealing_spacing(self):
+        result = AnnealingSolver(self.dimensions, self.column_weight, self.distance_weight, num_restarts=2,
+                                 num_steps=3000, min_spacing=3, num_processes=1).anneal(self.data, 3)
+        for cell in result["placement"]:
+            self.assertEqual(AnnealingSolver.spacing_violations(cell, result["placement"], 8, 3), 0)
+        self.assertAlmostEqual(result["value"], result["reward"])
+
+    def test_solver_imports(self):
+        # The solvers are used without ray, so importing them must not load ray or tensorflow
+        code = "import sys, SolvePlacements; print('ray' in sys.modules or 'tensorflow' in sys.modules)"
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), "False")
+
+
+if __name__ == '__main__':
+    unittest.main()
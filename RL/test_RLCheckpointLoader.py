@@ -0,0 +1,107 @@
+import importlib.util
+import os
+import unittest
+import gymnasium as gym
+import numpy as np
+import ray
+from ray.rllib.algorithms.ppo import PPOConfig
+from RLCheckpointLoader import swap_env_data, reset_optimizers, fine_tune
+
+
+class SmallDataEnv(gym.Env):
+    # A small stand-in for the CompleteEnv whose reward depends on its data
+    def __init__(self, env_config=None):
+        self.data = env_config["data"]
+        self.action_space = gym.spaces.Discrete(len(self.data))
+        self.observation_space = gym.spaces.Box(low=0, high=1, shape=(len(self.data),), dtype=np.float64)
+
+    def set_data(self, data):
+        self.data = ray.get(data) if isinstance(data, ray.ObjectRef) else data
+
+    def reset(self, *, seed=None, options=None):
+        return np.zeros(len(self.data)), {}
+
+    def step(self, action):
+        return np.zeros(len(self.data)), float(self.data[action]), True, False, {}
+
+
+class TestRLCheckpointLoader(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+        ray.init(num_cpus=2, include_dashboard=False)
+
+    @classmethod
+    def tearDownClass(cls):
+        ray.shutdown()
+
+    def setUp(self):
+        # The ModelV2 stack is used, the tf RLModule of this ray version requires torch to be installed
+        self.config = PPOConfig().environment(SmallDataEnv, env_config={"data": np.zeros(8)}).framework("tf2")
+        self.config = self.config.rollouts(num_rollout_workers=1, rollout_fragment_length=50)
+        self.config = self.config.training(model={"fcnet_hiddens": [8]}, train_batch_size=100, sgd_minibatch_size=50,
+                                           num_sgd_iter=1, _enable_learner_api=False)
+        self.config = self.config.rl_module(_enable_rl_module_api=False)
+
+    def test_swap_env_data(self):
+        algorithm = self.config.build()
+        swap_env_data(algorithm, np.ones(8))
+        # The local worker does not create environments when there are rollout workers
+        data = algorithm.workers.foreach_worker(lambda worker: worker.foreach_env(lambda env: list(env.data)),
+                                                local_worker=False)
+        self.assertEqual(data, [[[1.0] * 8]])
+        algorithm.stop()
+
+    def test_reset_optimizers(self):
+        algorithm = self.config.build()
+        algorithm.train()
+        reset_optimizers(algorithm, lr=0.5)
+        policy = algorithm.get_policy()
+        self.assertAlmostEqual(float(policy.cur_lr.numpy()), 0.5)
+        self.assertTrue(all(np.all(variable.numpy() == 0) for variable in policy._optimizer.variables()))
+        algorithm.stop()
+
+    @unittest.skipUnless(importlib.util.find_spec("torch"), "The learner api requires torch")
+    def test_reset_learner_optimizers(self):
+        # The default learner api of PPO with the torch RLModule
+        config = self.config.framework("torch").training(_enable_learner_api=True)
+        algorithm = config.rl_module(_enable_rl_module_api=True).build()
+        algorithm.train()
+        reset_optimizers(algorithm, lr=0.5)
+        algorithm.train()
+        learner = algorithm.learner_group._learner
+        for optimizer in learner._named_optimizers.values():
+            self.assertNotIn(optimizer, learner._optimizer_lr_schedules)
+            # The constant learning rate is kept by the training after the reset
+            self.assertEqual([param_group["lr"] for param_group in optimizer.param_groups], [0.5])
+        algorithm.stop()
+
+    def test_reset_learner_without_private_attributes(self):
+        class Learner:
+            _named_optimizers = {}
+
+        class LearnerGroup:
+            is_local = True
+            _learner = Learner()
+
+        class Config:
+            _enable_learner_api = True
+
+        class Algorithm:
+            config = Config()
+            learner_group = LearnerGroup()
+
+        with self.assertRaisesRegex(RuntimeError, "_optimizer_lr_schedules"):
+            reset_optimizers(Algorithm(), lr=0.5)
+
+    def test_fine_tune(self):
+        algorithm = self.config.build()
+        path_to_checkpoint = algorithm.save()
+        algorithm.stop()
+        data = np.arange(8, dtype=float)
+        path_to_checkpoint = fine_tune(path_to_checkpoint, data, max_iterations=2)
+        self.assertTrue(os.path.isdir(path_to_checkpoint))
+
+
+if __name__ == '__main__':
+    unittest.main()
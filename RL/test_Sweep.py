@@ -0,0 +1,48 @@
+import json
+import os
+import tempfile
+import unittest
+import Helper
+from Envs.CompleteEnv import RL_DIR
+from Sweep import load_grid, load_weight_profile, count_jobs, get_env_configs
+
+
+class TestSweep(unittest.TestCase):
+    def test_load_grid(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            grid_file = os.path.join(tmp_dir, "grid.json")
+            with open(grid_file, "w") as file:
+                json.dump({"datasets": ["test_dataset_0.csv", "test_dataset_1.csv"],
+                           "hyperparameters": {"lr": [0.0001, 0.00005], "gamma": 0.95}}, file)
+            grid = load_grid(grid_file)
+        self.assertEqual(grid["weight_profiles"], {"default": None})
+        self.assertEqual(grid["hyperparameters"]["gamma"], [0.95])
+        self.assertEqual(grid["iterations"], 30)
+        self.assertEqual(count_jobs(grid), 4)
+
+    def test_load_weight_profile(self):
+        base_weights = Helper.HelperMethods.set_up_column_weights()
+        self.assertIsNone(load_weight_profile(None))
+        self.assertEqual(load_weight_profile("featureWeights.txt"), base_weights)
+        # The note in brackets after the postal feature is not part of its name
+        weights = load_weight_profile({"parking": 40, "postal": 20})
+        self.assertEqual(weights[6], 40)
+        self.assertEqual(weights[3], 20)
+        self.assertEqual(weights[:3], base_weights[:3])
+        with self.assertRaises(ValueError):
+            load_weight_profile({"unknown": 1})
+
+    def test_get_env_configs(self):
+        grid = {"datasets": ["test_dataset_0.csv", "test_dataset_1.csv"],
+                "weight_profiles": {"default": None, "parking": {"parking": 40}}}
+        env_configs = get_env_configs(grid)
+        self.assertEqual(len(env_configs), 4)
+        # The checkpoints of the jobs only hold the path of the dataset, which the environment resolves
+        for env_config in env_configs:
+            self.assertNotIn("data", env_config)
+            self.assertTrue(os.path.isfile(os.path.join(RL_DIR, env_config["dataset"])))
+        self.assertEqual(env_configs[1]["column_weight"][6], 40)
+
+
+if __name__ == '__main__':
+    unittest.main()
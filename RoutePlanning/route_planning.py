@@ -11,10 +11,18 @@ import folium
 import ast
 import webbrowser
 import os
+import sys
 
+# The graph store of the network graphs is shared with the data processing
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "DataProcessing"))
+from graph_store import default_store
 
-def get_nearest_node(coords: tuple):
+
+def get_nearest_node(coords: tuple, graph: nx.MultiDiGraph = None):
     # This function takes a (lat, lon) coordinate tuple and returns the nearest node in the bike network
+    # If the graph of the routes is passed, the nearest node of this graph is returned without any download
+    if graph is not None:
+        return default_store().nearest_nodes(graph, [coords])[0]
     try:
         graph = ox.graph_from_point(coords, dist=100, network_type="bike")
     # To reduce runtime, search for the nearest node in a distance of 100 meters. If there is no node within this
@@ -88,15 +96,15 @@ def merge_subroutes(first_routes: list, second_routes: list):
     return concatenated_routes
 
 
-def add_depot(depot: tuple, routes: list):
+def add_depot(depot: tuple, routes: list, graph: nx.MultiDiGraph = None):
     # This function adds the depot as the first place in the morning and the last place in the evening to the route
     if depot is not None:
-        depot_node = get_nearest_node(depot)
+        depot_node = get_nearest_node(depot, graph)
         routes = [(depot_node, ) + route + (depot_node, ) for route in routes]
     return routes
 
 
-def get_locations_dict(data: pd.DataFrame, column_name: str):
+def get_locations_dict(data: pd.DataFrame, column_name: str, graph: nx.MultiDiGraph = None):
     # This function takes the dataframe of locations and transforms it into a dictionary for further processing
     # The column with the time point becomes the key and all actions become a list as value
     locations = {}
@@ -109,7 +117,7 @@ def get_locations_dict(data: pd.DataFrame, column_name: str):
     if isinstance(list(locations.values())[1][0], str):
         locations = {key: [ast.literal_eval(string) for string in value] for key, value in locations.items()}
     # Convert the coordinates which are passed from the RL actions into their nearest nodes in the network
-    locations = {key: [get_nearest_node(sublist) for sublist in value] for key, value in locations.items()}
+    locations = {key: [get_nearest_node(sublist, graph) for sublist in value] for key, value in locations.items()}
     # Sort them for a deterministic output and to pass them into create_subroutes() which require a sorted input
     locations = {key: sorted(value) for key, value in locations.items()}
     return locations
@@ -130,14 +138,14 @@ class RoutePlanning:
         print("Route Planning class has been loaded.")
         # Initialize all elements
         self.city, self.locations, self.depot, self.weight = city, locations, depot, weight
-        self.G = ox.graph_from_place(self.city, network_type="bike")
+        self.G = default_store().get(self.city, "bike")
         # Finally get the routes
         self.routes = self.create_routes()
 
     def create_routes(self):
         # This function combines all steps to return routes as a list of tuples from the locations dataframe
         # First, get a dictionary out of the locations dataframe. The column with the time is named "DataSet"
-        self.locations = get_locations_dict(self.locations, "DataSet")
+        self.locations = get_locations_dict(self.locations, "DataSet", self.G)
         # Obtain all keys of the dictionary as local variables with their values as values
         locals().update(self.locations)
         # List all keys, i.e., how many stations are in the data
@@ -158,7 +166,7 @@ class RoutePlanning:
                                              self.locations[locations_keys[index]])
                 self.routes = merge_subroutes(self.routes, subroutes)
         # Add a depot if a depot is passed
-        self.routes = add_depot(self.depot, self.routes)
+        self.routes = add_depot(self.depot, self.routes, self.G)
         return self.routes
 
     def get_routes(self):
@@ -9,7 +9,27 @@ import fileMgmt
 @click.option('--checkpoint', is_flag=True, help='Load a checkpoint.')
 @click.option('--weights', is_flag=True, help='Manage the weights of the rl environment.')
 @click.option('--pbt', is_flag=True, help='Perform Population-Based Training')
-def hello(data_gen, data, train, checkpoint, weights, pbt):
+@click.option('--tournament', is_flag=True, help='Rank all saved checkpoints on the test data sets.')
+@click.option('--export_numpy', is_flag=True, help='Export a checkpoint as a NumPy-only policy for fast inference.')
+@click.option('--serve', is_flag=True, help='Serve the placements of a policy to local clients over http.')
+@click.option('--solve', type=click.Choice(['greedy', 'heuristic', 'exact', 'anneal']), default=None,
+              help='Compute the placements of the test data sets without rl and write them for the frontend.')
+@click.option('--simulate', is_flag=True,
+              help='Simulate the parcel pick-up at the solver placements of a data set over many random days.')
+@click.option('--sweep', type=click.Path(exists=True, dir_okay=False), default=None,
+              help='Run all jobs of a grid file, e.g. RL/sweepGrid.json, concurrently and write a summary table.')
+@click.option('--warm_start', is_flag=True,
+              help='Pre-train the policy on heuristic placements by behaviour cloning before training.')
+@click.option('--cpu_only', is_flag=True, help='Run Population-Based Training with trials packed onto the cpus.')
+@click.option('--fast_local_dir', is_flag=True,
+              help='Keep the Population-Based Training checkpoints in memory in /dev/shm, they are lost on a restart.')
+@click.option('--preset', type=click.Choice(['laptop', '16core', '64core', 'auto']), default=None,
+              help='CPU performance preset used for training, "auto" selects the fastest preset on this machine.')
+@click.option('--address', type=str, default=None,
+              help='Address of the ray head to train on a multi-node cluster, e.g. "auto" or "192.168.0.10:6379".')
+@click.option('--learner_node', type=str, default=None, help='IP address of the cluster node that runs the learner.')
+def hello(data_gen, data, train, checkpoint, weights, pbt, tournament, export_numpy, serve, solve, simulate,
+          sweep, warm_start, cpu_only, fast_local_dir, preset, address, learner_node):
     import sys
     from pathlib import Path
 
@@ -18,13 +38,21 @@ def hello(data_gen, data, train, checkpoint, weights, pbt):
         k_drive = click.prompt('k_drive', type=int, default=5)
         k_bike = click.prompt('k_bike', type=int, default=5)
         k_walk = click.prompt('k_walk', type=int, default=5)
+        traffic_model = click.prompt('traffic_model', type=click.Choice(['routes', 'betweenness']), default='routes')
+        num_sources = None
+        if traffic_model == 'betweenness':
+            num_sources = click.prompt('Number of sampled start nodes per network', type=int, default=100)
+        area_weighted = click.confirm('Weight the landuse and nature places by their covered area?', default=False)
+        osm_extract = click.prompt('Path of a local .osm.pbf extract to read the OSM data from, empty for the online '
+                                   'APIs', type=str, default='', show_default=False).strip() or None
         target_csv = click.prompt('Please enter the name of the csv that the data will be exported to',
                                   type=str, default='data_rl.csv')
 
         sys.path.append(str(Path('DataProcessing').resolve()))
         from DataProcessing import main as data_processing_main
 
-        data_processing_main = data_processing_main.Main(k_drive, k_bike, k_walk)
+        data_processing_main = data_processing_main.Main(k_drive, k_bike, k_walk, traffic_model, num_sources,
+                                                         area_weighted, osm_extract)
         success_message = data_processing_main.run(target_csv)
         click.echo(success_message)
         return
@@ -45,7 +73,30 @@ def hello(data_gen, data, train, checkpoint, weights, pbt):
         dataset = fileMgmt.select_available_dataset()
         sys.path.append(str(Path('RL').resolve()))
         from RL import PBT
-        PBT.perform_pbt(dataset="dataSets/"+dataset)
+        PBT.perform_pbt(dataset="dataSets/"+dataset, address=address, learner_node=learner_node, cpu_only=cpu_only,
+                        fast_local_dir=fast_local_dir)
+        return
+
+    if solve:
+        sys.path.append(str(Path('RL').resolve()))
+        from RL import SolvePlacements
+        num_pickup = click.prompt('Number of pick-up stations', type=int, default=5)
+        SolvePlacements.solve_placements(["dataSets/test_dataset_" + str(i) + ".csv" for i in range(9)],
+                                         solver=solve, num_pickup=num_pickup)
+        return
+
+    if simulate:
+        dataset = fileMgmt.select_available_dataset()
+        num_days = click.prompt('Number of simulated days', type=int, default=1000)
+        sys.path.append(str(Path('RL').resolve()))
+        from RL import DemandSimulator
+        DemandSimulator.simulate_placements("dataSets/" + dataset, num_days=num_days)
+        return
+
+    if sweep:
+        sys.path.append(str(Path('RL').resolve()))
+        from RL import Sweep
+        Sweep.run_sweep(sweep, address=address)
         return
 
     if train:
@@ -54,7 +105,32 @@ def hello(data_gen, data, train, checkpoint, weights, pbt):
         sys.path.append(str(Path('RL').resolve()))
         from RL import MainPPO
         from RL.Envs.CompleteEnv import CompleteEnv
-        MainPPO.main_ppo(rl_env=CompleteEnv, dataset="dataSets/"+dataset)
+        MainPPO.main_ppo(rl_env=CompleteEnv, dataset="dataSets/"+dataset, preset=preset, address=address,
+                         learner_node=learner_node, warm_start=warm_start)
+        return
+
+    if tournament:
+        checkpoint_dir = click.prompt('Please enter the directory of the checkpoints', type=str,
+                                      default='policyStates')
+        sys.path.append(str(Path('RL').resolve()))
+        from RL import CheckpointTournament
+        CheckpointTournament.checkpoint_tournament(checkpoint_dir=checkpoint_dir)
+        return
+
+    if export_numpy:
+        path_to_checkpoint = click.prompt('Please enter the path to the checkpoint of the policy', type=str)
+        sys.path.append(str(Path('RL').resolve()))
+        from RL import NumpyPolicy
+        NumpyPolicy.export_numpy_policy(path_to_checkpoint)
+        return
+
+    if serve:
+        path_to_policy = click.prompt('Please enter the path to the NumPy policy or the checkpoint of the policy',
+                                      type=str)
+        port = click.prompt('port', type=int, default=8765)
+        sys.path.append(str(Path('RL').resolve()))
+        from RL import InferenceService
+        InferenceService.InferenceService(path_to_policy).serve(port=port)
         return
 
     if checkpoint: